@@ -0,0 +1,66 @@
+from fastapi import APIRouter, Query, status
+
+import typing as t
+
+from admin.schemas import PoolDecision, PoolStatus, SlowQuery, SlowQueryReport
+from common.responses import api_response
+from common.schemas import APIResponse
+from core.config import cfg
+from db.core import db, pool_controllers, slow_queries
+from db.pool import asyncpg_pool
+
+PREFIX = "/admin"
+TAG = "Admin"
+
+admin_router = APIRouter(prefix=PREFIX, tags=[TAG])
+
+
+@admin_router.get("/slow-queries", response_model=APIResponse[SlowQueryReport], status_code=status.HTTP_200_OK)
+async def get_slow_queries(limit: int = Query(20, ge=1, le=1000)):
+    """Slowest statement fingerprints (by maximum duration) over the slow query threshold since startup"""
+    report = SlowQueryReport(
+        threshold_ms=db.slow_query_seconds * 1000,
+        dropped=slow_queries.dropped,
+        statements=[
+            SlowQuery(
+                fingerprint=stats.fingerprint,
+                sql=stats.sql,
+                calls=stats.calls,
+                total_ms=stats.total_seconds * 1000,
+                mean_ms=stats.total_seconds * 1000 / stats.calls,
+                max_ms=stats.max_seconds * 1000,
+                last_seen_at=stats.last_seen,
+            )
+            for stats in slow_queries.top(limit)
+        ],
+    )
+    return api_response(report, "Slow queries fetched successfully")
+
+
+@admin_router.get("/pools", response_model=APIResponse[t.List[PoolStatus]], status_code=status.HTTP_200_OK)
+async def get_pools():
+    """Connection pools and the last resizing decisions of the adaptive controller"""
+    pools = []
+    for controller in pool_controllers:
+        pool = asyncpg_pool(controller.database)
+        pools.append(
+            PoolStatus(
+                database=controller.name,
+                size=pool.get_size() if pool else None,
+                idle=pool.get_idle_size() if pool else None,
+                max_size=pool.get_max_size() if pool else None,
+                adaptive=cfg.POOL_ADAPTIVE_ENABLED,
+                acquire_wait_ms=controller.last_wait * 1000,
+                utilization=controller.last_utilization,
+                decisions=[
+                    PoolDecision(
+                        old_max_size=decision.old_max_size,
+                        new_max_size=decision.new_max_size,
+                        reason=decision.reason,
+                        at=decision.at,
+                    )
+                    for decision in reversed(controller.decisions)
+                ],
+            )
+        )
+    return api_response(pools, "Pools fetched successfully")
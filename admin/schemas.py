@@ -0,0 +1,41 @@
+import datetime as dt
+import typing as t
+
+from common.schemas import BaseSchema
+
+
+class SlowQuery(BaseSchema):
+    fingerprint: str
+    sql: str
+    calls: int
+    total_ms: float
+    mean_ms: float
+    max_ms: float
+    last_seen_at: dt.datetime
+
+
+class SlowQueryReport(BaseSchema):
+    threshold_ms: float
+    # Slow executions of statements that did not fit in the fingerprint table
+    dropped: int
+    statements: t.List[SlowQuery]
+
+
+class PoolDecision(BaseSchema):
+    old_max_size: int
+    new_max_size: int
+    reason: str
+    at: dt.datetime
+
+
+class PoolStatus(BaseSchema):
+    database: str
+    # None before connect and on other backends than Postgres
+    size: t.Optional[int] = None
+    idle: t.Optional[int] = None
+    max_size: t.Optional[int] = None
+    adaptive: bool
+    # Observed by the last sample of the adaptive controller
+    acquire_wait_ms: float
+    utilization: float
+    decisions: t.List[PoolDecision]
@@ -0,0 +1,4 @@
+"""
+Micro-benchmarks, run from the project root with `python -m bench.<name>`.
+They need the same settings as the application (.env) but no database.
+"""
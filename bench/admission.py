@@ -0,0 +1,123 @@
+"""
+Behaviour of admission control under overload, against a synthetic slow database: a pool
+of `--pool` connections where a read holds one for `--read-ms` and a bulk export for
+`--bulk-ms`. Reads arrive open loop at `--rate` per second for `--seconds` while
+`--bulk` exports are running, with:
+- none: no admission control, every request waits for a connection
+- admission: AdmissionController (CoDel shedding, bulk capped, reads first)
+Reported: read latency percentiles of the served requests, 503s and the bulk outcome.
+
+    python -m bench.admission [--rate 1500] [--seconds 3] [--pool 10] [--read-ms 10]
+                              [--bulk 20] [--bulk-ms 200]
+"""
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+import typing as t
+import uuid
+
+from fastapi import APIRouter, Depends, FastAPI
+
+import core  # noqa: F401  (wires routers and models in import order)
+from bench.asgi import call
+from common.enums import PriorityClassEnum
+from common.errors import BaseHTTPError
+from core import admission, cfg
+from main import common_exception_handler
+
+
+class SlowPool:
+    """Stand-in for the database pool: `size` connections, each query holding one for its duration"""
+
+    def __init__(self, size: int):
+        self.semaphore = asyncio.Semaphore(size)
+
+    async def query(self, seconds: float):
+        async with self.semaphore:
+            await asyncio.sleep(seconds)
+
+
+def parse_args(argv: t.Sequence[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="python -m bench.admission", description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rate", type=int, default=1500, help="Reads per second")
+    parser.add_argument("--seconds", type=float, default=3.0, help="Duration of the read traffic")
+    parser.add_argument("--pool", type=int, default=10, help="Connections of the synthetic pool")
+    parser.add_argument("--read-ms", type=float, default=10.0, help="Connection time of a read")
+    parser.add_argument("--bulk", type=int, default=20, help="Concurrent bulk exports")
+    parser.add_argument("--bulk-ms", type=float, default=200.0, help="Connection time of a bulk export")
+    return parser.parse_args(argv)
+
+
+def build_app(args: argparse.Namespace, with_admission: bool) -> FastAPI:
+    pool = SlowPool(args.pool)
+    router = APIRouter(dependencies=[Depends(admission.admit)] if with_admission else [])
+
+    @router.get("/product/export")
+    async def export_products():
+        await pool.query(args.bulk_ms / 1000)
+        return {}
+
+    @router.get("/product/{product_id}")
+    async def get_product(product_id: uuid.UUID):
+        await pool.query(args.read_ms / 1000)
+        return {}
+
+    app = FastAPI()
+    app.include_router(router)
+    app.add_exception_handler(BaseHTTPError, common_exception_handler)
+    return app
+
+
+async def timed(app: FastAPI, path: str) -> t.Tuple[int, float]:
+    started = time.perf_counter()
+    status_code, _, _ = await call(app, "GET", path)
+    return status_code, time.perf_counter() - started
+
+
+async def run_case(app: FastAPI, args: argparse.Namespace) -> t.Tuple[t.List[t.Tuple[int, float]], t.List[int]]:
+    bulk = [asyncio.create_task(timed(app, "/product/export")) for _ in range(args.bulk)]
+    reads: t.List[asyncio.Task] = []
+    tick = 0.01
+    started = time.perf_counter()
+    while time.perf_counter() - started < args.seconds:
+        # Catch up on the arrivals due by now, so that the rate holds even when the loop is late
+        due = int((time.perf_counter() - started) * args.rate)
+        for _ in range(due - len(reads)):
+            reads.append(asyncio.create_task(timed(app, f"/product/{uuid.uuid4()}")))
+        await asyncio.sleep(tick)
+    return list(await asyncio.gather(*reads)), [status for status, _ in await asyncio.gather(*bulk)]
+
+
+def report(name: str, reads: t.List[t.Tuple[int, float]], bulk: t.List[int]):
+    served = sorted(elapsed * 1000 for status, elapsed in reads if status == 200)
+    shed = sum(1 for status, _ in reads if status == 503)
+    quantiles = statistics.quantiles(served, n=100) if len(served) > 1 else [0.0] * 99
+    print(
+        f"  {name:<10} reads: {len(served):>6} served  {shed:>6} shed  "
+        f"p50 {quantiles[49]:>8.1f} ms  p99 {quantiles[98]:>8.1f} ms  max {served[-1] if served else 0:>8.1f} ms  "
+        f"bulk: {bulk.count(200)} served, {bulk.count(503)} shed"
+    )
+
+
+async def run(args: argparse.Namespace):
+    print(
+        f"{args.rate} reads/s for {args.seconds:g}s, pool of {args.pool}, read {args.read_ms:g} ms, "
+        f"{args.bulk} bulk of {args.bulk_ms:g} ms"
+    )
+    report("none", *await run_case(build_app(args, False), args))
+    admission.controller = admission.AdmissionController(
+        cfg.ADMISSION_MAX_CONCURRENCY,
+        class_limits=cfg.ADMISSION_CLASS_LIMITS,
+        route_classes={"GET /product/export": PriorityClassEnum.BULK},
+        queue_size=cfg.ADMISSION_QUEUE_SIZE,
+        target_delay=cfg.ADMISSION_TARGET_DELAY_MS / 1000,
+        interval=cfg.ADMISSION_INTERVAL_MS / 1000,
+        max_queue_time=cfg.ADMISSION_MAX_QUEUE_MS / 1000,
+    )
+    report("admission", *await run_case(build_app(args, True), args))
+
+
+if __name__ == "__main__":
+    asyncio.run(run(parse_args(sys.argv[1:])))
@@ -0,0 +1,81 @@
+import asyncio
+import typing as t
+from contextlib import asynccontextmanager
+from urllib.parse import urlencode
+
+
+async def call(
+    app: t.Callable,
+    method: str,
+    path: str,
+    *,
+    query: t.Optional[t.Mapping[str, t.Any]] = None,
+    headers: t.Optional[t.Mapping[str, str]] = None,
+    body: bytes = b"",
+) -> t.Tuple[int, t.Dict[str, str], bytes]:
+    """
+    Send one HTTP request straight to an ASGI app, without a server or a socket,
+    so that benchmarks measure the application only.
+
+    :return: (status code, response headers, response body)
+    """
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": urlencode(query or {}, doseq=True).encode(),
+        "root_path": "",
+        "headers": [(key.lower().encode(), value.encode()) for key, value in (headers or {}).items()],
+        "client": ("127.0.0.1", 50000),
+        "server": ("testserver", 80),
+    }
+    received = False
+    done = asyncio.Event()
+    response: t.Dict[str, t.Any] = {"status": 0, "headers": {}, "body": []}
+
+    async def receive():
+        nonlocal received
+        if received:
+            # The client only goes away once the whole response was sent
+            await done.wait()
+            return {"type": "http.disconnect"}
+        received = True
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response["status"] = message["status"]
+            response["headers"] = {key.decode(): value.decode() for key, value in message.get("headers", [])}
+        elif message["type"] == "http.response.body":
+            response["body"].append(message.get("body", b""))
+            if not message.get("more_body", False):
+                done.set()
+
+    await app(scope, receive, send)
+    return response["status"], response["headers"], b"".join(response["body"])
+
+
+@asynccontextmanager
+async def lifespan(app: t.Callable) -> t.AsyncIterator[None]:
+    """Run the app's startup before the block and its shutdown after it, like a server would"""
+    messages: asyncio.Queue = asyncio.Queue()
+    replies: asyncio.Queue = asyncio.Queue()
+
+    async def send(message):
+        await replies.put(message)
+
+    task = asyncio.create_task(app({"type": "lifespan", "asgi": {"version": "3.0"}, "state": {}}, messages.get, send))
+    await messages.put({"type": "lifespan.startup"})
+    reply = await replies.get()
+    if reply["type"] != "lifespan.startup.complete":
+        raise RuntimeError(f"Startup failed: {reply.get('message', '')}")
+    try:
+        yield
+    finally:
+        await messages.put({"type": "lifespan.shutdown"})
+        await replies.get()
+        await task
@@ -0,0 +1,69 @@
+"""
+CPU time per request and bytes on the wire of GET /product (whole catalog, 1k and 10k
+products) for each response encoding:
+- before: Starlette's GZipMiddleware (level 9, on the event loop, every request)
+- identity, gzip, br, zstd: CompressionMiddleware, uncached ("cold") and cached
+The CPU time is the process' (it includes the thread pool). The service is replaced by
+an in-memory one so that only the HTTP layer is measured.
+
+    python -m bench.compression [requests per case]
+"""
+import asyncio
+import sys
+import time
+import typing as t
+
+from fastapi import FastAPI
+from fastapi.middleware.gzip import GZipMiddleware
+from loguru import logger
+
+import core  # noqa: F401  (wires routers and models in import order)
+from bench.asgi import call
+from bench.mapping import make_rows
+from bench.responses import CatalogService
+from core.compression import CompressionMiddleware, available_encodings
+from core.injection import injector
+from db.mapping import map_rows
+from products.api import product_router
+from products.schemas import ProductResponse
+from products.service import ProductService
+
+
+def build_app(middleware: t.Optional[type] = None, **options: t.Any) -> FastAPI:
+    app = FastAPI()
+    app.include_router(product_router)
+    if middleware is not None:
+        app.add_middleware(middleware, **options)
+    return app
+
+
+async def measure(app: FastAPI, accept_encoding: str, requests: int) -> t.Tuple[float, int, str]:
+    """(CPU milliseconds per request, response bytes, Content-Encoding)"""
+    headers = {"Accept-Encoding": accept_encoding}
+    await call(app, "GET", "/product/", headers=headers)  # warm up (and fill the cache)
+    started = time.process_time()
+    for _ in range(requests):
+        status_code, response_headers, body = await call(app, "GET", "/product/", headers=headers)
+        assert status_code == 200, body[:200]
+    cpu = (time.process_time() - started) / requests * 1000
+    return cpu, len(body), response_headers.get("content-encoding", "identity")
+
+
+async def run(requests: int):
+    logger.remove()
+    encodings = ["identity"] + [encoding.name for encoding in available_encodings(6, 4, 3)]
+    cases = [("before", build_app(GZipMiddleware, minimum_size=1000), ["gzip"])]
+    cases.append(("cold", build_app(CompressionMiddleware, cache_min_size=sys.maxsize), encodings))
+    cases.append(("cached", build_app(CompressionMiddleware), encodings[1:]))
+    for rows in (1000, 10000):
+        service = CatalogService(map_rows(make_rows(rows), ProductResponse, trusted=True))
+        injector.binder.bind(ProductService, to=service)
+        print(f"GET /product, {rows} products")
+        for name, app, accepted in cases:
+            for accept_encoding in accepted:
+                cpu, size, content_encoding = await measure(app, accept_encoding, requests)
+                print(f"  {name:<7} {content_encoding:<9} {cpu:>8.2f} ms CPU/request  {size / 1024:>8,.1f} KiB")
+
+
+if __name__ == "__main__":
+    asyncio.run(run(int(sys.argv[1]) if len(sys.argv) > 1 else 20))
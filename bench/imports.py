@@ -0,0 +1,105 @@
+"""
+Throughput of loading a catalog of `--rows` generated products into Postgres, through
+main.app driven in process:
+- post: POST /product once per product, `--concurrency` requests in flight
+- import: one POST /product/import of the same catalog as an NDJSON upload (COPY)
+Both create the same products (under different names), reported as rows/s.
+
+Needs a migrated Postgres database (SQLALCHEMY_DATABASE_URI, from the environment or
+.env). The products created are deleted afterwards.
+
+    python -m bench.imports [--rows 10000] [--concurrency 1]
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+import typing as t
+import uuid
+
+from bench.suite import product_payload
+
+
+def parse_args(argv: t.Sequence[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="python -m bench.imports", description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rows", type=int, default=10_000, help="Products in the catalog")
+    parser.add_argument("--concurrency", type=int, default=1, help="POST /product requests in flight")
+    return parser.parse_args(argv)
+
+
+def multipart(filename: str, content: bytes) -> t.Tuple[str, bytes]:
+    """(content type, body) of a form upload of one file in the `file` field"""
+    boundary = uuid.uuid4().hex
+    body = (
+        f"--{boundary}\r\n"
+        f'Content-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+        "Content-Type: application/x-ndjson\r\n\r\n"
+    ).encode() + content + f"\r\n--{boundary}--\r\n".encode()
+    return f"multipart/form-data; boundary={boundary}", body
+
+
+async def post_one_by_one(
+    app, base: str, headers: t.Dict[str, str], catalog: t.List[dict], concurrency: int
+) -> float:
+    from bench.asgi import call
+
+    pending = iter(catalog)
+
+    async def worker():
+        for payload in pending:
+            status_code, _, body = await call(app, "POST", base, headers=headers, body=json.dumps(payload).encode())
+            if status_code != 201:
+                raise RuntimeError(f"Expected 201, got {status_code}: {body[:200]!r}")
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return time.perf_counter() - started
+
+
+async def upload(app, base: str, headers: t.Dict[str, str], catalog: t.List[dict]) -> float:
+    from bench.asgi import call
+
+    content_type, body = multipart("catalog.ndjson", b"".join(json.dumps(p).encode() + b"\n" for p in catalog))
+    started = time.perf_counter()
+    status_code, _, response = await call(
+        app, "POST", f"{base}/import", headers={**headers, "Content-Type": content_type}, body=body
+    )
+    elapsed = time.perf_counter() - started
+    report = json.loads(response)["data"] if status_code == 200 else None
+    if report is None or report["created"] != len(catalog):
+        raise RuntimeError(f"Import failed with {status_code}: {response[:500]!r}")
+    return elapsed
+
+
+async def run(args: argparse.Namespace):
+    from bench.asgi import lifespan
+    from core import cfg
+    from db.core import db
+    from main import app
+    from products.models import products
+
+    prefix = f"bench-{uuid.uuid4().hex[:8]}"
+    catalog = [product_payload(f"{prefix}-{index}") for index in range(args.rows)]
+    base = f"{cfg.API_PREFIX_STR}/product"
+    headers = {"Api-Version": cfg.API_VERSION, "Content-Type": "application/json"}
+    async with lifespan(app):
+        try:
+            posted = await post_one_by_one(
+                app, base, headers, [{**p, "name": f"{p['name']}-post"} for p in catalog], args.concurrency
+            )
+            imported = await upload(app, base, headers, [{**p, "name": f"{p['name']}-import"} for p in catalog])
+        finally:
+            await db.execute(products.delete().where(products.c.name.like(f"{prefix}-%")))
+    print(f"{args.rows} products")
+    print(f"  post    {args.rows / posted:>10,.0f} rows/s  {posted:>7.2f} s  (concurrency {args.concurrency})")
+    print(f"  import  {args.rows / imported:>10,.0f} rows/s  {imported:>7.2f} s  ({posted / imported:.1f}x)")
+
+
+if __name__ == "__main__":
+    # Settings are read on import: keep the request logs out of the measure
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    random.seed(0)
+    asyncio.run(run(parse_args(sys.argv[1:])))
@@ -0,0 +1,118 @@
+"""
+Rows/s of the row to schema mappings, before (per-call TypeAdapter, hand-built
+models) and after (cached adapters, compiled trusted mapper).
+
+    python -m bench.mapping [rows]
+"""
+import datetime as dt
+import sys
+import time
+import typing as t
+import uuid
+from decimal import Decimal
+
+from asyncpg.pgproto.pgproto import UUID as AsyncpgUUID
+from databases.backends.common.records import Record, create_column_maps
+from databases.backends.postgres import PostgresBackend
+from pydantic import TypeAdapter
+from sqlalchemy import select
+
+import core  # noqa: F401  (wires routers and models in import order)
+from db.mapping import map_rows
+from db.utils import map_to
+from products.models import PRODUCT_COLUMNS
+from products.schemas import ProductResponse
+
+
+class DriverRow(tuple):
+    """Stand-in for asyncpg.Record (which cannot be built from Python): positional, with keys()"""
+
+    _keys: t.Tuple[str, ...] = ()
+
+    def keys(self):
+        return self._keys
+
+    def values(self):
+        return self
+
+
+def make_rows(count: int) -> t.List[Record]:
+    """databases Records of `select(*PRODUCT_COLUMNS)`, holding the types asyncpg returns"""
+    connection = PostgresBackend("postgresql://bench/bench").connection()
+    _, _, result_columns = connection._compile(select(*PRODUCT_COLUMNS))
+    column_maps = create_column_maps(result_columns)
+    DriverRow._keys = tuple(column.name for column in PRODUCT_COLUMNS)
+    now = dt.datetime.now(dt.timezone.utc)
+    values = [
+        {
+            "id": AsyncpgUUID(str(uuid.uuid4())),
+            "name": f"Product {i}",
+            "category": f"Category {i % 20}",
+            "description": "A product description of a reasonable length for a catalog entry",
+            "price": Decimal("19.99"),
+            "image_url": "https://example.com/image.png",
+            "is_trend": i % 3 == 0,
+            "keywords": "one, two, three",
+            "trending_percentage": Decimal("42.50"),
+            "created_at": now,
+            "updated_at": now,
+        }
+        for i in range(count)
+    ]
+    return [
+        Record(DriverRow(row[key] for key in DriverRow._keys), result_columns, connection._dialect, column_maps)
+        for row in values
+    ]
+
+
+def hand_built(rows):
+    # Former ProductRepo.get_all_products
+    return [
+        ProductResponse(
+            id=row["id"],
+            name=row["name"],
+            category=row["category"],
+            description=row["description"],
+            price=float(row["price"]),
+            image_url=row["image_url"],
+            is_trend=row["is_trend"],
+            keywords=row["keywords"],
+            trending_percentage=float(row["trending_percentage"]),
+            created_at=row["created_at"],
+            updated_at=row["updated_at"],
+        )
+        for row in rows
+    ]
+
+
+def adapter_per_item(rows):
+    # Former map_to: one TypeAdapter built per list item
+    return [TypeAdapter(ProductResponse).validate_python(dict(row)) for row in rows]
+
+
+CASES = {
+    "hand built (before)": hand_built,
+    "map_to, adapter per item (before)": adapter_per_item,
+    "map_to, cached adapter": lambda rows: map_to(rows, ProductResponse),
+    "map_rows, validated batch": lambda rows: map_rows(rows, ProductResponse),
+    "map_rows, trusted": lambda rows: map_rows(rows, ProductResponse, trusted=True),
+}
+
+
+def run(count: int, repeat: int = 5):
+    rows = make_rows(count)
+    print(f"{count} rows, best of {repeat}")
+    for name, function in CASES.items():
+        function(rows[:10])  # warm up caches
+        best = min(_timed(function, rows) for _ in range(repeat))
+        print(f"  {name:<36} {count / best:>12,.0f} rows/s")
+
+
+def _timed(function, rows) -> float:
+    started = time.perf_counter()
+    function(rows)
+    return time.perf_counter() - started
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
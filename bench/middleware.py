@@ -0,0 +1,95 @@
+"""
+Per-request overhead of the middleware stack, on a ping route like `/`:
+- none: no middleware
+- before: CORS, correlation id, gzip, then X-Process-Time from an @app.middleware("http")
+  function (BaseHTTPMiddleware, time.time) and the metrics middleware, as main.py used to
+- after: the default MIDDLEWARE_STACK (pure ASGI process time)
+- minimal: MIDDLEWARE_STACK reduced to ["metrics", "process_time"]
+
+    python -m bench.middleware [requests per case]
+"""
+import asyncio
+import sys
+import time
+import typing as t
+
+from asgi_correlation_id import CorrelationIdMiddleware
+from fastapi import FastAPI, Request
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+
+import core  # noqa: F401  (wires routers and models in import order)
+from bench.asgi import call
+from core import cfg, metrics, middleware
+
+
+def ping_app() -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/")
+    async def root():
+        return {"ping": "pong"}
+
+    return app
+
+
+def before_app() -> FastAPI:
+    app = ping_app()
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+    app.add_middleware(CorrelationIdMiddleware)
+    app.add_middleware(GZipMiddleware, minimum_size=1000)
+
+    @app.middleware("http")
+    async def add_process_time_header(request: Request, call_next):
+        start_time = time.time()
+        response = await call_next(request)
+        process_time = time.time() - start_time
+        response.headers["X-Process-Time"] = str(process_time)
+        return response
+
+    app.add_middleware(metrics.MetricsMiddleware)
+    return app
+
+
+def stack_app(names: t.Sequence[str]) -> FastAPI:
+    app = ping_app()
+    middleware.install(app, names)
+    return app
+
+
+async def measure(app: FastAPI, requests: int) -> float:
+    """Mean microseconds per request"""
+    # Browser-like headers, so that CORS and gzip have something to look at
+    headers = {"Origin": "https://example.com", "Accept-Encoding": "gzip"}
+    for _ in range(min(requests, 1000)):
+        await call(app, "GET", "/", headers=headers)
+    started = time.perf_counter_ns()
+    for _ in range(requests):
+        status_code, _, _ = await call(app, "GET", "/", headers=headers)
+        assert status_code == 200
+    return (time.perf_counter_ns() - started) / requests / 1000
+
+
+async def run(requests: int):
+    cases = [
+        ("none", ping_app()),
+        ("before", before_app()),
+        ("after", stack_app(cfg.MIDDLEWARE_STACK)),
+        ("minimal", stack_app(["metrics", "process_time"])),
+    ]
+    baseline = None
+    print(f"GET /, {requests} requests per case")
+    for name, app in cases:
+        micros = await measure(app, requests)
+        baseline = micros if baseline is None else baseline
+        print(f"  {name:<10} {micros:>8.1f} µs/request  (middleware {micros - baseline:>6.1f} µs)")
+
+
+if __name__ == "__main__":
+    asyncio.run(run(int(sys.argv[1]) if len(sys.argv) > 1 else 20000))
@@ -0,0 +1,99 @@
+"""
+Queries per second of the product repository backends on the get-by-id and list paths:
+- databases: ProductRepo (SQLAlchemy compiled per call, databases Records)
+- asyncpg: AsyncpgProductRepo (precompiled statements straight on the asyncpg pool)
+For each path, `--concurrency` tasks run queries back to back for `--seconds`.
+
+Needs a migrated Postgres database (SQLALCHEMY_DATABASE_URI, from the environment or
+.env). `--rows` products are inserted for the run and deleted afterwards.
+
+    python -m bench.repo_backends [--rows 1000] [--seconds 5] [--concurrency 10] [--page-size 20]
+"""
+import argparse
+import asyncio
+import random
+import sys
+import time
+import typing as t
+import uuid
+
+from loguru import logger
+
+import core  # noqa: F401  (wires routers and models in import order)
+from db.core import db
+from products.asyncpg_repo import AsyncpgProductRepo
+from products.repo import ProductRepo
+from products.schemas import CreateProduct
+
+
+def parse_args(argv: t.Sequence[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="python -m bench.repo_backends", description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rows", type=int, default=1000, help="Products inserted for the run")
+    parser.add_argument("--seconds", type=float, default=5.0, help="Duration of each measure")
+    parser.add_argument("--concurrency", type=int, default=10, help="Queries in flight")
+    parser.add_argument("--page-size", type=int, default=20, help="Products per page of list-page")
+    return parser.parse_args(argv)
+
+
+async def seed(repo: ProductRepo, rows: int) -> t.List[uuid.UUID]:
+    prefix = f"bench-{uuid.uuid4().hex[:8]}"
+    ids: t.List[uuid.UUID] = []
+    for start in range(0, rows, 1000):
+        batch = [
+            CreateProduct(
+                name=f"{prefix}-{index}",
+                category=f"category-{index % 10}",
+                description=f"Benchmark product {index}",
+                price=round(random.uniform(1, 1000), 2),
+                is_trend=index % 7 == 0,
+                trending_percentage=round(random.uniform(0, 100), 2),
+            )
+            for index in range(start, min(start + 1000, rows))
+        ]
+        ids += [product.id for product in await repo.create_products(batch)]
+    return ids
+
+
+async def queries_per_second(
+    query: t.Callable[[], t.Awaitable[t.Any]], seconds: float, concurrency: int
+) -> float:
+    await query()  # warm up: prepares the statements of at least one connection
+    count = 0
+    deadline = time.perf_counter() + seconds
+
+    async def worker():
+        nonlocal count
+        while time.perf_counter() < deadline:
+            await query()
+            count += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return count / (time.perf_counter() - started)
+
+
+async def run(args: argparse.Namespace):
+    logger.remove()
+    await db.connect()
+    databases_repo, asyncpg_repo = ProductRepo(), AsyncpgProductRepo()
+    ids = await seed(databases_repo, args.rows)
+    try:
+        paths: t.Dict[str, t.Callable[[ProductRepo], t.Callable[[], t.Awaitable[t.Any]]]] = {
+            "get": lambda repo: lambda: repo.get_product_by_id(random.choice(ids)),
+            "list-page": lambda repo: lambda: repo.get_products_page(limit=args.page_size),
+            "list": lambda repo: repo.get_all_products,
+            "list-json": lambda repo: repo.get_all_products_json_rows,
+        }
+        print(f"{args.rows} products, concurrency {args.concurrency}, {args.seconds:g}s per measure")
+        print(f"  {'path':<10} {'databases':>12} {'asyncpg':>12} {'speedup':>8}")
+        for name, path in paths.items():
+            before = await queries_per_second(path(databases_repo), args.seconds, args.concurrency)
+            after = await queries_per_second(path(asyncpg_repo), args.seconds, args.concurrency)
+            print(f"  {name:<10} {before:>8,.0f} q/s {after:>8,.0f} q/s {after / before:>7.2f}x")
+    finally:
+        await databases_repo.delete_products(ids)
+        await db.disconnect()
+
+
+if __name__ == "__main__":
+    asyncio.run(run(parse_args(sys.argv[1:])))
@@ -0,0 +1,107 @@
+"""
+Requests/s of GET /product (whole catalog) for catalogs of 1k and 10k products:
+- before: APIResponse model, then FastAPI response_model validation and serialization
+- models: the same product models encoded by api_response (orjson, key tables)
+- rows: GET /product as shipped, JSON-ready rows encoded by api_response without models
+  (the timestamp formatting and numeric casts then happen in Postgres)
+The service is replaced by an in-memory one so that only the HTTP layer is measured.
+
+    python -m bench.responses [seconds per case]
+"""
+import asyncio
+import sys
+import time
+import typing as t
+
+from fastapi import FastAPI, status
+from loguru import logger
+
+import core  # noqa: F401  (wires routers and models in import order)
+from bench.asgi import call
+from bench.mapping import make_rows
+from common.responses import api_response
+from common.schemas import APIResponse, dt_to_iso8601z
+from core.injection import injector
+from db.mapping import map_rows
+from products.api import product_router
+from products.schemas import ProductResponse
+from products.service import ProductService
+
+
+class CatalogService:
+    def __init__(self, products: t.List[ProductResponse]):
+        self.products = products
+        # What the JSON-ready select returns for the same products
+        self.json_rows = [
+            (
+                str(p.id),
+                p.name,
+                p.category,
+                p.description,
+                p.price,
+                p.image_url,
+                p.is_trend,
+                p.keywords,
+                p.trending_percentage,
+                dt_to_iso8601z(p.created_at),
+                dt_to_iso8601z(p.updated_at),
+            )
+            for p in products
+        ]
+
+    async def get_products_etag(self, query: str) -> str:
+        return f'"bench-{len(self.products)}"'
+
+    async def get_all_products(self, product_filter=None) -> t.List[ProductResponse]:
+        return self.products
+
+    async def get_all_products_json_rows(self, product_filter=None) -> t.List[t.Sequence]:
+        return self.json_rows
+
+
+def build_app() -> FastAPI:
+    app = FastAPI()
+    app.include_router(product_router)
+
+    @app.get(
+        "/before/product",
+        response_model=APIResponse[t.List[ProductResponse]],
+        status_code=status.HTTP_200_OK,
+    )
+    async def get_all_products_before():
+        products = await injector.get(ProductService).get_all_products()
+        return APIResponse[t.List[ProductResponse]](message="All products fetched successfully", data=products)
+
+    @app.get("/models/product", response_model=APIResponse[t.List[ProductResponse]], status_code=status.HTTP_200_OK)
+    async def get_all_products_models():
+        products = await injector.get(ProductService).get_all_products()
+        return api_response(products, "All products fetched successfully")
+
+    return app
+
+
+async def measure(app: FastAPI, path: str, seconds: float) -> t.Tuple[float, int]:
+    count, size = 0, 0
+    started = time.perf_counter()
+    while time.perf_counter() - started < seconds:
+        status_code, _, body = await call(app, "GET", path)
+        assert status_code == 200, body[:200]
+        count, size = count + 1, len(body)
+    return count / (time.perf_counter() - started), size
+
+
+async def run(seconds: float):
+    logger.remove()
+    app = build_app()
+    for rows in (1000, 10000):
+        service = CatalogService(map_rows(make_rows(rows), ProductResponse, trusted=True))
+        injector.binder.bind(ProductService, to=service)
+        print(f"GET /product, {rows} products")
+        for name, path in (("before", "/before/product"), ("models", "/models/product"), ("rows", "/product/")):
+            await call(app, "GET", path)  # warm up
+            rate, size = await measure(app, path, seconds)
+            print(f"  {name:<10} {rate:>10,.1f} req/s  ({size / 1024:,.0f} KiB)")
+
+
+if __name__ == "__main__":
+    asyncio.run(run(float(sys.argv[1]) if len(sys.argv) > 1 else 3.0))
@@ -0,0 +1,128 @@
+"""
+Latency of GET /product/search (ProductRepo.search_products: full-text match on the GIN
+indexed search vector, ranked) against the naive alternative, an ILIKE '%term%' scan of
+name, category, keywords and description (newest first), for terms matching about 10%,
+1% and 0.1% of the catalog. Both fetch the first page of `--page-size` products.
+
+Needs a migrated Postgres database (SQLALCHEMY_DATABASE_URI, from the environment or
+.env). The catalog is grown to each of `--rows` in turn (generated in SQL and analyzed)
+and its products are deleted afterwards. Search runs under REPO_TIMEOUT_SECONDS, as
+behind the endpoint.
+
+    python -m bench.search [--rows 100000 1000000] [--queries 20] [--page-size 20]
+"""
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+import typing as t
+import uuid
+
+from loguru import logger
+from sqlalchemy import or_, select
+
+import core  # noqa: F401  (wires routers and models in import order)
+from db.core import db
+from products.models import PRODUCT_COLUMNS, products
+from products.repo import ProductRepo
+
+# Words of the generated descriptions: one adjective out of 10, noun out of 100, material out of 1000
+TERMS = {"10%": "adjective3", "1%": "noun42", "0.1%": "material512"}
+
+
+def parse_args(argv: t.Sequence[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="python -m bench.search", description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[100_000, 1_000_000], help="Catalog sizes")
+    parser.add_argument("--queries", type=int, default=20, help="Queries per term and path")
+    parser.add_argument("--page-size", type=int, default=20, help="Products per page")
+    return parser.parse_args(argv)
+
+
+async def seed(prefix: str, start: int, stop: int):
+    # By chunks, each well within POSTGRES_STATEMENT_TIMEOUT_MS
+    for chunk in range(start, stop, 100_000):
+        await db.execute(
+            f"""
+            INSERT INTO products (name, category, description, price, is_trend, keywords, trending_percentage)
+            SELECT '{prefix}-' || i, 'category-' || (i % 50),
+                   'A adjective' || (i % 10) || ' noun' || (i % 100) || ' made of material' || (i % 1000),
+                   (i % 1000) + 0.99, i % 20 = 0, 'bench,product', i % 100
+            FROM generate_series({chunk}, {min(chunk + 100_000, stop) - 1}) AS i
+            """
+        )
+    await db.execute("ANALYZE products")
+
+
+async def delete(prefix: str):
+    while await db.fetch_val(
+        f"""
+        WITH deleted AS (
+            DELETE FROM products
+            WHERE id IN (SELECT id FROM products WHERE name LIKE '{prefix}-%' LIMIT 100000)
+            RETURNING 1
+        )
+        SELECT count(*) FROM deleted
+        """
+    ):
+        pass
+
+
+def ilike_query(term: str, limit: int):
+    pattern = f"%{term}%"
+    return (
+        select(*PRODUCT_COLUMNS)
+        .where(
+            or_(
+                products.c.name.ilike(pattern),
+                products.c.category.ilike(pattern),
+                products.c.keywords.ilike(pattern),
+                products.c.description.ilike(pattern),
+            )
+        )
+        .order_by(products.c.created_at.desc(), products.c.id.desc())
+        .limit(limit)
+    )
+
+
+async def latencies(query: t.Callable[[], t.Awaitable[t.Any]], count: int) -> t.List[float]:
+    await query()  # warm up: caches the relevant pages
+    millis = []
+    for _ in range(count):
+        started = time.perf_counter()
+        await query()
+        millis.append((time.perf_counter() - started) * 1000)
+    return millis
+
+
+def p(millis: t.List[float], percent: int) -> float:
+    return statistics.quantiles(millis, n=100, method="inclusive")[percent - 1] if len(millis) > 1 else millis[0]
+
+
+async def run(args: argparse.Namespace):
+    logger.remove()
+    await db.connect()
+    repo = ProductRepo()
+    prefix = f"bench-{uuid.uuid4().hex[:8]}"
+    seeded = 0
+    try:
+        print(f"{args.queries} queries per term and path, page of {args.page_size}")
+        print(f"  {'rows':>9} {'matches':>7} {'search p50':>11} {'p95':>9} {'ilike p50':>11} {'p95':>9} {'speedup':>8}")
+        for rows in sorted(args.rows):
+            if rows > seeded:
+                await seed(prefix, seeded, rows)
+                seeded = rows
+            for share, term in TERMS.items():
+                search = await latencies(lambda: repo.search_products(term, limit=args.page_size), args.queries)
+                ilike = await latencies(lambda: db.fetch_all(ilike_query(term, args.page_size)), args.queries)
+                print(
+                    f"  {rows:>9,} {share:>7} {p(search, 50):>8.1f} ms {p(search, 95):>6.1f} ms "
+                    f"{p(ilike, 50):>8.1f} ms {p(ilike, 95):>6.1f} ms {p(ilike, 50) / p(search, 50):>7.2f}x"
+                )
+    finally:
+        await delete(prefix)
+        await db.disconnect()
+
+
+if __name__ == "__main__":
+    asyncio.run(run(parse_args(sys.argv[1:])))
@@ -0,0 +1,323 @@
+"""
+End-to-end latency of the product endpoints: main.app (middleware, lifespan, service,
+repo, mapping) driven in process, with SQLite standing in for Postgres so that it runs
+anywhere. For each table size, every operation is sent `--requests` times and reported
+as p50/p95/p99 latency and requests/s:
+- list: GET /product (whole catalog) and GET /product?size=20 (first page)
+- get: GET /product/{id} of random seeded products
+- update: PUT /product/{id} of random seeded products
+- create: POST /product
+- delete: DELETE /product/{id} of the products created by `create`
+
+Results are written as JSON, and compared with a previous run given as `--baseline`.
+With `--pre-check`, create/update/delete go through the former read-check-write path
+(look up the name and/or the id, then write) instead of single statements: compare
+two runs at the same `--concurrency`, both with `--no-cache` so that the checks do
+read the database as they used to.
+The absolute numbers are SQLite's: compare runs of the same machine and settings.
+The SQLite backend of databases needs aiosqlite, from requirements-dev.txt.
+
+    pip install -r requirements-dev.txt
+    python -m bench.suite [--sizes 100 1000 10000] [--requests 200] [--concurrency 1]
+                          [--output bench-results.json] [--baseline previous.json] [--no-cache]
+                          [--pre-check]
+"""
+import argparse
+import asyncio
+import datetime as dt
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+import typing as t
+
+def parse_args(argv: t.Sequence[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="python -m bench.suite", description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000], help="Table sizes")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per operation and size")
+    parser.add_argument("--concurrency", type=int, default=1, help="Requests in flight")
+    parser.add_argument("--output", default="bench-results.json", help="Where to write the JSON results")
+    parser.add_argument("--baseline", help="JSON results of a previous run to compare with")
+    parser.add_argument("--no-cache", action="store_true", help="Disable the product cache")
+    parser.add_argument(
+        "--pre-check", action="store_true", help="Mutations read before writing, as before single statements"
+    )
+    return parser.parse_args(argv)
+
+
+def configure_environment(args: argparse.Namespace, database: str):
+    # Settings are read on import, so this has to run before the application is imported
+    os.environ["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{database}"
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    if args.no_cache:
+        os.environ["PRODUCT_CACHE_ENABLED"] = "false"
+
+
+def create_schema(database: str):
+    """products table for SQLite: the Postgres-only parts (search vector, extensions, indexes) are left out"""
+    from sqlalchemy import Column, MetaData, Table, text
+    from sqlalchemy.dialects import sqlite
+    from sqlalchemy.schema import CreateIndex, CreateTable
+
+    import core  # noqa: F401  (wires routers and models in import order)
+    from products.models import products
+
+    # UUIDs are stored as 32 hex digits (see PgUUID), timestamps as UTC text with milliseconds
+    defaults = {
+        "id": text("(lower(hex(randomblob(16))))"),
+        "created_at": text("(strftime('%Y-%m-%d %H:%M:%f', 'now'))"),
+        "updated_at": text("(strftime('%Y-%m-%d %H:%M:%f', 'now'))"),
+    }
+    columns = [
+        Column(
+            column.name,
+            column.type,
+            primary_key=column.primary_key,
+            nullable=column.nullable,
+            unique=column.unique,
+            index=column.index,
+            server_default=defaults.get(column.name, column.server_default and column.server_default.arg),
+        )
+        for column in products.columns
+        if column.computed is None
+    ]
+    table = Table(products.name, MetaData(), *columns)
+    with sqlite3.connect(database) as connection:
+        for statement in [CreateTable(table), *map(CreateIndex, table.indexes)]:
+            connection.execute(str(statement.compile(dialect=sqlite.dialect())))
+        # Same keyset order index as Postgres
+        connection.execute("CREATE INDEX ix_products_created_at_id ON products (created_at DESC, id DESC)")
+        # List version, bumped per row here (SQLite has no deferred or statement triggers)
+        connection.execute("CREATE TABLE product_list_version (version INTEGER NOT NULL, txid INTEGER)")
+        connection.execute("INSERT INTO product_list_version (version) VALUES (0)")
+        for event in ("INSERT", "UPDATE", "DELETE"):
+            connection.execute(
+                f"CREATE TRIGGER products_{event.lower()}_bump_list_version AFTER {event} ON products "
+                "BEGIN UPDATE product_list_version SET version = version + 1; END"
+            )
+
+
+def product_payload(name: str) -> t.Dict[str, t.Any]:
+    return {
+        "name": name,
+        "category": f"category-{random.randrange(20)}",
+        "description": f"Description of {name}",
+        "price": round(random.uniform(1, 500), 2),
+        "imageUrl": f"https://example.com/{name}.png",
+        "isTrend": random.random() < 0.2,
+        "keywords": "bench,product",
+        "trendingPercentage": round(random.uniform(0, 100), 2),
+    }
+
+
+def seed(database: str, size: int) -> t.List[str]:
+    """Replace the table content by `size` products, returning their ids"""
+    with sqlite3.connect(database) as connection:
+        connection.execute("DELETE FROM products")
+        connection.executemany(
+            "INSERT INTO products (name, category, description, price, image_url, is_trend, keywords,"
+            " trending_percentage) VALUES (:name, :category, :description, :price, :imageUrl, :isTrend,"
+            " :keywords, :trendingPercentage)",
+            [product_payload(f"seeded-{index}") for index in range(size)],
+        )
+        rows = connection.execute("SELECT id FROM products").fetchall()
+    return [f"{hex_id[:8]}-{hex_id[8:12]}-{hex_id[12:16]}-{hex_id[16:20]}-{hex_id[20:]}" for hex_id, in rows]
+
+
+def summarize(operation: str, size: int, latencies: t.List[int], elapsed: float) -> t.Dict[str, t.Any]:
+    millis = sorted(latency / 1e6 for latency in latencies)
+    quantiles = statistics.quantiles(millis, n=100, method="inclusive") if len(millis) > 1 else millis * 99
+    return {
+        "operation": operation,
+        "table_size": size,
+        "requests": len(millis),
+        "throughput": len(millis) / elapsed,
+        "mean_ms": statistics.fmean(millis),
+        "p50_ms": quantiles[49],
+        "p95_ms": quantiles[94],
+        "p99_ms": quantiles[98],
+        "max_ms": millis[-1],
+    }
+
+
+async def measure(
+    requests: t.List[t.Callable[[], t.Awaitable[t.Tuple[int, t.Dict[str, str], bytes]]]],
+    expected_status: int,
+    concurrency: int,
+) -> t.Tuple[t.List[int], float]:
+    """Send the requests from `concurrency` workers, returning each latency (ns) and the elapsed time (s)"""
+    pending = iter(requests)
+    latencies: t.List[int] = []
+
+    async def worker():
+        for request in pending:
+            started = time.perf_counter_ns()
+            status_code, _, body = await request()
+            latencies.append(time.perf_counter_ns() - started)
+            if status_code != expected_status:
+                raise RuntimeError(f"Expected {expected_status}, got {status_code}: {body[:200]!r}")
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, time.perf_counter() - started
+
+
+async def run_size(app, database: str, size: int, args: argparse.Namespace) -> t.List[t.Dict[str, t.Any]]:
+    from bench.asgi import call
+    from core import cfg
+    from core.injection import injector
+    from products.service import ProductService
+
+    base = f"{cfg.API_PREFIX_STR}/product"
+    seeded = seed(database, size)
+    # The in-process indexes were built from the previous table content
+    service = injector.get(ProductService)
+    if cfg.SUGGEST_INDEX_ENABLED:
+        await service.rebuild_suggest_index()
+    created: t.List[str] = []
+    count = args.requests
+    # Every route requires the API version header
+    headers = {"Api-Version": cfg.API_VERSION, "Content-Type": "application/json"}
+
+    def send(method: str, path: str = "", **kwargs):
+        return lambda: call(app, method, f"{base}{path}", headers=headers, **kwargs)
+
+    def update(index: int):
+        body = {"price": round(random.uniform(1, 500), 2), "keywords": f"updated-{index}"}
+        return send("PUT", f"/{random.choice(seeded)}", body=json.dumps(body).encode())
+
+    def create(index: int):
+        request = send("POST", body=json.dumps(product_payload(f"created-{size}-{index}")).encode())
+
+        async def create_and_remember():
+            response = await request()
+            if response[0] == 201:
+                created.append(json.loads(response[2])["data"]["id"])
+            return response
+
+        return create_and_remember
+
+    # Reads first, so that they see exactly `size` products; delete removes what create added
+    cases = [
+        ("list", 200, lambda: [send("GET")] * count),
+        ("list-page", 200, lambda: [send("GET", query={"size": 20})] * count),
+        ("get", 200, lambda: [send("GET", f"/{random.choice(seeded)}") for _ in range(count)]),
+        ("update", 200, lambda: [update(index) for index in range(count)]),
+        ("create", 201, lambda: [create(index) for index in range(count)]),
+        ("delete", 204, lambda: [send("DELETE", f"/{product_id}") for product_id in created]),
+    ]
+    results = []
+    for operation, expected_status, requests in cases:
+        latencies, elapsed = await measure(requests(), expected_status, args.concurrency)
+        results.append(summarize(operation, size, latencies, elapsed))
+        print_result(results[-1])
+    return results
+
+
+def print_result(result: t.Dict[str, t.Any], baseline: t.Optional[t.Dict[str, t.Any]] = None):
+    line = (
+        f"  {result['operation']:<10} {result['throughput']:>9,.1f} req/s"
+        f"  p50 {result['p50_ms']:>8.2f} ms  p95 {result['p95_ms']:>8.2f} ms  p99 {result['p99_ms']:>8.2f} ms"
+    )
+    if baseline:
+        change = lambda key: (result[key] / baseline[key] - 1) * 100 if baseline[key] else 0.0  # noqa: E731
+        line += f"  ({change('throughput'):+.1f}% req/s, {change('p50_ms'):+.1f}% p50, {change('p99_ms'):+.1f}% p99)"
+    print(line)
+
+
+def compare(results: t.List[t.Dict[str, t.Any]], path: str):
+    with open(path) as file:
+        previous = {(r["operation"], r["table_size"]): r for r in json.load(file)["results"]}
+    print(f"Compared with {path}")
+    for size in sorted({result["table_size"] for result in results}):
+        print(f"{size} products")
+        for result in results:
+            if result["table_size"] == size:
+                print_result(result, previous.get((result["operation"], size)))
+
+
+def bind_pre_check_service():
+    """Bind ProductService to a subclass checking existence and name clashes with reads before writing"""
+    from injector import singleton
+
+    from common.errors import NotFoundError
+    from core.injection import injector
+    from products.errors import ProductNameAlreadyExistsError
+    from products.service import ProductService
+
+    class PreCheckProductService(ProductService):
+        async def create_product(self, product):
+            if await self.product_repo.get_product_by_name(product.name):
+                raise ProductNameAlreadyExistsError()
+            return await super().create_product(product)
+
+        async def update_product(self, product_id, product_update, if_match=None):
+            product = await self.product_repo.get_product_by_id(product_id)
+            if not product:
+                raise NotFoundError(message=f"Product {product_id} not found")
+            if product_update.name and product_update.name != product.name:
+                if await self.product_repo.get_product_by_name(product_update.name):
+                    raise ProductNameAlreadyExistsError()
+            return await super().update_product(product_id, product_update, if_match)
+
+        async def delete_product_by_id(self, product_id, if_match=None):
+            if not await self.product_repo.get_product_by_id(product_id):
+                raise NotFoundError(message=f"Product {product_id} not found")
+            await super().delete_product_by_id(product_id, if_match)
+
+    injector.binder.bind(ProductService, to=PreCheckProductService, scope=singleton)
+
+
+async def run(args: argparse.Namespace, database: str) -> t.List[t.Dict[str, t.Any]]:
+    from bench.asgi import lifespan
+    from main import app
+
+    if args.pre_check:
+        bind_pre_check_service()
+    results = []
+    async with lifespan(app):
+        for size in args.sizes:
+            print(f"{size} products")
+            results += await run_size(app, database, size, args)
+    return results
+
+
+def main(argv: t.Sequence[str]):
+    args = parse_args(argv)
+    random.seed(0)
+    with tempfile.TemporaryDirectory() as directory:
+        database = os.path.join(directory, "bench.db")
+        configure_environment(args, database)
+        create_schema(database)
+        results = asyncio.run(run(args, database))
+
+    from core import cfg
+
+    with open(args.output, "w") as file:
+        json.dump(
+            {
+                "started_at": dt.datetime.now(dt.timezone.utc).isoformat(),
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "database": "sqlite",
+                "requests": args.requests,
+                "concurrency": args.concurrency,
+                "product_cache": cfg.PRODUCT_CACHE_ENABLED,
+                "pre_check": args.pre_check,
+                "results": results,
+            },
+            file,
+            indent=2,
+        )
+    print(f"Results written to {args.output}")
+    if args.baseline:
+        compare(results, args.baseline)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -23,4 +23,41 @@ class LogLevelEnum(StrEnum):
     WARN = auto()
     INFO = auto()
     DEBUG = auto()
-    NOTSET = auto()
\ No newline at end of file
+    NOTSET = auto()
+
+class CountModeEnum(StrEnum):
+    """
+    How the total number of elements of a page is computed
+    """
+
+    EXACT = auto()
+    ESTIMATE = auto()
+    NONE = auto()
+
+
+class FileFormatEnum(StrEnum):
+    """
+    Bulk file formats
+    """
+
+    NDJSON = auto()
+    CSV = auto()
+
+
+class RepoBackendEnum(StrEnum):
+    """
+    Database access of the product repository
+    """
+
+    DATABASES = auto()
+    ASYNCPG = auto()
+
+
+class PriorityClassEnum(StrEnum):
+    """
+    Admission priority classes, the first is served first
+    """
+
+    READ = auto()
+    WRITE = auto()
+    BULK = auto()
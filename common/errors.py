@@ -131,4 +131,40 @@ class MissingRequiredParameterError(BaseHTTPError):
     """
 
     def __init__(self, *, message="Missing required parameter", headers=None):
-        super().__init__(message=message, status_code=status.HTTP_400_BAD_REQUEST, headers=headers)
\ No newline at end of file
+        super().__init__(message=message, status_code=status.HTTP_400_BAD_REQUEST, headers=headers)
+
+class InvalidCursorError(BaseHTTPError):
+    """
+    (400)
+    """
+
+    def __init__(self, *, message="Invalid pagination cursor", headers=None):
+        super().__init__(message=message, status_code=status.HTTP_400_BAD_REQUEST, headers=headers)
+
+
+class PreconditionFailedError(BaseHTTPError):
+    """
+    (412)
+    """
+
+    def __init__(self, *, message="The resource was modified since it was last fetched", headers=None):
+        super().__init__(message=message, status_code=status.HTTP_412_PRECONDITION_FAILED, headers=headers)
+
+
+class ServiceOverloadedError(BaseHTTPError):
+    """
+    (503) The request was shed by admission control, to be retried after `retry_after` seconds
+    """
+
+    def __init__(self, *, message="The service is overloaded, retry later", retry_after: int = 1, headers=None):
+        headers = {"Retry-After": retry_after, **(headers or {})}
+        super().__init__(message=message, status_code=status.HTTP_503_SERVICE_UNAVAILABLE, headers=headers)
+
+
+class QueryTimeoutError(BaseHTTPError):
+    """
+    (504) A database call ran past its timeout and was cancelled
+    """
+
+    def __init__(self, *, message="The request took too long and was cancelled", headers=None):
+        super().__init__(message=message, status_code=status.HTTP_504_GATEWAY_TIMEOUT, headers=headers)
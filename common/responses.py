@@ -0,0 +1,116 @@
+import datetime as dt
+import typing as t
+from decimal import Decimal
+from uuid import UUID as PyUUID
+
+import orjson
+from fastapi import status
+from pydantic import BaseModel, PrivateAttr
+from starlette.responses import Response
+
+from common.schemas import dt_to_iso8601z
+
+# (attribute name, JSON key) of every field, per schema class
+_KEY_TABLES: t.Dict[type, t.Tuple[t.Tuple[str, str], ...]] = {}
+# Same for PreEncoded schemas, kept apart so that orjson_default does not take them for plain ones
+_PRE_ENCODED_KEY_TABLES: t.Dict[type, t.Tuple[t.Tuple[str, str], ...]] = {}
+
+
+def _key_table(
+    schema: t.Type[BaseModel], tables: t.Dict[type, t.Tuple[t.Tuple[str, str], ...]] = _KEY_TABLES
+) -> t.Tuple[t.Tuple[str, str], ...]:
+    table = tables.get(schema)
+    if table is None:
+        table = tables[schema] = tuple(
+            (name, field.serialization_alias or field.alias or name) for name, field in schema.model_fields.items()
+        )
+    return table
+
+
+class PreEncoded(BaseModel):
+    """
+    Schema base whose instances are encoded once: `dumps` reuses the JSON of the first
+    encoding afterwards. Only for instances that are shared and never modified (cached).
+    """
+
+    _json: t.Optional[orjson.Fragment] = PrivateAttr(None)
+
+    def json_fragment(self) -> orjson.Fragment:
+        # Not through self._json: pydantic resolves private attributes in __getattr__ (µs)
+        private = self.__pydantic_private__
+        fragment = private["_json"]
+        if fragment is None:
+            values = self.__dict__
+            table = _key_table(type(self), _PRE_ENCODED_KEY_TABLES)
+            fragment = private["_json"] = orjson.Fragment(dumps({key: values[name] for name, key in table}))
+        return fragment
+
+
+def orjson_default(value: t.Any) -> t.Any:
+    """
+    orjson fallback for the types it does not encode the way our schemas do: models
+    (by alias, PreEncoded ones from their stored JSON), datetimes (dt_to_iso8601z, needs
+    OPT_PASSTHROUGH_DATETIME), Decimals and UUID subclasses (asyncpg's)
+    """
+    # Exact type lookups first: this runs for every model and datetime of the response
+    table = _KEY_TABLES.get(type(value))
+    if table is not None:
+        values = value.__dict__
+        return {key: values[name] for name, key in table}
+    if type(value) is dt.datetime:
+        return dt_to_iso8601z(value)
+    if isinstance(value, PreEncoded):
+        return value.json_fragment()
+    if isinstance(value, BaseModel):
+        values = value.__dict__
+        return {key: values[name] for name, key in _key_table(type(value))}
+    if isinstance(value, dt.datetime):
+        return dt_to_iso8601z(value)
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, PyUUID):
+        return str(value)
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def dumps(content: t.Any) -> bytes:
+    """Encode like `model_dump_json(by_alias=True)` would, with the traversal done by orjson"""
+    return orjson.dumps(content, default=orjson_default, option=orjson.OPT_PASSTHROUGH_DATETIME)
+
+
+class FastJSONResponse(Response):
+    """
+    JSON response encoding pydantic models directly with orjson. Returning it from an
+    endpoint also skips FastAPI's response_model validation and serialization, so it is
+    only for content that is already made of valid schema instances.
+    """
+
+    media_type = "application/json"
+
+    def render(self, content: t.Any) -> bytes:
+        return dumps(content)
+
+
+def json_objects(rows: t.Iterable[t.Sequence[t.Any]], schema: t.Type[BaseModel]) -> t.List[t.Dict[str, t.Any]]:
+    """
+    JSON objects of a schema from rows of JSON-ready values (str, float, bool, None)
+    in the schema field order, without building any model
+    """
+    keys = [key for _, key in _key_table(schema)]
+    return [dict(zip(keys, row)) for row in rows]
+
+
+def api_response(
+    data: t.Any,
+    message: t.Optional[str] = None,
+    *,
+    status_code: int = status.HTTP_200_OK,
+    headers: t.Optional[t.Mapping[str, str]] = None,
+) -> FastJSONResponse:
+    """
+    Successful APIResponse / APIPageResponse envelope around data (schema instances,
+    lists of them or a GenericPage), without building the envelope model
+    """
+    return FastJSONResponse(
+        {"status": "SUCCESS", "message": message, "data": data}, status_code=status_code, headers=headers
+    )
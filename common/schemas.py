@@ -2,8 +2,11 @@ import datetime as dt
 import typing as t
 from math import ceil
 
-from pydantic import BaseModel, Field, Json, TypeAdapter, field_validator
+from fastapi import Query
+from fastapi.exceptions import RequestValidationError
+from pydantic import BaseModel, Field, Json, TypeAdapter, ValidationError, field_validator
 
+from common.enums import CountModeEnum
 from lib.camelize import camelize
 
 
@@ -11,7 +14,8 @@ def dt_to_iso8601z(d: dt.datetime) -> str:
     """
     Convert datetime to iso 8601 format, adding milliseconds and "Z" suffix
     """
-    return f"{d.strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3]}Z"
+    # isoformat is much faster than strftime, the first 23 characters are the same
+    return f"{d.isoformat(timespec='milliseconds')[:23]}Z"
 
 
 class BaseSchema(BaseModel):
@@ -44,28 +48,52 @@ class APIResponseBase(BaseSchema):
 
 class GenericPage(BaseSchema, t.Generic[M]):
     content: t.List[M]
-    total_elements: int
-    total_pages: int
-    page_number: int
+    total_elements: t.Union[int, None] = None
+    total_pages: t.Union[int, None] = None
+    # Offset-based fields, null on pages reached through a cursor
+    page_number: t.Union[int, None] = None
     page_size: int
     next_page: t.Union[int, None] = None
     previous_page: t.Union[int, None] = None
+    next_cursor: t.Union[str, None] = None
 
     @classmethod
-    def build_model(cls, *, data: t.Union[t.List[M], None], total: int, limit: int, skip: int):
+    def build_model(
+        cls,
+        *,
+        data: t.Union[t.List[M], None],
+        total: t.Union[int, None],
+        limit: int,
+        skip: t.Union[int, None],
+        has_next: t.Union[bool, None] = None,
+        next_cursor: t.Union[str, None] = None,
+    ):
+        """
+        Build a page. When `total` is unknown (count disabled), `has_next`
+        decides whether a next page exists and the totals are left empty. `skip` is None
+        for a page reached through a cursor: its number and the page links are unknown.
+        """
         if data is None:
             data = []
 
-        total_pages = ceil(total / limit)
+        if skip is None:
+            return GenericPage[M](content=data, total_elements=total, page_size=limit, next_cursor=next_cursor)
         page_number = int(skip / limit) + 1
+        if total is None:
+            total_pages = None
+            next_page = page_number + 1 if has_next else None
+        else:
+            total_pages = ceil(total / limit) or 1
+            next_page = page_number + 1 if page_number < total_pages else None
         return GenericPage[M](
             content=data,
             total_elements=total,
-            total_pages=total_pages or 1,
+            total_pages=total_pages,
             page_number=page_number,
             page_size=limit,
-            next_page=page_number + 1 if page_number < total_pages else None,
+            next_page=next_page,
             previous_page=page_number - 1 if page_number > 1 else None,
+            next_cursor=next_cursor,
         )
 
 
@@ -96,6 +124,26 @@ class FilterRequest(BaseSchema):
             return None
         return TypeAdapter(cls.filter_type()).validate_python(value)
 
+    @classmethod
+    def as_query(cls) -> t.Callable[..., "FilterRequest"]:
+        """
+        FastAPI dependency reading the filter from the `filter` query parameter.
+        (Depends() on the class would parse the JSON twice.)
+        """
+
+        def dependency(filter: t.Union[str, None] = Query(default=None, description="JSON filter")):
+            try:
+                return cls(filter=filter)
+            except ValidationError as e:
+                raise RequestValidationError(
+                    [
+                        {**error, "loc": ("query", *error["loc"])}
+                        for error in e.errors(include_url=False, include_context=False)
+                    ]
+                )
+
+        return dependency
+
 
 class PaginationParams(BaseSchema):
     """
@@ -104,6 +152,12 @@ class PaginationParams(BaseSchema):
 
     page: int = Field(default=1, ge=1)
     size: int = Field(default=10, ge=1, le=100)
+    cursor: t.Union[str, None] = Field(
+        default=None, description="Keyset cursor (nextCursor of the previous page), takes precedence over page"
+    )
+    count: CountModeEnum = Field(
+        default=CountModeEnum.EXACT, description="How totalElements is computed: EXACT, ESTIMATE or NONE"
+    )
 
     @property
     def skip(self) -> int:
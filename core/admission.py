@@ -0,0 +1,229 @@
+import asyncio
+import collections
+import time
+import typing as t
+
+from fastapi import Request
+
+from common.enums import PriorityClassEnum
+from common.errors import ServiceOverloadedError
+from core import metrics
+from core.config import cfg
+
+admission_requests = metrics.registry.counter(
+    "admission_requests_total",
+    "Requests admitted right away, after queueing, or shed (queue full or queued too long)",
+    ("priority", "result"),
+)
+admission_queue_time = metrics.registry.histogram(
+    "admission_queue_seconds",
+    "Time spent waiting for admission, by priority class",
+    ("priority",),
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0),
+)
+
+
+class _Waiter:
+    __slots__ = ("future", "priority", "route", "enqueued_at")
+
+    def __init__(self, future: asyncio.Future, priority: PriorityClassEnum, route: str):
+        self.future = future
+        self.priority = priority
+        self.route = route
+        self.enqueued_at = time.monotonic()
+
+
+class AdmissionController:
+    """
+    Bounds the requests running at once so that bursts wait here, in a bounded queue, instead
+    of piling up without bound in front of the database pool.
+
+    Requests run while they fit in `max_concurrency` and the limits of their priority class
+    and route. The others are queued and admitted by priority class (PriorityClassEnum order,
+    first in first out within a class), skipping those whose own limits are still reached:
+    a limit on bulk operations keeps room for the cheap reads.
+
+    Queue time is bounded CoDel style: the queue is standing (overloaded) when even the
+    shortest queue time of a whole `interval` exceeded `target_delay`. Requests then wait at
+    most `target_delay`, otherwise up to `max_queue_time` (only held back by their own
+    class or route limits), before being shed with a 503. A full queue sheds right away.
+
+    Not thread safe: meant to be used from a single event loop.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int,
+        *,
+        class_limits: t.Optional[t.Mapping[PriorityClassEnum, int]] = None,
+        route_limits: t.Optional[t.Mapping[str, int]] = None,
+        route_classes: t.Optional[t.Mapping[str, PriorityClassEnum]] = None,
+        queue_size: int = 100,
+        target_delay: float = 0.05,
+        interval: float = 0.5,
+        max_queue_time: float = 5.0,
+        retry_after: int = 1,
+    ):
+        self.max_concurrency = max_concurrency
+        self.class_limits = dict(class_limits or {})
+        self.route_limits = dict(route_limits or {})
+        self.route_classes = dict(route_classes or {})
+        self.queue_size = queue_size
+        self.target_delay = target_delay
+        self.interval = interval
+        self.max_queue_time = max_queue_time
+        self.retry_after = retry_after
+        self.running = 0
+        self.running_by_class: t.Counter[PriorityClassEnum] = collections.Counter()
+        self.running_by_route: t.Counter[str] = collections.Counter()
+        self.queues: t.Dict[PriorityClassEnum, t.Deque[_Waiter]] = {
+            priority: collections.deque() for priority in PriorityClassEnum
+        }
+        self.queued = 0
+        self.overloaded = False
+        self._interval_end = time.monotonic() + interval
+        # Shortest queue time seen during the current interval
+        self._min_delay: t.Optional[float] = None
+
+    def priority_of(self, method: str, route: str) -> PriorityClassEnum:
+        """Class of a route ("METHOD /path"): configured, else READ for GET and HEAD and WRITE otherwise"""
+        priority = self.route_classes.get(route)
+        if priority is not None:
+            return priority
+        return PriorityClassEnum.READ if method in ("GET", "HEAD") else PriorityClassEnum.WRITE
+
+    async def acquire(self, priority: PriorityClassEnum, route: str):
+        """Wait for a slot, raising ServiceOverloadedError when the request is shed"""
+        if not self.queued and self._has_room(priority, route):
+            self._start(priority, route, 0.0)
+            admission_requests.labels(priority.value, "admitted").inc()
+            return
+        if self.queued >= self.queue_size:
+            self._shed(priority, 0.0)
+
+        waiter = _Waiter(asyncio.get_running_loop().create_future(), priority, route)
+        self.queues[priority].append(waiter)
+        self.queued += 1
+        self._dispatch()
+        if not waiter.future.done():
+            try:
+                # shield: the timeout must not cancel the future, that _dispatch may resolve meanwhile
+                await asyncio.wait_for(asyncio.shield(waiter.future), self._queue_timeout())
+            except asyncio.TimeoutError:
+                pass
+            except asyncio.CancelledError:
+                # The client went away while queued
+                if waiter.future.done():
+                    self.release(priority, route)
+                else:
+                    self._remove(waiter)
+                raise
+        if not waiter.future.done():
+            self._remove(waiter)
+            self._shed(priority, time.monotonic() - waiter.enqueued_at)
+        admission_requests.labels(priority.value, "queued").inc()
+
+    def release(self, priority: PriorityClassEnum, route: str):
+        self.running -= 1
+        self.running_by_class[priority] -= 1
+        self.running_by_route[route] -= 1
+        if self.queued:
+            self._dispatch()
+
+    def _has_room(self, priority: PriorityClassEnum, route: str) -> bool:
+        if self.running >= self.max_concurrency:
+            return False
+        limit = self.class_limits.get(priority)
+        if limit is not None and self.running_by_class[priority] >= limit:
+            return False
+        limit = self.route_limits.get(route)
+        return limit is None or self.running_by_route[route] < limit
+
+    def _start(self, priority: PriorityClassEnum, route: str, delay: float):
+        self.running += 1
+        self.running_by_class[priority] += 1
+        self.running_by_route[route] += 1
+        self._observe(priority, delay)
+
+    def _dispatch(self):
+        """Admit the queued requests that fit, highest priority class first"""
+        for queue in self.queues.values():
+            for waiter in list(queue):
+                if self.running >= self.max_concurrency:
+                    return
+                if self._has_room(waiter.priority, waiter.route):
+                    queue.remove(waiter)
+                    self.queued -= 1
+                    self._start(waiter.priority, waiter.route, time.monotonic() - waiter.enqueued_at)
+                    waiter.future.set_result(None)
+
+    def _remove(self, waiter: _Waiter):
+        self.queues[waiter.priority].remove(waiter)
+        self.queued -= 1
+
+    def _shed(self, priority: PriorityClassEnum, delay: float) -> t.NoReturn:
+        if delay:
+            self._observe(priority, delay)
+        admission_requests.labels(priority.value, "shed").inc()
+        raise ServiceOverloadedError(retry_after=self.retry_after)
+
+    def _observe(self, priority: PriorityClassEnum, delay: float):
+        admission_queue_time.labels(priority.value).observe(delay)
+        if self._min_delay is None or delay < self._min_delay:
+            self._min_delay = delay
+        now = time.monotonic()
+        if now >= self._interval_end:
+            self.overloaded = self._min_delay > self.target_delay
+            self._min_delay = None
+            self._interval_end = now + self.interval
+
+    def _queue_timeout(self) -> float:
+        return self.target_delay if self.overloaded else self.max_queue_time
+
+
+controller = AdmissionController(
+    cfg.ADMISSION_MAX_CONCURRENCY,
+    class_limits=cfg.ADMISSION_CLASS_LIMITS,
+    route_limits=cfg.ADMISSION_ROUTE_LIMITS,
+    route_classes=cfg.ADMISSION_ROUTE_CLASSES,
+    queue_size=cfg.ADMISSION_QUEUE_SIZE,
+    target_delay=cfg.ADMISSION_TARGET_DELAY_MS / 1000,
+    interval=cfg.ADMISSION_INTERVAL_MS / 1000,
+    max_queue_time=cfg.ADMISSION_MAX_QUEUE_MS / 1000,
+    retry_after=cfg.ADMISSION_RETRY_AFTER_SECONDS,
+)
+
+
+async def admit(request: Request) -> t.AsyncIterator[None]:
+    """
+    Router dependency holding an admission slot for the whole request: FastAPI runs the
+    code after yield once the response was sent, streamed bodies included
+    """
+    route = f"{request.method} {request.scope['route'].path.removeprefix(cfg.API_PREFIX_STR)}"
+    priority = controller.priority_of(request.method, route)
+    await controller.acquire(priority, route)
+    try:
+        yield
+    finally:
+        controller.release(priority, route)
+
+
+def _collect_admission() -> t.Iterator[t.Tuple[t.Tuple[str, ...], float]]:
+    for priority in PriorityClassEnum:
+        yield (priority.value, "running"), controller.running_by_class[priority]
+        yield (priority.value, "queued"), len(controller.queues[priority])
+
+
+def _collect_overloaded() -> t.Iterator[t.Tuple[t.Tuple[str, ...], float]]:
+    yield (), float(controller.overloaded)
+
+
+metrics.registry.callback(
+    "admission_current_requests",
+    "Requests running and queued by priority class",
+    ("priority", "state"),
+    _collect_admission,
+)
+metrics.registry.callback(
+    "admission_overloaded", "1 while the admission queue is standing (CoDel)", (), _collect_overloaded
+)
@@ -0,0 +1,279 @@
+import gzip
+import hashlib
+import typing as t
+import zlib
+
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
+
+from core import metrics
+from lib.lru import TTLCache
+
+# Optional encoders: only offered when their package is installed
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/")
+
+compression_bytes = metrics.registry.counter(
+    "http_compression_bytes_total", "Response body bytes before and after compression", ("encoding", "stage")
+)
+compression_cache = metrics.registry.counter(
+    "http_compression_cache_total", "Compressed body cache lookups", ("result",)
+)
+
+
+class StreamCompressor(t.Protocol):
+    def compress(self, chunk: bytes) -> bytes:
+        """Compressed data for a chunk, flushed so that the client can decode it right away"""
+
+    def finish(self) -> bytes:
+        """End of the compressed stream"""
+
+
+class Encoding:
+    """A content coding: one-shot compression of whole bodies and streaming compression"""
+
+    name = ""
+
+    def compress(self, body: bytes) -> bytes:
+        raise NotImplementedError
+
+    def stream(self) -> StreamCompressor:
+        raise NotImplementedError
+
+
+class GzipEncoding(Encoding):
+    name = "gzip"
+
+    def __init__(self, level: int):
+        self.level = level
+
+    def compress(self, body: bytes) -> bytes:
+        return gzip.compress(body, self.level, mtime=0)
+
+    def stream(self) -> StreamCompressor:
+        return _ZlibStream(zlib.compressobj(self.level, zlib.DEFLATED, 16 + zlib.MAX_WBITS))
+
+
+class _ZlibStream:
+    def __init__(self, compressor):
+        self._compressor = compressor
+
+    def compress(self, chunk: bytes) -> bytes:
+        return self._compressor.compress(chunk) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+
+class BrotliEncoding(Encoding):
+    name = "br"
+
+    def __init__(self, quality: int):
+        self.quality = quality
+
+    def compress(self, body: bytes) -> bytes:
+        return brotli.compress(body, quality=self.quality)
+
+    def stream(self) -> StreamCompressor:
+        return _BrotliStream(brotli.Compressor(quality=self.quality))
+
+
+class _BrotliStream:
+    def __init__(self, compressor):
+        self._compressor = compressor
+
+    def compress(self, chunk: bytes) -> bytes:
+        return self._compressor.process(chunk) + self._compressor.flush()
+
+    def finish(self) -> bytes:
+        return self._compressor.finish()
+
+
+class ZstdEncoding(Encoding):
+    name = "zstd"
+
+    def __init__(self, level: int):
+        self.level = level
+
+    # A ZstdCompressor only runs one operation at a time: one per body or stream
+    def compress(self, body: bytes) -> bytes:
+        return zstandard.ZstdCompressor(level=self.level).compress(body)
+
+    def stream(self) -> StreamCompressor:
+        return _ZstdStream(zstandard.ZstdCompressor(level=self.level).compressobj())
+
+
+class _ZstdStream:
+    def __init__(self, compressor):
+        self._compressor = compressor
+
+    def compress(self, chunk: bytes) -> bytes:
+        return self._compressor.compress(chunk) + self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+
+def available_encodings(gzip_level: int, brotli_quality: int, zstd_level: int) -> t.List[Encoding]:
+    """Supported encodings, preferred first when the client accepts several equally"""
+    encodings: t.List[Encoding] = []
+    if zstandard is not None:
+        encodings.append(ZstdEncoding(zstd_level))
+    if brotli is not None:
+        encodings.append(BrotliEncoding(brotli_quality))
+    encodings.append(GzipEncoding(gzip_level))
+    return encodings
+
+
+def negotiate(accept_encoding: str, encodings: t.Sequence[Encoding]) -> t.Optional[Encoding]:
+    """Encoding with the highest q-value in Accept-Encoding, ties going to the first of `encodings`"""
+    weights: t.Dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        weight = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        weights[name] = weight
+    best, best_weight = None, 0.0
+    for encoding in encodings:
+        weight = weights.get(encoding.name, weights.get("*", 0.0))
+        if weight > best_weight:
+            best, best_weight = encoding, weight
+    return best
+
+
+class CompressionMiddleware:
+    """
+    Compresses responses with the best encoding accepted by the client among zstd, br
+    (when their packages are installed) and gzip.
+
+    Whole bodies of `thread_min_size` bytes and more are compressed in the thread pool
+    so that the event loop keeps serving other requests. Those of `cache_min_size` and
+    more are cached compressed, keyed by path, query and ETag (or content hash when the
+    response has no ETag), so an unchanged product list is only compressed once per
+    encoding. Streamed bodies (exports) are compressed chunk by chunk as they are sent,
+    and never cached.
+    """
+
+    def __init__(
+        self,
+        app,
+        minimum_size: int = 1000,
+        thread_min_size: int = 32768,
+        cache_min_size: int = 32768,
+        cache_max_entries: int = 32,
+        cache_ttl: float = 300.0,
+        gzip_level: int = 6,
+        brotli_quality: int = 4,
+        zstd_level: int = 3,
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.thread_min_size = thread_min_size
+        self.cache_min_size = cache_min_size
+        self.cache: TTLCache[t.Tuple, bytes] = TTLCache(max_size=cache_max_entries, ttl=cache_ttl)
+        self.encodings = available_encodings(gzip_level, brotli_quality, zstd_level)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        encoding = negotiate(Headers(scope=scope).get("accept-encoding", ""), self.encodings)
+        if encoding is None:
+            return await self.app(scope, receive, send)
+        await self.app(scope, receive, _CompressingSender(self, scope, encoding, send))
+
+    async def compress(self, scope, encoding: Encoding, body: bytes, etag: t.Optional[str]) -> bytes:
+        key = None
+        if len(body) >= self.cache_min_size:
+            version = etag or hashlib.blake2b(body, digest_size=16).hexdigest()
+            key = (encoding.name, scope["path"], scope["query_string"], version)
+            found, compressed = self.cache.get(key)
+            compression_cache.labels("hit" if found else "miss").inc()
+            if found:
+                return compressed
+        if len(body) >= self.thread_min_size:
+            compressed = await run_in_threadpool(encoding.compress, body)
+        else:
+            compressed = encoding.compress(body)
+        if key is not None:
+            self.cache.set(key, compressed)
+        return compressed
+
+
+class _CompressingSender:
+    """ASGI send of one response: holds the start message until the first body message tells how to encode"""
+
+    def __init__(self, middleware: CompressionMiddleware, scope, encoding: Encoding, send):
+        self.middleware = middleware
+        self.scope = scope
+        self.encoding = encoding
+        self.send = send
+        self.start: t.Optional[t.MutableMapping[str, t.Any]] = None
+        self.stream: t.Optional[StreamCompressor] = None
+        self.passthrough = False
+
+    async def __call__(self, message):
+        message_type = message["type"]
+        if message_type == "http.response.start":
+            self.start = message
+            return
+        if message_type != "http.response.body" or self.passthrough:
+            return await self.send(message)
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if self.start is not None:
+            start, self.start = self.start, None
+            headers = MutableHeaders(scope=start)
+            if not self._compressible(start["status"], headers, body, more_body):
+                self.passthrough = True
+                await self.send(start)
+                return await self.send(message)
+            headers["Content-Encoding"] = self.encoding.name
+            headers.add_vary_header("Accept-Encoding")
+            if more_body:
+                del headers["Content-Length"]
+                self.stream = self.encoding.stream()
+            else:
+                compressed = await self.middleware.compress(self.scope, self.encoding, body, headers.get("ETag"))
+                self._count(body, compressed)
+                headers["Content-Length"] = str(len(compressed))
+                await self.send(start)
+                return await self.send({"type": "http.response.body", "body": compressed})
+            await self.send(start)
+
+        if len(body) >= self.middleware.thread_min_size:
+            compressed = await run_in_threadpool(self.stream.compress, body)
+        else:
+            compressed = self.stream.compress(body) if body else b""
+        if not more_body:
+            compressed += self.stream.finish()
+        self._count(body, compressed)
+        await self.send({"type": "http.response.body", "body": compressed, "more_body": more_body})
+
+    def _compressible(self, status: int, headers: MutableHeaders, body: bytes, more_body: bool) -> bool:
+        if "content-encoding" in headers or status < 200 or status in (204, 304):
+            return False
+        if not headers.get("content-type", "").startswith(COMPRESSIBLE_TYPES):
+            return False
+        # The size of streamed bodies is unknown, they are always compressed
+        return more_body or len(body) >= self.middleware.minimum_size
+
+    def _count(self, body: bytes, compressed: bytes):
+        compression_bytes.labels(self.encoding.name, "in").inc(len(body))
+        compression_bytes.labels(self.encoding.name, "out").inc(len(compressed))
@@ -1,8 +1,8 @@
-from typing import List, Union
+from typing import Dict, List, Union
 
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
-from common.enums import LogLevelEnum
+from common.enums import LogLevelEnum, PriorityClassEnum, RepoBackendEnum
 from typing import Optional
 
 class Settings(BaseSettings):
@@ -16,6 +16,146 @@ class Settings(BaseSettings):
     SQLALCHEMY_DATABASE_URI: str
     POSTGRES_MIN_POOL_SIZE: int = 5
     POSTGRES_MAX_POOL_SIZE: int = 10
+    # Server-side statement_timeout of every connection, a backstop for the repo timeouts (0 for none)
+    POSTGRES_STATEMENT_TIMEOUT_MS: int = 60000
+
+    # Connections opened and pinged by each pool at startup, before /health/ready reports ready
+    POOL_WARMUP_CONNECTIONS: int = 10
+    # Adaptive pool sizing: every POOL_ADAPTIVE_INTERVAL_SECONDS the max size of each pool moves
+    # between POOL_ADAPTIVE_MIN_SIZE and POOL_ADAPTIVE_MAX_SIZE, up when requests waited over
+    # POOL_ADAPTIVE_TARGET_WAIT_MS for a busy pool, down after a while of low utilization
+    POOL_ADAPTIVE_ENABLED: bool = False
+    POOL_ADAPTIVE_MIN_SIZE: int = 5
+    POOL_ADAPTIVE_MAX_SIZE: int = 30
+    POOL_ADAPTIVE_INTERVAL_SECONDS: float = 5.0
+    POOL_ADAPTIVE_TARGET_WAIT_MS: float = 10.0
+    # Time /health/ready gives the primary to answer
+    HEALTH_CHECK_TIMEOUT_SECONDS: float = 1.0
+
+    # ProductRepo calls running longer than their timeout, by method name in
+    # REPO_METHOD_TIMEOUTS_SECONDS and REPO_TIMEOUT_SECONDS otherwise (0 for none), are
+    # cancelled with their statement and answered with a 504
+    REPO_TIMEOUT_SECONDS: float = 5.0
+    REPO_METHOD_TIMEOUTS_SECONDS: Dict[str, float] = {
+        "get_product_by_id": 1.0,
+        "get_product_version": 1.0,
+        "get_products_version": 2.0,
+        "get_all_products": 10.0,
+        "get_all_products_json_rows": 10.0,
+        "get_suggest_entries": 30.0,
+        "refresh_product_facets": 60.0,
+        "import_products": 0.0,
+    }
+
+    # Read replicas serving the read-only repository queries in turn, checked every
+    # REPLICA_HEALTH_CHECK_SECONDS (the primary serves them when none is healthy).
+    # A client's reads stay on the primary for READ_YOUR_WRITES_SECONDS after it wrote.
+    SQLALCHEMY_REPLICA_URIS: List[str] = []
+    REPLICA_MIN_POOL_SIZE: int = 5
+    REPLICA_MAX_POOL_SIZE: int = 10
+    REPLICA_HEALTH_CHECK_SECONDS: float = 5.0
+    READ_YOUR_WRITES_SECONDS: float = 5.0
+
+    # DATABASES runs every product query through databases and SQLAlchemy. ASYNCPG runs
+    # the hottest reads straight on the asyncpg pools with precompiled statements
+    # (Postgres only, other backends keep going through databases).
+    PRODUCT_REPO_BACKEND: RepoBackendEnum = RepoBackendEnum.DATABASES
+
+    # Admission control of the API routes. At most ADMISSION_MAX_CONCURRENCY requests run at
+    # once (about twice the pool: requests also spend time outside the database), and at most
+    # ADMISSION_CLASS_LIMITS / ADMISSION_ROUTE_LIMITS per priority class and per route. Routes
+    # are "METHOD /path" without the API prefix, and are READ (GET) or WRITE unless listed in
+    # ADMISSION_ROUTE_CLASSES. The others wait in a queue of ADMISSION_QUEUE_SIZE, served
+    # READ first, then WRITE, then BULK. Once queue times stayed above ADMISSION_TARGET_DELAY_MS
+    # for a whole ADMISSION_INTERVAL_MS (CoDel), waiting longer than the target gets a 503
+    # with Retry-After: ADMISSION_RETRY_AFTER_SECONDS. Otherwise requests held back by their
+    # class or route limits wait up to ADMISSION_MAX_QUEUE_MS.
+    ADMISSION_ENABLED: bool = True
+    ADMISSION_MAX_CONCURRENCY: int = 20
+    ADMISSION_CLASS_LIMITS: Dict[PriorityClassEnum, int] = {PriorityClassEnum.BULK: 2}
+    ADMISSION_ROUTE_LIMITS: Dict[str, int] = {}
+    ADMISSION_ROUTE_CLASSES: Dict[str, PriorityClassEnum] = {
+        "GET /product/export": PriorityClassEnum.BULK,
+        "POST /product/import": PriorityClassEnum.BULK,
+        "POST /product/batch": PriorityClassEnum.BULK,
+    }
+    ADMISSION_QUEUE_SIZE: int = 100
+    ADMISSION_TARGET_DELAY_MS: float = 50.0
+    ADMISSION_INTERVAL_MS: float = 500.0
+    ADMISSION_MAX_QUEUE_MS: float = 5000.0
+    ADMISSION_RETRY_AFTER_SECONDS: int = 1
+
+    # Rows fetched from the cursor and serialized per chunk by the export endpoint
+    EXPORT_BATCH_SIZE: int = 1000
+    # Rows validated and sent through COPY per chunk by the import endpoint
+    IMPORT_CHUNK_SIZE: int = 5000
+
+    # In-process cache of products by id
+    PRODUCT_CACHE_ENABLED: bool = True
+    PRODUCT_CACHE_MAX_SIZE: int = 10000
+    PRODUCT_CACHE_TTL_SECONDS: float = 30.0
+    # Unknown ids are cached for a shorter time
+    PRODUCT_CACHE_NEGATIVE_TTL_SECONDS: float = 5.0
+
+    # In-process prefix index serving the suggest endpoint, rebuilt from the table
+    # every SUGGEST_INDEX_REFRESH_SECONDS (0 disables the rebuild)
+    SUGGEST_INDEX_ENABLED: bool = True
+    SUGGEST_INDEX_REFRESH_SECONDS: float = 300.0
+    # Shortest prefix for which the trigram fallback is queried
+    SUGGEST_FUZZY_MIN_LENGTH: int = 3
+
+    # In-process top trending products per category, reloaded when older than the refresh interval
+    TRENDING_TOP_N: int = 100
+    TRENDING_REFRESH_SECONDS: float = 60.0
+    TRENDING_MAX_BOARDS: int = 1000
+
+    # Serve unfiltered facets from the product_facets materialized view, refreshed every
+    # FACETS_REFRESH_SECONDS and after FACETS_REFRESH_AFTER_WRITES product writes (0 disables either)
+    FACETS_MATERIALIZED_VIEW: bool = False
+    FACETS_REFRESH_SECONDS: float = 60.0
+    FACETS_REFRESH_AFTER_WRITES: int = 1000
+
+    # Statements slower than SLOW_QUERY_THRESHOLD_MS are logged (0 disables it), and a
+    # SLOW_QUERY_EXPLAIN_SAMPLE_RATE fraction of the slow SELECTs is explained into
+    # SLOW_QUERY_EXPLAIN_FILE (rotated at SLOW_QUERY_EXPLAIN_ROTATION, keeping
+    # SLOW_QUERY_EXPLAIN_RETENTION files)
+    SLOW_QUERY_THRESHOLD_MS: float = 200.0
+    SLOW_QUERY_MAX_FINGERPRINTS: int = 1000
+    SLOW_QUERY_EXPLAIN_SAMPLE_RATE: float = 0.0
+    SLOW_QUERY_EXPLAIN_FILE: str = "logs/slow-query-plans.log"
+    SLOW_QUERY_EXPLAIN_ROTATION: str = "10 MB"
+    SLOW_QUERY_EXPLAIN_RETENTION: int = 5
+
+    # Middleware wrapped around the app, outermost first (see core.middleware.MIDDLEWARE).
+    # Layers can be dropped, e.g. cors for internal deployments.
+    MIDDLEWARE_STACK: List[str] = [
+        "metrics",
+        "disconnect",
+        "process_time",
+        "compression",
+        "correlation_id",
+        "cors",
+        "read_your_writes",
+    ]
+
+    # Response compression (compression middleware) with zstd, br or gzip, for bodies of
+    # COMPRESSION_MIN_SIZE bytes and more. From COMPRESSION_THREAD_MIN_SIZE bytes they are
+    # compressed in the thread pool, from COMPRESSION_CACHE_MIN_SIZE bytes they are cached
+    # compressed (by path, query and ETag or content hash).
+    COMPRESSION_MIN_SIZE: int = 1000
+    COMPRESSION_THREAD_MIN_SIZE: int = 32768
+    COMPRESSION_CACHE_MIN_SIZE: int = 32768
+    COMPRESSION_CACHE_MAX_ENTRIES: int = 32
+    COMPRESSION_CACHE_TTL_SECONDS: float = 300.0
+    COMPRESSION_GZIP_LEVEL: int = 6
+    COMPRESSION_BROTLI_QUALITY: int = 4
+    COMPRESSION_ZSTD_LEVEL: int = 3
+
+    # Prometheus metrics served on /metrics, with the event loop lag sampled every
+    # METRICS_LOOP_LAG_INTERVAL_SECONDS. The request metrics come from the metrics
+    # middleware of MIDDLEWARE_STACK.
+    METRICS_ENABLED: bool = True
+    METRICS_LOOP_LAG_INTERVAL_SECONDS: float = 0.5
 
     # # Authentication settings
     # SECRET_KEY: str = "hippo-zeus-secret-key"
@@ -14,4 +14,16 @@ def on(dependency_class: t.Type[T]) -> t.Callable[[], T]:
 
 
 async def configure():
-    pass
\ No newline at end of file
+    # Imported here as product modules depend on this one
+    from core.config import cfg
+    from common.enums import RepoBackendEnum
+    from lib.lru import TTLCache
+    from products.asyncpg_repo import AsyncpgProductRepo
+    from products.cache import CachedProductRepo
+    from products.repo import ProductRepo
+
+    repo = AsyncpgProductRepo() if cfg.PRODUCT_REPO_BACKEND == RepoBackendEnum.ASYNCPG else ProductRepo()
+    if cfg.PRODUCT_CACHE_ENABLED:
+        cache = TTLCache(max_size=cfg.PRODUCT_CACHE_MAX_SIZE, ttl=cfg.PRODUCT_CACHE_TTL_SECONDS)
+        repo = CachedProductRepo(repo, cache, cfg.PRODUCT_CACHE_NEGATIVE_TTL_SECONDS)
+    injector.binder.bind(ProductRepo, to=repo)
\ No newline at end of file
@@ -8,10 +8,21 @@ from core.config import cfg
 
 def configure():
     def correlation_id_filter(record):
-        record["correlation_id"] = correlation_id.get()
-        return record["correlation_id"]
+        # Records outside of a request (startup, background tasks) have no correlation id
+        record["correlation_id"] = correlation_id.get() or "-"
+        # Query plans only go to their own file
+        return not record["extra"].get("explain")
 
     logger.remove()
     fmt = "{level}: \t  {time} {name}:{line} [{correlation_id}] - {message}"
     # Temporarily force DEBUG level for troubleshooting
-    logger.add(sys.stderr, format=fmt, level=cfg.LOG_LEVEL, filter=correlation_id_filter)
\ No newline at end of file
+    logger.add(sys.stderr, format=fmt, level=cfg.LOG_LEVEL, filter=correlation_id_filter)
+    if cfg.SLOW_QUERY_EXPLAIN_SAMPLE_RATE:
+        logger.add(
+            cfg.SLOW_QUERY_EXPLAIN_FILE,
+            format="{time} - {message}",
+            filter=lambda record: record["extra"].get("explain", False),
+            rotation=cfg.SLOW_QUERY_EXPLAIN_ROTATION,
+            retention=cfg.SLOW_QUERY_EXPLAIN_RETENTION,
+            enqueue=True,
+        )
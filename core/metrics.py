@@ -0,0 +1,171 @@
+import asyncio
+import time
+import typing as t
+
+from lib.metrics import Registry
+
+registry = Registry()
+
+http_requests = registry.counter(
+    "http_requests_total", "HTTP requests by method, route template and status", ("method", "route", "status")
+)
+http_request_duration = registry.histogram(
+    "http_request_duration_seconds", "HTTP request latency by method and route template", ("method", "route")
+)
+db_query_duration = registry.histogram(
+    "db_query_duration_seconds", "Database call latency by repository method", ("repo", "method")
+)
+event_loop_lag = registry.histogram(
+    "event_loop_lag_seconds",
+    "Delay of the event loop in running a task that was due",
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0),
+)
+
+# Routes are labelled by template so that ids do not create a series each
+UNMATCHED_ROUTE = "unmatched"
+# Scope key set by DisconnectMiddleware when it cancelled a request, counted with nginx's
+# 499 status (client closed request)
+CLIENT_DISCONNECTED = "client_disconnected"
+CLIENT_CLOSED_REQUEST = 499
+
+
+class MetricsMiddleware:
+    """
+    Counts requests and observes their latency per method, route template and status.
+    Pure ASGI so that it only costs a timer and two dict lookups per request.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            if scope.get(CLIENT_DISCONNECTED):
+                status_code = CLIENT_CLOSED_REQUEST
+            # The router stores the matched route in the scope
+            route = scope.get("route")
+            route_path = getattr(route, "path", UNMATCHED_ROUTE)
+            method = scope["method"]
+            http_request_duration.labels(method, route_path).observe(elapsed)
+            http_requests.labels(method, route_path, str(status_code)).inc()
+
+
+class EventLoopLagMonitor:
+    """
+    Measures how late the event loop wakes up a task sleeping for `interval`:
+    any callback blocking the loop shows up as lag
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.last_lag = 0.0
+        self._last = time.perf_counter()
+
+    async def sample(self):
+        """Called every `interval` seconds (see tasks.start_periodic)"""
+        now = time.perf_counter()
+        self.last_lag = max(0.0, now - self._last - self.interval)
+        self._last = now
+        event_loop_lag.observe(self.last_lag)
+
+    def start(self) -> asyncio.Task:
+        from core import tasks
+
+        self._last = time.perf_counter()
+        return tasks.start_periodic("event-loop-lag", self.interval, self.sample)
+
+
+def _collect_loop_lag() -> t.Iterator[t.Tuple[t.Tuple[str, ...], float]]:
+    if loop_lag_monitor is not None:
+        yield (), loop_lag_monitor.last_lag
+
+
+def _collect_pool() -> t.Iterator[t.Tuple[t.Tuple[str, ...], float]]:
+    from db.core import pool_controllers
+    from db.pool import asyncpg_pool
+
+    for controller in pool_controllers:
+        name, pool = controller.name, asyncpg_pool(controller.database)
+        if pool is None:
+            continue
+        size, idle = pool.get_size(), pool.get_idle_size()
+        yield (name, "in_use"), size - idle
+        yield (name, "idle"), idle
+        yield (name, "max"), pool.get_max_size()
+        # Tasks blocked in acquire(): asyncpg has no public accessor for its queue's waiters
+        queue = getattr(pool, "_queue", None)
+        yield (name, "waiting"), len(getattr(queue, "_getters", ()))
+
+
+def _collect_replica_health() -> t.Iterator[t.Tuple[t.Tuple[str, ...], float]]:
+    from db.core import read_db
+
+    for index, replica in enumerate(read_db.replicas):
+        yield (f"replica-{index}",), float(read_db.healthy[id(replica)])
+
+
+def _collect_product_cache() -> t.Iterator[t.Tuple[t.Tuple[str, ...], float]]:
+    from core.injection import injector
+    from products.repo import ProductRepo
+
+    cache = getattr(injector.get(ProductRepo), "cache", None)
+    if cache is None:
+        return
+    yield ("hits",), cache.hits
+    yield ("misses",), cache.misses
+    yield ("evictions",), cache.evictions
+    yield ("expirations",), cache.expirations
+
+
+def _collect_read_coalescing() -> t.Iterator[t.Tuple[t.Tuple[str, ...], float]]:
+    from products.service import ProductService
+
+    for name, method in vars(ProductService).items():
+        flight = getattr(method, "flight", None)
+        if flight is not None:
+            yield (name, "executed"), flight.calls - flight.collapsed
+            yield (name, "collapsed"), flight.collapsed
+
+
+loop_lag_monitor: t.Optional[EventLoopLagMonitor] = None
+
+registry.callback("event_loop_lag_last_seconds", "Event loop lag of the last sample", (), _collect_loop_lag)
+registry.callback(
+    "db_pool_connections", "Database pool connections by database and state", ("database", "state"), _collect_pool
+)
+registry.callback(
+    "db_replica_healthy", "1 when the replica passed its last health check", ("database",), _collect_replica_health
+)
+registry.callback(
+    "product_cache_events_total", "Product cache lookups and removals", ("event",), _collect_product_cache, "counter"
+)
+
+registry.callback(
+    "product_read_calls_total",
+    "Product service reads, executed or collapsed into an identical read in flight",
+    ("method", "result"),
+    _collect_read_coalescing,
+    "counter",
+)
+
+
+def start_loop_lag_monitor(interval: float) -> EventLoopLagMonitor:
+    global loop_lag_monitor
+    loop_lag_monitor = EventLoopLagMonitor(interval)
+    loop_lag_monitor.start()
+    return loop_lag_monitor
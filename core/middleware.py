@@ -0,0 +1,144 @@
+import asyncio
+import time
+import typing as t
+
+from asgi_correlation_id import CorrelationIdMiddleware
+from fastapi import FastAPI
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from starlette.datastructures import MutableHeaders
+
+from core import metrics
+from core.compression import CompressionMiddleware
+from core.config import cfg
+from db.routing import ReadYourWritesMiddleware
+
+
+class ProcessTimeMiddleware:
+    """
+    Adds an X-Process-Time header (seconds) to every HTTP response. Pure ASGI: unlike
+    a BaseHTTPMiddleware it runs in the request task and does not wrap the body stream.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        started = time.perf_counter_ns()
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                headers.append("X-Process-Time", str((time.perf_counter_ns() - started) / 1e9))
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+
+class DisconnectMiddleware:
+    """
+    Cancels the request when its client disconnects before the response is complete, so
+    that its queries are cancelled (asyncpg cancels the running statement) and their
+    connections go back to the pool instead of serving a response nobody will read.
+
+    The ASGI receive channel is read by a watcher task, which hands the request body to the
+    app one message at a time (keeping the backpressure of uploads) and notices the
+    http.disconnect. Nothing is cancelled once the response is complete, so background
+    tasks still run.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        request_task = asyncio.current_task()
+        messages: asyncio.Queue = asyncio.Queue(maxsize=1)
+        complete = disconnected = cancelled = False
+
+        async def watch():
+            nonlocal disconnected, cancelled
+            while True:
+                message = await receive()
+                if message["type"] == "http.disconnect":
+                    break
+                await messages.put(message)
+            disconnected = True
+            if not complete:
+                cancelled = True
+                scope[metrics.CLIENT_DISCONNECTED] = True
+                request_task.cancel()
+            await messages.put(message)
+
+        async def receive_wrapper():
+            if disconnected and messages.empty():
+                return {"type": "http.disconnect"}
+            return await messages.get()
+
+        async def send_wrapper(message):
+            nonlocal complete
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                complete = True
+            await send(message)
+
+        watcher = asyncio.create_task(watch())
+        try:
+            await self.app(scope, receive_wrapper, send_wrapper)
+        except asyncio.CancelledError:
+            # Only swallow our own cancellation, not the server's
+            if not cancelled or request_task.uncancel():
+                raise
+        finally:
+            watcher.cancel()
+
+
+# Middleware classes and their options, by name in the MIDDLEWARE_STACK setting
+MIDDLEWARE: t.Dict[str, t.Tuple[type, t.Dict[str, t.Any]]] = {
+    "metrics": (metrics.MetricsMiddleware, {}),
+    "disconnect": (DisconnectMiddleware, {}),
+    "process_time": (ProcessTimeMiddleware, {}),
+    "compression": (
+        CompressionMiddleware,
+        {
+            "minimum_size": cfg.COMPRESSION_MIN_SIZE,
+            "thread_min_size": cfg.COMPRESSION_THREAD_MIN_SIZE,
+            "cache_min_size": cfg.COMPRESSION_CACHE_MIN_SIZE,
+            "cache_max_entries": cfg.COMPRESSION_CACHE_MAX_ENTRIES,
+            "cache_ttl": cfg.COMPRESSION_CACHE_TTL_SECONDS,
+            "gzip_level": cfg.COMPRESSION_GZIP_LEVEL,
+            "brotli_quality": cfg.COMPRESSION_BROTLI_QUALITY,
+            "zstd_level": cfg.COMPRESSION_ZSTD_LEVEL,
+        },
+    ),
+    # Starlette's, gzip only and on the event loop
+    "gzip": (GZipMiddleware, {"minimum_size": 1000}),
+    "correlation_id": (CorrelationIdMiddleware, {}),
+    "cors": (
+        CORSMiddleware,
+        {"allow_origins": ["*"], "allow_credentials": True, "allow_methods": ["*"], "allow_headers": ["*"]},
+    ),
+    # Only does something with read replicas
+    "read_your_writes": (
+        ReadYourWritesMiddleware,
+        {"sticky_seconds": cfg.READ_YOUR_WRITES_SECONDS if cfg.SQLALCHEMY_REPLICA_URIS else 0},
+    ),
+}
+
+
+def install(app: FastAPI, names: t.Sequence[str]):
+    """
+    Add the named middleware to the app, the first name being the outermost
+    (the first to see a request and the last to see its response)
+    """
+    unknown = [name for name in names if name not in MIDDLEWARE]
+    if unknown:
+        raise ValueError(f"Unknown middleware {', '.join(unknown)}, expected some of {', '.join(MIDDLEWARE)}")
+    # Starlette wraps the middleware added last around the others
+    for name in reversed(names):
+        middleware, options = MIDDLEWARE[name]
+        app.add_middleware(middleware, **options)
@@ -4,7 +4,8 @@ from fastapi import APIRouter, Depends, FastAPI, Header
 from fastapi.routing import APIRoute
 
 from common.errors import InvalidApiVersionError
-from core import cfg
+from admin.api import admin_router
+from core import admission, cfg
 from products.api import product_router
 
 
@@ -28,10 +29,13 @@ async def get_api_version(api_version: str = Header(example=cfg.API_VERSION)):
 
 
 main_router = APIRouter()
-router_with_api_version = APIRouter(dependencies=[Depends(get_api_version)])
+router_with_api_version = APIRouter(
+    dependencies=[Depends(get_api_version)] + ([Depends(admission.admit)] if cfg.ADMISSION_ENABLED else [])
+)
 
 
 router_with_api_version.include_router(product_router)
+router_with_api_version.include_router(admin_router)
 main_router.include_router(router_with_api_version)
 
 remove_trailing_slashes_from_routes(main_router)
\ No newline at end of file
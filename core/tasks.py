@@ -0,0 +1,54 @@
+import asyncio
+import typing as t
+
+from loguru import logger
+
+_tasks: t.List[asyncio.Task] = []
+
+
+def start_periodic(name: str, interval: float, function: t.Callable[[], t.Awaitable[t.Any]]) -> asyncio.Task:
+    """
+    Run `function` every `interval` seconds in the background until `stop_all` is called.
+    Errors are logged and do not stop the loop.
+    """
+
+    async def loop():
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await function()
+            except Exception:
+                logger.exception(f"Background task {name} failed")
+
+    task = asyncio.create_task(loop(), name=name)
+    _tasks.append(task)
+    return task
+
+
+def spawn(name: str, coroutine: t.Coroutine[t.Any, t.Any, t.Any]) -> asyncio.Task:
+    """Run a one-off coroutine in the background. Errors are logged."""
+
+    async def run():
+        try:
+            await coroutine
+        except Exception:
+            logger.exception(f"Background task {name} failed")
+
+    task = asyncio.create_task(run(), name=name)
+    _tasks.append(task)
+    task.add_done_callback(_forget)
+    return task
+
+
+def _forget(task: asyncio.Task):
+    if task in _tasks:
+        _tasks.remove(task)
+
+
+async def stop_all():
+    """Cancel every background task started with `start_periodic` or `spawn`"""
+    tasks = list(_tasks)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    _tasks.clear()
@@ -1,14 +1,55 @@
-from databases import Database
+import typing as t
+
+from databases import DatabaseURL
 from sqlalchemy import MetaData
 
 from core import cfg
+from db.instrumentation import InstrumentedDatabase, SlowQueryStats
+from db.pool import AdaptivePoolController
+from db.routing import ReadRouter
 
 # SQLAlchemy Metadata instance
 metadata = MetaData()
 
-# Database instance
-db = Database(
-    cfg.SQLALCHEMY_DATABASE_URI,
-    min_size=cfg.POSTGRES_MIN_POOL_SIZE,
-    max_size=cfg.POSTGRES_MAX_POOL_SIZE,
-)
\ No newline at end of file
+slow_queries = SlowQueryStats(cfg.SLOW_QUERY_MAX_FINGERPRINTS)
+
+
+def _database(url: str, min_size: int, max_size: int) -> InstrumentedDatabase:
+    # Pool options only apply to Postgres, other backends (SQLite in benchmarks) pass options to their driver
+    pool_options: t.Dict[str, t.Any] = {}
+    if DatabaseURL(url).dialect == "postgresql":
+        pool_options = {"min_size": min_size, "max_size": max_size}
+        if cfg.POSTGRES_STATEMENT_TIMEOUT_MS:
+            pool_options["server_settings"] = {"statement_timeout": str(cfg.POSTGRES_STATEMENT_TIMEOUT_MS)}
+    return InstrumentedDatabase(
+        url,
+        slow_query_seconds=cfg.SLOW_QUERY_THRESHOLD_MS / 1000,
+        explain_sample_rate=cfg.SLOW_QUERY_EXPLAIN_SAMPLE_RATE,
+        slow_queries=slow_queries,
+        **pool_options,
+    )
+
+
+# Database instance (primary), logging slow statements
+db = _database(cfg.SQLALCHEMY_DATABASE_URI, cfg.POSTGRES_MIN_POOL_SIZE, cfg.POSTGRES_MAX_POOL_SIZE)
+
+# Read replicas, each with its own pool
+replicas = [
+    _database(url, cfg.REPLICA_MIN_POOL_SIZE, cfg.REPLICA_MAX_POOL_SIZE) for url in cfg.SQLALCHEMY_REPLICA_URIS
+]
+
+# Database for read-only queries: call it for each query, `read_db().fetch_all(...)`
+read_db = ReadRouter(db, replicas, cfg.READ_YOUR_WRITES_SECONDS)
+
+
+# Pool max size controllers, started by the lifespan when enabled
+pool_controllers = [
+    AdaptivePoolController(
+        name,
+        database,
+        min_max_size=cfg.POOL_ADAPTIVE_MIN_SIZE,
+        max_max_size=cfg.POOL_ADAPTIVE_MAX_SIZE,
+        target_wait=cfg.POOL_ADAPTIVE_TARGET_WAIT_MS / 1000,
+    )
+    for name, database in [("primary", db)] + [(f"replica-{index}", replica) for index, replica in enumerate(replicas)]
+]
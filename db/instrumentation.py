@@ -0,0 +1,245 @@
+import datetime as dt
+import hashlib
+import random
+import re
+import time
+import typing as t
+from dataclasses import dataclass
+
+from asgi_correlation_id.context import correlation_id
+from databases import Database
+from loguru import logger
+from sqlalchemy.sql import ClauseElement
+
+Query = t.Union[ClauseElement, str]
+
+# Bind placeholders of every paramstyle (and expanding IN), then literals, then lists of them
+_PLACEHOLDERS = re.compile(
+    r"__\[POSTCOMPILE_\w+\]|%\(\w+\)s|\$\d+|\?|(?<![:\w]):\w+|'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b"
+)
+_LISTS = re.compile(r"\(\s*\?(?:\s*,\s*\?){2,}\s*\)")
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_sql(sql: str) -> str:
+    """SQL with the literals and bind parameters replaced, so that executions of one statement compare equal"""
+    sql = _PLACEHOLDERS.sub("?", sql)
+    sql = _LISTS.sub("(?, ...)", sql)
+    return _SPACES.sub(" ", sql).strip()
+
+
+def fingerprint(normalized_sql: str) -> str:
+    return hashlib.sha1(normalized_sql.encode()).hexdigest()[:16]
+
+
+def redact(values: t.Optional[t.Mapping[str, t.Any]]) -> t.Dict[str, str]:
+    """Parameters without their values, which may be personal data: only their types are logged"""
+    return {name: "NULL" if value is None else f"<{type(value).__name__}>" for name, value in (values or {}).items()}
+
+
+@dataclass
+class StatementStats:
+    fingerprint: str
+    sql: str
+    calls: int = 0
+    total_seconds: float = 0.0
+    max_seconds: float = 0.0
+    last_seen: t.Optional[dt.datetime] = None
+
+    def add(self, seconds: float):
+        self.calls += 1
+        self.total_seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+        self.last_seen = dt.datetime.now(dt.timezone.utc)
+
+
+class SlowQueryStats:
+    """Statements over the threshold, aggregated by fingerprint since startup"""
+
+    def __init__(self, max_fingerprints: int):
+        self.max_fingerprints = max_fingerprints
+        self.statements: t.Dict[str, StatementStats] = {}
+        # Slow executions of fingerprints that did not fit
+        self.dropped = 0
+
+    def add(self, key: str, normalized_sql: str, seconds: float) -> t.Optional[StatementStats]:
+        stats = self.statements.get(key)
+        if stats is None:
+            if len(self.statements) >= self.max_fingerprints:
+                self.dropped += 1
+                return None
+            stats = self.statements[key] = StatementStats(key, normalized_sql)
+        stats.add(seconds)
+        return stats
+
+    def top(self, limit: int) -> t.List[StatementStats]:
+        """Slowest fingerprints first (by maximum duration)"""
+        return sorted(self.statements.values(), key=lambda stats: stats.max_seconds, reverse=True)[:limit]
+
+
+class AcquireWaits:
+    """Time spent waiting for a pool connection, accumulated until the next `drain`"""
+
+    def __init__(self):
+        self.count = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+
+    def add(self, seconds: float):
+        self.count += 1
+        self.total_seconds += seconds
+        if seconds > self.max_seconds:
+            self.max_seconds = seconds
+
+    def drain(self) -> t.Tuple[int, float, float]:
+        """(count, mean seconds, max seconds) since the previous drain"""
+        count, total, maximum = self.count, self.total_seconds, self.max_seconds
+        self.count, self.total_seconds, self.max_seconds = 0, 0.0, 0.0
+        return count, total / count if count else 0.0, maximum
+
+
+class InstrumentedDatabase(Database):
+    """
+    Database logging the statements slower than `slow_query_seconds` with the request
+    correlation id, the compiled SQL, the redacted parameters and the duration.
+
+    Only the statement is timed, the wait for a pool connection is accumulated apart in
+    `acquire_waits` (see db.pool.AdaptivePoolController). A sample of the
+    slow SELECT statements is explained with EXPLAIN (ANALYZE, BUFFERS) in the
+    background and logged with `explain=True` (see core.logging). `iterate` is not
+    timed: it streams for as long as its consumer reads.
+
+    :param slow_query_seconds: 0 disables the instrumentation
+    :param explain_sample_rate: fraction of the slow SELECT statements explained (0 to 1)
+    """
+
+    def __init__(
+        self,
+        url: str,
+        *,
+        slow_query_seconds: float = 0.0,
+        explain_sample_rate: float = 0.0,
+        max_fingerprints: int = 1000,
+        slow_queries: t.Optional[SlowQueryStats] = None,
+        **options: t.Any,
+    ):
+        super().__init__(url, **options)
+        self.slow_query_seconds = slow_query_seconds
+        self.explain_sample_rate = explain_sample_rate
+        # Can be shared by several databases (primary and replicas)
+        self.slow_queries = slow_queries or SlowQueryStats(max_fingerprints)
+        self.acquire_waits = AcquireWaits()
+
+    async def fetch_all(self, query: Query, values: t.Optional[dict] = None):
+        acquiring = time.perf_counter()
+        async with self.connection() as connection:
+            started = time.perf_counter()
+            self.acquire_waits.add(started - acquiring)
+            try:
+                return await connection.fetch_all(query, values)
+            finally:
+                self._observe(query, values, time.perf_counter() - started)
+
+    async def fetch_one(self, query: Query, values: t.Optional[dict] = None):
+        acquiring = time.perf_counter()
+        async with self.connection() as connection:
+            started = time.perf_counter()
+            self.acquire_waits.add(started - acquiring)
+            try:
+                return await connection.fetch_one(query, values)
+            finally:
+                self._observe(query, values, time.perf_counter() - started)
+
+    async def fetch_val(self, query: Query, values: t.Optional[dict] = None, column: t.Any = 0):
+        acquiring = time.perf_counter()
+        async with self.connection() as connection:
+            started = time.perf_counter()
+            self.acquire_waits.add(started - acquiring)
+            try:
+                return await connection.fetch_val(query, values, column=column)
+            finally:
+                self._observe(query, values, time.perf_counter() - started)
+
+    async def execute(self, query: Query, values: t.Optional[dict] = None):
+        acquiring = time.perf_counter()
+        async with self.connection() as connection:
+            started = time.perf_counter()
+            self.acquire_waits.add(started - acquiring)
+            try:
+                return await connection.execute(query, values)
+            finally:
+                self._observe(query, values, time.perf_counter() - started)
+
+    async def execute_many(self, query: Query, values: list):
+        acquiring = time.perf_counter()
+        async with self.connection() as connection:
+            started = time.perf_counter()
+            self.acquire_waits.add(started - acquiring)
+            try:
+                return await connection.execute_many(query, values)
+            finally:
+                self._observe(query, None, time.perf_counter() - started)
+
+    async def fetch_on_pool(
+        self, pool: t.Any, method: str, sql: str, args: t.Sequence[t.Any], values: t.Optional[dict] = None
+    ) -> t.Any:
+        """
+        `method` (fetch, fetchrow, fetchval) of a connection of `pool`, the asyncpg pool of
+        this database, for statements run without databases (see products.asyncpg_repo).
+        Instrumented as the other methods; `values` are the parameters by name, for the log.
+        """
+        acquiring = time.perf_counter()
+        async with pool.acquire() as connection:
+            started = time.perf_counter()
+            self.acquire_waits.add(started - acquiring)
+            try:
+                return await getattr(connection, method)(sql, *args)
+            finally:
+                self._observe(sql, values, time.perf_counter() - started)
+
+    def _observe(self, query: Query, values: t.Optional[dict], seconds: float):
+        if not self.slow_query_seconds or seconds < self.slow_query_seconds:
+            return
+        # Compiling is only paid for slow statements
+        try:
+            sql, params = self._compile(query, values)
+        except Exception:
+            logger.exception(f"Slow query ({seconds * 1000:.1f} ms) could not be compiled")
+            return
+        normalized = normalize_sql(sql)
+        key = fingerprint(normalized)
+        stats = self.slow_queries.add(key, normalized, seconds)
+        # The correlation id is added by the log format (see core.logging)
+        logger.warning(f"Slow query {seconds * 1000:.1f} ms [{key}]: {sql} params={redact(params)}")
+        if stats and self.explain_sample_rate and random.random() < self.explain_sample_rate:
+            self._spawn_explain(query, values, key)
+
+    def _compile(self, query: Query, values: t.Optional[dict]) -> t.Tuple[str, t.Optional[t.Mapping[str, t.Any]]]:
+        if isinstance(query, str):
+            return query, values
+        compiled = query.compile(dialect=self._backend._dialect)
+        return str(compiled), compiled.params
+
+    def _spawn_explain(self, query: Query, values: t.Optional[dict], key: str):
+        from core import tasks
+
+        if self.url.dialect != "postgresql" or isinstance(query, str) or values:
+            return
+        try:
+            sql = str(query.compile(dialect=self._backend._dialect, compile_kwargs={"literal_binds": True}))
+        except Exception:
+            # Some bind types (arrays, custom types) have no literal rendering
+            logger.debug(f"Slow query [{key}] cannot be explained with literal parameters")
+            return
+        if not sql.lstrip().upper().startswith("SELECT"):
+            return
+        tasks.spawn(f"explain-{key}", self._explain(sql, key))
+
+    async def _explain(self, sql: str, key: str):
+        # EXPLAIN ANALYZE runs the statement: in a transaction that is always rolled back
+        async with self.transaction(force_rollback=True):
+            async with self.connection() as connection:
+                raw = connection.raw_connection
+                rows = await raw.fetch(f"EXPLAIN (ANALYZE, BUFFERS) {sql}")
+        plan = "\n".join(row[0] for row in rows)
+        logger.bind(explain=True).info(f"[{key}] (correlation id {correlation_id.get()})\n{sql}\n{plan}")
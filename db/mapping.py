@@ -0,0 +1,130 @@
+import datetime as dt
+import functools
+import types
+import typing as t
+from uuid import UUID as PyUUID
+
+from databases.backends.common.records import Record
+from pydantic import BaseModel, TypeAdapter
+
+M = t.TypeVar("M", bound=BaseModel)
+
+_object_setattr = object.__setattr__
+
+
+@functools.lru_cache(maxsize=None)
+def get_adapter(to_type: t.Any) -> TypeAdapter:
+    """TypeAdapter of a type, built once (building one compiles a validator)"""
+    return TypeAdapter(to_type)
+
+
+def _parse_datetime(value: str) -> dt.datetime:
+    parsed = dt.datetime.fromisoformat(value)
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=dt.timezone.utc)
+
+
+# Expressions converting a driver value `{v}` to a field type, only when the type differs
+_CONVERSIONS: t.Dict[t.Any, str] = {
+    float: "{v} if {v}.__class__ is float or {v} is None else float({v})",
+    bool: "{v} if {v}.__class__ is bool or {v} is None else bool({v})",
+    # asyncpg returns its own UUID subclass, other drivers may return strings
+    PyUUID: "{v} if isinstance({v}, UUID) or {v} is None else UUID(str({v}))",
+    # SQLite returns naive UTC text
+    dt.datetime: "{v} if isinstance({v}, datetime) or {v} is None else parse_datetime({v})",
+}
+
+
+def _conversion(annotation: t.Any) -> str:
+    """Python expression turning a driver value into the annotation type"""
+    if t.get_origin(annotation) in (t.Union, types.UnionType):
+        args = [arg for arg in t.get_args(annotation) if arg is not type(None)]
+        annotation = args[0] if len(args) == 1 else None
+    return _CONVERSIONS.get(annotation, "{v}")
+
+
+class TrustedRowMapper(t.Generic[M]):
+    """
+    Builds schema instances from rows of one shape (column names in order) without
+    validation, converting only the driver types that differ from the field types
+    (Decimal to float, str to UUID...). Only for rows read from our own tables, whose
+    constraints already guarantee what validation would check.
+
+    The mapping function is generated as Python source once per shape, so mapping a
+    row costs one unpacking, one dict display and the conversions that are needed.
+    """
+
+    def __init__(self, schema: t.Type[M], keys: t.Tuple[str, ...]):
+        fields = schema.model_fields
+        missing = [name for name, field in fields.items() if name not in keys and field.is_required()]
+        if missing:
+            raise ValueError(f"Rows are missing required fields of {schema.__name__}: {', '.join(missing)}")
+        self.schema = schema
+        entries = [
+            f"{name!r}: {_conversion(fields[name].annotation).format(v=f'v{index}')}"
+            for index, name in enumerate(keys)
+            if name in fields
+        ]
+        entries += [
+            f"{name!r}: fields[{name!r}].get_default(call_default_factory=True)"
+            for name in fields
+            if name not in keys
+        ]
+        # Same as BaseModel.model_construct, without its per-call field introspection
+        source = (
+            "def map_values(values):\n"
+            f"    ({''.join(f'v{index}, ' for index in range(len(keys)))}) = values\n"
+            "    instance = new(schema)\n"
+            f"    setattr(instance, '__dict__', {{{', '.join(entries)}}})\n"
+            "    setattr(instance, '__pydantic_fields_set__', set(fields_set))\n"
+            "    setattr(instance, '__pydantic_extra__', None)\n"
+            "    setattr(instance, '__pydantic_private__', None)\n"
+            "    return instance\n"
+        )
+        namespace = {
+            "new": schema.__new__,
+            "schema": schema,
+            "fields": fields,
+            "fields_set": frozenset(fields),
+            "setattr": _object_setattr,
+            "UUID": PyUUID,
+            "datetime": dt.datetime,
+            "parse_datetime": _parse_datetime,
+        }
+        exec(compile(source, f"<{schema.__name__} row mapper>", "exec"), namespace)
+        self.map_values: t.Callable[[t.Sequence[t.Any]], M] = namespace["map_values"]
+
+    def __call__(self, values: t.Sequence[t.Any]) -> M:
+        return self.map_values(values)
+
+
+@functools.lru_cache(maxsize=256)
+def _trusted_mapper(schema: t.Type[M], keys: t.Tuple[str, ...]) -> TrustedRowMapper[M]:
+    return TrustedRowMapper(schema, keys)
+
+
+def _raw(row: t.Any) -> t.Mapping:
+    # databases wraps the driver row, which is faster to read from directly
+    return row._mapping if isinstance(row, Record) else row
+
+
+def map_rows(rows: t.Sequence[t.Any], to_type: t.Type[M], *, trusted: bool = False) -> t.List[M]:
+    """
+    Map rows (databases Records, asyncpg Records or mappings) to schema instances.
+
+    :param trusted: skip validation, for rows coming straight from the database
+    """
+    if not rows:
+        return []
+    raws = [_raw(row) for row in rows]
+    keys = tuple(raws[0].keys())
+    if trusted:
+        map_values = _trusted_mapper(to_type, keys).map_values
+        return [map_values(raw.values()) for raw in raws]
+    return get_adapter(t.List[to_type]).validate_python([dict(zip(keys, raw.values())) for raw in raws])
+
+
+def map_row(row: t.Any, to_type: t.Type[M], *, trusted: bool = False) -> t.Optional[M]:
+    """Map a single row, see `map_rows`. None stays None."""
+    if row is None:
+        return None
+    return map_rows([row], to_type, trusted=trusted)[0]
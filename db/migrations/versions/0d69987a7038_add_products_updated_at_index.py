@@ -0,0 +1,26 @@
+"""Add updated_at index to products for list ETags
+
+Revision ID: 0d69987a7038
+Revises: 21f3415732d7
+Create Date: 2026-10-18 10:47:53.226981
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0d69987a7038'
+down_revision: Union[str, None] = '21f3415732d7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(op.f('ix_products_updated_at'), 'products', ['updated_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_products_updated_at'), table_name='products')
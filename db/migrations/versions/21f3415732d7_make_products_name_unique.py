@@ -0,0 +1,29 @@
+"""Make products.name unique
+
+Revision ID: 21f3415732d7
+Revises: a94e4e465876
+Create Date: 2026-10-18 10:02:17.904512
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '21f3415732d7'
+down_revision: Union[str, None] = 'a94e4e465876'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Fails if duplicated names already exist, they must be renamed first
+    op.drop_index('ix_products_name', table_name='products')
+    op.create_index('ix_products_name', 'products', ['name'], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_products_name', table_name='products')
+    op.create_index('ix_products_name', 'products', ['name'], unique=False)
@@ -0,0 +1,59 @@
+"""Add product_list_version, bumped by every transaction writing to products
+
+Revision ID: 5f2c8e91d0b7
+Revises: 8cd441adf8af
+Create Date: 2026-10-18 16:05:12.418233
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5f2c8e91d0b7'
+down_revision: Union[str, None] = '8cd441adf8af'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# The version validates product listings (list ETag) with a one-row read instead of
+# max(updated_at) and count(*) over the table. The row trigger is deferred to commit:
+# the row lock is only held while committing, and `txid` makes every row after the
+# first one of a transaction a no-op.
+def upgrade() -> None:
+    op.create_table(
+        'product_list_version',
+        sa.Column('version', sa.BigInteger(), nullable=False),
+        sa.Column('txid', sa.BigInteger(), nullable=True),
+    )
+    op.execute("INSERT INTO product_list_version (version) VALUES (0)")
+    op.execute("""
+        CREATE FUNCTION bump_product_list_version() RETURNS trigger AS $$
+        BEGIN
+            UPDATE product_list_version SET version = version + 1, txid = txid_current()
+            WHERE txid IS DISTINCT FROM txid_current();
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE CONSTRAINT TRIGGER products_bump_list_version
+        AFTER INSERT OR UPDATE OR DELETE ON products
+        DEFERRABLE INITIALLY DEFERRED
+        FOR EACH ROW EXECUTE FUNCTION bump_product_list_version()
+    """)
+    # Row triggers do not fire on TRUNCATE
+    op.execute("""
+        CREATE TRIGGER products_truncate_bump_list_version
+        AFTER TRUNCATE ON products
+        FOR EACH STATEMENT EXECUTE FUNCTION bump_product_list_version()
+    """)
+
+
+def downgrade() -> None:
+    op.execute('DROP TRIGGER products_truncate_bump_list_version ON products')
+    op.execute('DROP TRIGGER products_bump_list_version ON products')
+    op.execute('DROP FUNCTION bump_product_list_version()')
+    op.drop_table('product_list_version')
@@ -0,0 +1,59 @@
+"""Add product_facets materialized view
+
+Revision ID: 8cd441adf8af
+Revises: ba4ea16374e8
+Create Date: 2026-10-18 13:41:52.306187
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8cd441adf8af'
+down_revision: Union[str, None] = 'ba4ea16374e8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Same rows as the live facets query of ProductRepo (10 price buckets), plus a
+# non-null `key` for the unique index that REFRESH ... CONCURRENTLY requires
+def upgrade() -> None:
+    op.execute("""
+        CREATE MATERIALIZED VIEW product_facets AS
+        WITH bounds AS (
+            SELECT min(price) AS lo, max(price) AS hi FROM products
+        ),
+        bucketed AS (
+            SELECT
+                p.category,
+                p.is_trend,
+                p.trending_percentage,
+                CASE WHEN b.hi > b.lo THEN least(width_bucket(p.price, b.lo, b.hi, 10), 10) ELSE 1 END AS bucket,
+                b.lo,
+                b.hi
+            FROM products p CROSS JOIN bounds b
+        )
+        SELECT
+            CASE grouping(category, bucket) WHEN 1 THEN 'CATEGORY' WHEN 2 THEN 'PRICE' ELSE 'TOTAL' END AS facet,
+            coalesce(category, bucket::text, '') AS key,
+            category,
+            bucket,
+            min(lo) AS lo,
+            max(hi) AS hi,
+            count(*) AS count,
+            count(*) FILTER (WHERE is_trend) AS trending_count,
+            avg(trending_percentage) AS avg_trending_percentage,
+            percentile_cont(0.5) WITHIN GROUP (ORDER BY trending_percentage) AS p50_trending_percentage,
+            percentile_cont(0.9) WITHIN GROUP (ORDER BY trending_percentage) AS p90_trending_percentage
+        FROM bucketed
+        GROUP BY GROUPING SETS ((category), (bucket), ())
+        WITH DATA
+    """)
+    op.create_index('ux_product_facets_facet_key', 'product_facets', ['facet', 'key'], unique=True)
+
+
+def downgrade() -> None:
+    op.execute('DROP MATERIALIZED VIEW product_facets')
@@ -0,0 +1,26 @@
+"""Add (created_at, id) index to products for keyset pagination
+
+Revision ID: a94e4e465876
+Revises: 0c717ce72ac6
+Create Date: 2026-10-18 09:12:41.318204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a94e4e465876'
+down_revision: Union[str, None] = '0c717ce72ac6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_products_created_at_id', 'products', [sa.text('created_at DESC'), sa.text('id DESC')], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_products_created_at_id', table_name='products')
@@ -0,0 +1,34 @@
+"""Add products (category, price) and partial trending listing indexes
+
+Revision ID: b4332f60544b
+Revises: e1d6537664e3
+Create Date: 2026-10-18 12:27:53.609148
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b4332f60544b'
+down_revision: Union[str, None] = 'e1d6537664e3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_products_category_price', 'products', ['category', 'price'], unique=False)
+    op.create_index(
+        'ix_products_trend_created_at_id',
+        'products',
+        [sa.text('created_at DESC'), sa.text('id DESC')],
+        unique=False,
+        postgresql_where=sa.text('is_trend'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_products_trend_created_at_id', table_name='products', postgresql_where=sa.text('is_trend'))
+    op.drop_index('ix_products_category_price', table_name='products')
@@ -0,0 +1,34 @@
+"""Add partial index on products trending_percentage for trending products
+
+Revision ID: ba4ea16374e8
+Revises: b4332f60544b
+Create Date: 2026-10-18 13:04:17.920461
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'ba4ea16374e8'
+down_revision: Union[str, None] = 'b4332f60544b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        'ix_products_trend_trending_percentage',
+        'products',
+        [sa.text('trending_percentage DESC'), sa.text('id DESC')],
+        unique=False,
+        postgresql_where=sa.text('is_trend'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(
+        'ix_products_trend_trending_percentage', table_name='products', postgresql_where=sa.text('is_trend')
+    )
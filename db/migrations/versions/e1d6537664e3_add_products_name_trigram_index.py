@@ -0,0 +1,35 @@
+"""Add pg_trgm extension and trigram GIN index on products.name
+
+Revision ID: e1d6537664e3
+Revises: 2793e4fa7136
+Create Date: 2026-10-18 12:02:41.173905
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e1d6537664e3'
+down_revision: Union[str, None] = '2793e4fa7136'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.create_index(
+        'ix_products_name_trgm',
+        'products',
+        ['name'],
+        unique=False,
+        postgresql_using='gin',
+        postgresql_ops={'name': 'gin_trgm_ops'},
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_products_name_trgm', table_name='products', postgresql_using='gin')
+    # The extension is left installed, other objects may depend on it
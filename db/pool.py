@@ -0,0 +1,184 @@
+import asyncio
+import collections
+import datetime as dt
+import typing as t
+from dataclasses import dataclass, field
+
+from databases import Database
+from loguru import logger
+
+from core import metrics
+from db.instrumentation import InstrumentedDatabase
+
+pool_resizes = metrics.registry.counter(
+    "db_pool_resizes_total", "Pool max size changes by the adaptive controller", ("database", "direction")
+)
+
+
+def asyncpg_pool(database: Database):
+    """asyncpg pool of a connected databases Postgres backend, None before connect and on other backends"""
+    pool = getattr(database._backend, "_pool", None)
+    return pool if pool is not None and hasattr(pool, "get_idle_size") else None
+
+
+async def warm_up(database: Database, connections: int) -> int:
+    """
+    Open up to `connections` pool connections at once and ping each, so that the first
+    requests do not pay for connection setup. Returns the number of connections pinged,
+    0 when warm-up is disabled (`connections` < 1).
+    """
+    if connections < 1:
+        return 0
+    pool = asyncpg_pool(database)
+    if pool is None:
+        # Other backends have no pool to warm: only check that the database answers
+        await database.fetch_val("SELECT 1")
+        return 1
+    count = min(connections, pool.get_max_size())
+    barrier = asyncio.Barrier(count)
+
+    async def ping():
+        try:
+            async with pool.acquire() as connection:
+                await connection.fetchval("SELECT 1")
+                # Hold the connection until every ping has one, so that each opens its own
+                await barrier.wait()
+        except Exception:
+            await barrier.abort()
+            raise
+
+    results = await asyncio.gather(*(ping() for _ in range(count)), return_exceptions=True)
+    errors = [result for result in results if isinstance(result, BaseException)]
+    if errors:
+        # The others were only released by the abort
+        raise next((e for e in errors if not isinstance(e, asyncio.BrokenBarrierError)), errors[0])
+    return count
+
+
+def _grow(pool, count: int):
+    # asyncpg pools cannot be resized through their API: add connection holders the way
+    # Pool._initialize does (they connect on first acquire). Checked against asyncpg 0.30.
+    from asyncpg.pool import PoolConnectionHolder
+
+    for _ in range(count):
+        holder = PoolConnectionHolder(
+            pool,
+            max_queries=pool._max_queries,
+            max_inactive_time=pool._max_inactive_connection_lifetime,
+            setup=pool._setup,
+        )
+        pool._holders.append(holder)
+        pool._maxsize += 1
+        pool._queue._maxsize += 1
+        # Wakes up a task waiting in acquire(), if any
+        pool._queue.put_nowait(holder)
+
+
+async def _shrink(pool, count: int) -> int:
+    """Remove up to `count` idle connection holders, returning how many were removed"""
+    removed = []
+    while len(removed) < count and not pool._queue.empty():
+        removed.append(pool._queue.get_nowait())
+    for holder in removed:
+        pool._holders.remove(holder)
+        pool._maxsize -= 1
+        pool._queue._maxsize -= 1
+    await asyncio.gather(*(holder.close() for holder in removed), return_exceptions=True)
+    return len(removed)
+
+
+@dataclass
+class PoolDecision:
+    database: str
+    old_max_size: int
+    new_max_size: int
+    reason: str
+    at: dt.datetime = field(default_factory=lambda: dt.datetime.now(dt.timezone.utc))
+
+
+class AdaptivePoolController:
+    """
+    Resizes the maximum size of a database's asyncpg pool between `min_max_size` and
+    `max_max_size` from what each `sample` observes since the previous one:
+
+    - grows by `step` when requests waited for a connection (mean acquire wait over
+      `target_wait`, or tasks still waiting) while the pool was busy (utilization at
+      least `high_utilization`)
+    - shrinks by `step` once the utilization stayed under `low_utilization` for
+      `shrink_after` samples in a row, removing idle connections only
+
+    Every decision is logged and kept in `decisions` (the last ones).
+    """
+
+    def __init__(
+        self,
+        name: str,
+        database: InstrumentedDatabase,
+        *,
+        min_max_size: int,
+        max_max_size: int,
+        target_wait: float = 0.01,
+        high_utilization: float = 0.8,
+        low_utilization: float = 0.3,
+        shrink_after: int = 6,
+        step: int = 2,
+        history: int = 50,
+    ):
+        self.name = name
+        self.database = database
+        self.min_max_size = min_max_size
+        self.max_max_size = max_max_size
+        self.target_wait = target_wait
+        self.high_utilization = high_utilization
+        self.low_utilization = low_utilization
+        self.shrink_after = shrink_after
+        self.step = step
+        self.decisions: t.Deque[PoolDecision] = collections.deque(maxlen=history)
+        self.last_wait = 0.0
+        self.last_utilization = 0.0
+        self._low_samples = 0
+
+    async def sample(self):
+        """Called every interval (see tasks.start_periodic)"""
+        pool = asyncpg_pool(self.database)
+        if pool is None:
+            return
+        count, mean_wait, _ = self.database.acquire_waits.drain()
+        max_size = pool.get_max_size()
+        in_use = pool.get_size() - pool.get_idle_size()
+        waiting = len(getattr(pool._queue, "_getters", ()))
+        self.last_wait = mean_wait
+        self.last_utilization = utilization = in_use / max_size if max_size else 0.0
+
+        if (mean_wait > self.target_wait or waiting) and utilization >= self.high_utilization:
+            self._low_samples = 0
+            if max_size < self.max_max_size:
+                new_size = min(max_size + self.step, self.max_max_size)
+                _grow(pool, new_size - max_size)
+                self._decide(
+                    max_size,
+                    new_size,
+                    f"acquire wait {mean_wait * 1000:.1f} ms over {count} acquisitions, {waiting} waiting, "
+                    f"utilization {utilization:.0%}",
+                )
+            return
+
+        if utilization < self.low_utilization:
+            self._low_samples += 1
+        else:
+            self._low_samples = 0
+        if self._low_samples >= self.shrink_after and max_size > self.min_max_size:
+            removed = await _shrink(pool, min(self.step, max_size - self.min_max_size))
+            if removed:
+                self._low_samples = 0
+                self._decide(
+                    max_size,
+                    max_size - removed,
+                    f"utilization under {self.low_utilization:.0%} for {self.shrink_after} samples",
+                )
+
+    def _decide(self, old_max_size: int, new_max_size: int, reason: str):
+        decision = PoolDecision(self.name, old_max_size, new_max_size, reason)
+        self.decisions.append(decision)
+        pool_resizes.labels(self.name, "up" if new_max_size > old_max_size else "down").inc()
+        logger.info(f"Pool {self.name}: max size {old_max_size} -> {new_max_size} ({reason})")
@@ -0,0 +1,177 @@
+import asyncio
+import contextlib
+import contextvars
+import functools
+import itertools
+import time
+import typing as t
+
+from databases import Database
+from loguru import logger
+from starlette.datastructures import MutableHeaders
+from starlette.requests import cookie_parser
+
+# Set on the responses of requests that wrote: the epoch until which the client reads from the primary
+STICKY_COOKIE = "rw_primary_until"
+
+
+class _RequestRouting:
+    __slots__ = ("primary_until", "wrote")
+
+    def __init__(self, primary_until: float = 0.0):
+        self.primary_until = primary_until
+        self.wrote = False
+
+
+_request_routing: contextvars.ContextVar[t.Optional[_RequestRouting]] = contextvars.ContextVar(
+    "request_routing", default=None
+)
+# Set while a task reads through `ReadRouter.on_primary`
+_primary_reads: contextvars.ContextVar[bool] = contextvars.ContextVar("primary_reads", default=False)
+
+
+class ReadRouter:
+    """
+    Chooses the database of read-only queries: the replicas in turn (round-robin), skipping
+    those whose last health check failed, and the primary when none is healthy.
+
+    Reads go to the primary too when they must see the latest writes: inside a transaction,
+    after a write in the same request, and for `sticky_seconds` after a write by the same
+    client (see ReadYourWritesMiddleware). Other reads may be as stale as the replication lag.
+    """
+
+    def __init__(self, primary: Database, replicas: t.Sequence[Database], sticky_seconds: float = 0.0):
+        self.primary = primary
+        self.replicas = list(replicas)
+        self.sticky_seconds = sticky_seconds
+        self.healthy = {id(replica): False for replica in self.replicas}
+        self._turns = itertools.cycle(self.replicas) if self.replicas else None
+
+    def __call__(self) -> Database:
+        if self._turns is None or self.needs_primary():
+            return self.primary
+        for _ in range(len(self.replicas)):
+            replica = next(self._turns)
+            if self.healthy[id(replica)]:
+                return replica
+        return self.primary
+
+    def needs_primary(self) -> bool:
+        """Whether the reads of this task have to see the latest writes"""
+        if _primary_reads.get():
+            return True
+        routing = _request_routing.get()
+        if routing is not None and (routing.wrote or routing.primary_until > time.time()):
+            return True
+        # Reads inside a transaction of this task belong to it
+        return self.in_transaction()
+
+    @contextlib.contextmanager
+    def on_primary(self) -> t.Iterator[None]:
+        """Send the reads of this task to the primary in this block, e.g. to fill a cache shared with other clients"""
+        token = _primary_reads.set(True)
+        try:
+            yield
+        finally:
+            _primary_reads.reset(token)
+
+    def in_transaction(self) -> bool:
+        """Whether this task has a transaction open on the primary, which its queries must run in"""
+        connection = self.primary._connection
+        return connection is not None and bool(connection._transaction_stack)
+
+    async def connect(self):
+        """Connect the replicas. One that cannot be reached is left unhealthy until a health check succeeds."""
+        await asyncio.gather(*(self._connect(replica) for replica in self.replicas))
+
+    async def _connect(self, replica: Database):
+        try:
+            await replica.connect()
+            self.healthy[id(replica)] = True
+        except Exception as e:
+            logger.warning(f"Replica {replica.url.obscure_password} is unreachable: {e}")
+
+    async def disconnect(self):
+        await asyncio.gather(*(replica.disconnect() for replica in self.replicas if replica.is_connected))
+
+    async def check_health(self, timeout: float = 2.0):
+        """Run a trivial query on every replica, taking the failing ones out of the rotation"""
+        await asyncio.gather(*(self._check(replica, timeout) for replica in self.replicas))
+
+    async def _check(self, replica: Database, timeout: float):
+        was_healthy = self.healthy[id(replica)]
+        try:
+            if not replica.is_connected:
+                await replica.connect()
+            await asyncio.wait_for(replica.fetch_val("SELECT 1"), timeout)
+            healthy = True
+        except Exception as e:
+            healthy = False
+            if was_healthy:
+                logger.warning(f"Replica {replica.url.obscure_password} failed its health check: {e}")
+        if healthy and not was_healthy:
+            logger.info(f"Replica {replica.url.obscure_password} is back in rotation")
+        self.healthy[id(replica)] = healthy
+
+
+def record_write():
+    """Send the following reads of this request (and of its client, for a while) to the primary"""
+    routing = _request_routing.get()
+    if routing is not None:
+        routing.wrote = True
+
+
+def writes(method):
+    """Repository method decorator: records a write once the method returns (see `record_write`)"""
+
+    @functools.wraps(method)
+    async def wrapper(*args, **kwargs):
+        result = await method(*args, **kwargs)
+        record_write()
+        return result
+
+    return wrapper
+
+
+class ReadYourWritesMiddleware:
+    """
+    Tracks the writes of each request, and keeps a client's reads on the primary for
+    `sticky_seconds` after one of its requests wrote, through a cookie. Clients that do
+    not keep cookies only get read-your-writes within a request.
+    """
+
+    def __init__(self, app, sticky_seconds: float):
+        self.app = app
+        self.sticky_seconds = sticky_seconds
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.sticky_seconds:
+            return await self.app(scope, receive, send)
+
+        routing = _RequestRouting(self._primary_until(scope))
+        token = _request_routing.set(routing)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and routing.wrote:
+                until = time.time() + self.sticky_seconds
+                headers = MutableHeaders(scope=message)
+                max_age = int(self.sticky_seconds) + 1
+                headers.append(
+                    "Set-Cookie", f"{STICKY_COOKIE}={until:.3f}; Max-Age={max_age}; Path=/; HttpOnly; SameSite=Lax"
+                )
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _request_routing.reset(token)
+
+    @staticmethod
+    def _primary_until(scope) -> float:
+        for name, value in scope["headers"]:
+            if name == b"cookie":
+                try:
+                    return float(cookie_parser(value.decode("latin-1")).get(STICKY_COOKIE, 0))
+                except ValueError:
+                    return 0.0
+        return 0.0
@@ -0,0 +1,43 @@
+import asyncio
+import functools
+import inspect
+import typing as t
+
+from asyncpg.exceptions import QueryCanceledError
+
+from common.errors import QueryTimeoutError
+
+
+def statement_timeouts(default: float, overrides: t.Mapping[str, float]) -> t.Callable[[type], type]:
+    """
+    Class decorator bounding every public coroutine method by a timeout, `overrides` by
+    method name and `default` otherwise (0 for none). Past it the call is cancelled, which
+    makes asyncpg cancel the running statement, and QueryTimeoutError is raised. Statements
+    cancelled by the server-side statement_timeout raise QueryTimeoutError too.
+    """
+
+    def decorate(cls: type) -> type:
+        for name, method in list(vars(cls).items()):
+            if name.startswith("_") or not inspect.iscoroutinefunction(method):
+                continue
+            setattr(cls, name, _with_timeout(method, overrides.get(name, default)))
+        return cls
+
+    return decorate
+
+
+def _with_timeout(method: t.Callable[..., t.Awaitable[t.Any]], seconds: float) -> t.Callable[..., t.Awaitable[t.Any]]:
+    @functools.wraps(method)
+    async def wrapper(*args, **kwargs):
+        try:
+            async with asyncio.timeout(seconds or None) as timeout:
+                return await method(*args, **kwargs)
+        except TimeoutError:
+            # Only our own timeout: other TimeoutErrors keep their meaning
+            if timeout.expired():
+                raise QueryTimeoutError()
+            raise
+        except QueryCanceledError:
+            raise QueryTimeoutError()
+
+    return wrapper
@@ -3,9 +3,12 @@ from functools import wraps
 
 from databases.backends.common.records import Record
 from pydantic import BaseModel as PydanticBaseModel
-from pydantic import TypeAdapter
-from sqlalchemy import Column, DateTime, func, text
+from sqlalchemy import Column, DateTime, String, func, text
 from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.functions import FunctionElement
+
+from db.mapping import get_adapter
 
 PgUUID = UUID(as_uuid=False)
 
@@ -51,6 +54,47 @@ def updated_at(index=False):
     )
 
 
+class iso8601z(FunctionElement):
+    """
+    Timestamp formatted by the database like `dt_to_iso8601z` (UTC, milliseconds, Z suffix)
+    """
+
+    type = String()
+    inherit_cache = True
+
+
+@compiles(iso8601z)
+def _compile_iso8601z(element, compiler, **kw):
+    return f"""to_char(timezone('UTC', {compiler.process(element.clauses, **kw)}), 'YYYY-MM-DD"T"HH24:MI:SS.MS"Z"')"""
+
+
+@compiles(iso8601z, "sqlite")
+def _compile_iso8601z_sqlite(element, compiler, **kw):
+    # SQLite stores UTC text, "YYYY-MM-DD HH:MM:SS" with or without fractional seconds.
+    # No strftime: databases formats the SQL with % for its query log.
+    value = compiler.process(element.clauses, **kw)
+    return f"substr(replace({value}, ' ', 'T') || '.000', 1, 23) || 'Z'"
+
+
+class uuid_text(FunctionElement):
+    """UUID as its canonical text form (SQLite stores them as 32 hex digits)"""
+
+    type = String()
+    inherit_cache = True
+
+
+@compiles(uuid_text)
+def _compile_uuid_text(element, compiler, **kw):
+    return f"CAST({compiler.process(element.clauses, **kw)} AS TEXT)"
+
+
+@compiles(uuid_text, "sqlite")
+def _compile_uuid_text_sqlite(element, compiler, **kw):
+    value = compiler.process(element.clauses, **kw)
+    parts = ((1, 8), (9, 4), (13, 4), (17, 4), (21, 12))
+    return "lower(" + " || '-' || ".join(f"substr({value}, {start}, {length})" for start, length in parts) + ")"
+
+
 T = t.TypeVar("T")
 
 
@@ -68,9 +112,10 @@ def map_to(obj: t.Any, to_type: t.Type[T]) -> T:
         obj = dict(obj)
     if isinstance(obj, PydanticBaseModel):  # Convert from one Pydantic model to another
         obj = obj.model_dump()
+    adapter = get_adapter(to_type)
     if isinstance(obj, list):
         return [
-            TypeAdapter(to_type).validate_python(
+            adapter.validate_python(
                 item.model_dump()
                 if isinstance(item, PydanticBaseModel)
                 else dict(item)
@@ -79,21 +124,26 @@ def map_to(obj: t.Any, to_type: t.Type[T]) -> T:
             )
             for item in obj
         ]
-    return TypeAdapter(to_type).validate_python(obj) if obj else obj
+    return adapter.validate_python(obj) if obj else obj
 
 
 def map_result(function: t.Callable) -> t.Callable:
     """Map result returned by wrapped function to the
     declared return type, which must extend BaseSchema class."""
+    # Resolved on the first call, once forward references can be evaluated
+    adapters: t.List[t.Optional[t.Any]] = []
 
     @wraps(function)
     async def wrapper(*args, **kwargs):
-        return_type = t.get_type_hints(wrapper).get("return")
+        if not adapters:
+            return_type = t.get_type_hints(wrapper).get("return")
+            adapters.append(get_adapter(return_type) if return_type else None)
+        adapter = adapters[0]
         result = await function(*args, **kwargs)
         if isinstance(result, Record):
             if result is None:
                 return None
             result = dict(result)
-        return TypeAdapter(return_type).validate_python(result) if return_type and result else result
+        return adapter.validate_python(result) if adapter and result else result
 
     return wrapper
\ No newline at end of file
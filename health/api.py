@@ -0,0 +1,72 @@
+import asyncio
+
+from fastapi import APIRouter, status
+from fastapi.responses import ORJSONResponse
+
+from core.config import cfg
+from db.core import db
+from db.pool import asyncpg_pool
+from health.schemas import HealthStatus
+
+PREFIX = "/health"
+TAG = "Health"
+
+health_router = APIRouter(prefix=PREFIX, tags=[TAG])
+
+
+class Readiness:
+    """Set by the lifespan: ready once the pools are warm, not ready again while shutting down"""
+
+    def __init__(self):
+        self.ready = False
+        self.reason = "starting"
+
+    def set_ready(self):
+        self.ready, self.reason = True, None
+
+    def set_not_ready(self, reason: str):
+        self.ready, self.reason = False, reason
+
+
+readiness = Readiness()
+
+
+def _down(reason: str) -> ORJSONResponse:
+    return ORJSONResponse(
+        HealthStatus(status="DOWN", reason=reason).model_dump(by_alias=True),
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+    )
+
+
+@health_router.get("/live", response_model=HealthStatus, status_code=status.HTTP_200_OK)
+async def live():
+    """The process serves requests (it is not worth restarting)"""
+    return HealthStatus(status="UP")
+
+
+@health_router.get("/ready", response_model=HealthStatus, status_code=status.HTTP_200_OK)
+async def ready():
+    """
+    The service can take traffic: started, pools warm and the primary answering. A pool
+    with every connection busy is not a failure: taking the instance out of rotation
+    would only move its load onto the others.
+    """
+    if not readiness.ready:
+        return _down(readiness.reason)
+    timeout = cfg.HEALTH_CHECK_TIMEOUT_SECONDS
+    pool = asyncpg_pool(db)
+    try:
+        if pool is None:
+            await asyncio.wait_for(db.fetch_val("SELECT 1"), timeout)
+            return HealthStatus(status="UP")
+        try:
+            connection = await pool.acquire(timeout=timeout)
+        except asyncio.TimeoutError:
+            return HealthStatus(status="UP")
+        try:
+            await connection.fetchval("SELECT 1", timeout=timeout)
+        finally:
+            await pool.release(connection)
+    except Exception as e:
+        return _down(f"database: {e.__class__.__name__}")
+    return HealthStatus(status="UP")
@@ -0,0 +1,9 @@
+import typing as t
+
+from common.schemas import BaseSchema
+
+
+class HealthStatus(BaseSchema):
+    status: t.Literal["UP", "DOWN"]
+    # Why the service is not ready
+    reason: t.Optional[str] = None
@@ -0,0 +1,31 @@
+import base64
+import typing as t
+
+import orjson
+
+
+def encode_cursor(*values: t.Any) -> str:
+    """
+    Encode keyset values into an opaque, url-safe cursor string.
+
+    :param values: JSON serializable values of the last row of a page
+    :return: cursor string
+    """
+    return base64.urlsafe_b64encode(orjson.dumps(values)).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> t.List[t.Any]:
+    """
+    Decode a cursor produced by `encode_cursor`.
+
+    :param cursor: cursor string
+    :return: list of keyset values
+    :raises ValueError: if the cursor is malformed
+    """
+    try:
+        values = orjson.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (ValueError, TypeError) as e:
+        raise ValueError("Malformed cursor") from e
+    if not isinstance(values, list):
+        raise ValueError("Malformed cursor")
+    return values
@@ -0,0 +1,46 @@
+import datetime as dt
+import hashlib
+import typing as t
+
+EPOCH = dt.datetime(1970, 1, 1, tzinfo=dt.timezone.utc)
+_MICROSECOND = dt.timedelta(microseconds=1)
+
+
+def make_etag(*parts: t.Any) -> str:
+    """Build a strong ETag hashing the given parts"""
+    digest = hashlib.blake2b("|".join(map(str, parts)).encode(), digest_size=16).hexdigest()
+    return f'"{digest}"'
+
+
+def version_etag(version: dt.datetime) -> str:
+    """
+    Build a strong ETag from a row version timestamp. The timestamp can be read back
+    with `parse_version_etags`, so If-Match can be checked in the UPDATE statement itself.
+    """
+    if version.tzinfo is None:
+        # Stored timestamps are UTC, some drivers (SQLite) return them naive
+        version = version.replace(tzinfo=dt.timezone.utc)
+    return f'"{(version - EPOCH) // _MICROSECOND:x}"'
+
+
+def _split(header: str) -> t.List[str]:
+    return [tag.strip() for tag in header.split(",") if tag.strip()]
+
+
+def parse_version_etags(header: str) -> t.List[dt.datetime]:
+    """Return the versions of all the ETags of a header built by `version_etag`, ignoring others"""
+    versions = []
+    for tag in _split(header):
+        try:
+            versions.append(EPOCH + int(tag.strip('"'), 16) * _MICROSECOND)
+        except (ValueError, OverflowError):
+            continue
+    return versions
+
+
+def etag_matches(header: t.Optional[str], etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against an ETag"""
+    if not header:
+        return False
+    tags = _split(header)
+    return "*" in tags or etag in (tag[2:] if tag.startswith("W/") else tag for tag in tags)
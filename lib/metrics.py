@@ -0,0 +1,236 @@
+import functools
+import inspect
+import math
+import time
+import typing as t
+from bisect import bisect_left
+
+# Latency buckets (seconds) from 0.5 ms to 10 s
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+LabelValues = t.Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: t.Sequence[str], values: t.Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+
+class CounterSeries:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+
+class HistogramSeries:
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: t.Tuple[float, ...]):
+        self.bounds = bounds
+        # One count per bucket plus +Inf, not cumulative (they are summed when rendered)
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metric:
+    """
+    A metric family: one series per combination of label values.
+
+    Series are plain Python objects updated in place, without locks: they are only
+    updated from the event loop thread, where an update never awaits and is
+    therefore atomic. Callers on hot paths keep the series returned by `labels`.
+    """
+
+    type = ""
+
+    def __init__(self, name: str, documentation: str, label_names: t.Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._series: t.Dict[LabelValues, t.Any] = {}
+
+    def _new_series(self) -> t.Any:
+        raise NotImplementedError
+
+    def labels(self, *values: str) -> t.Any:
+        series = self._series.get(values)
+        if series is None:
+            if len(values) != len(self.label_names):
+                raise ValueError(f"{self.name} expects labels {self.label_names}, got {values}")
+            series = self._series[values] = self._new_series()
+        return series
+
+    def render(self) -> t.Iterator[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} {self.type}"
+        for values, series in list(self._series.items()):
+            yield from self._render_series(values, series)
+
+    def _render_series(self, values: LabelValues, series: t.Any) -> t.Iterator[str]:
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def _new_series(self) -> CounterSeries:
+        return CounterSeries()
+
+    def inc(self, amount: float = 1.0):
+        """Increment the series of a metric without labels"""
+        self.labels().inc(amount)
+
+    def _render_series(self, values: LabelValues, series: CounterSeries) -> t.Iterator[str]:
+        yield f"{self.name}{_format_labels(self.label_names, values)} {_format_value(series.value)}"
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        label_names: t.Sequence[str] = (),
+        buckets: t.Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, label_names)
+        self.bounds = tuple(sorted(buckets))
+
+    def _new_series(self) -> HistogramSeries:
+        return HistogramSeries(self.bounds)
+
+    def observe(self, value: float):
+        """Observe a value in the series of a metric without labels"""
+        self.labels().observe(value)
+
+    def _render_series(self, values: LabelValues, series: HistogramSeries) -> t.Iterator[str]:
+        cumulative = 0
+        for bound, count in zip(self.bounds + (math.inf,), series.counts):
+            cumulative += count
+            labels = _format_labels(self.label_names, values, f'le="{_format_value(bound)}"')
+            yield f"{self.name}_bucket{labels} {cumulative}"
+        labels = _format_labels(self.label_names, values)
+        yield f"{self.name}_sum{labels} {_format_value(series.sum)}"
+        yield f"{self.name}_count{labels} {series.count}"
+
+
+class CallbackMetric(Metric):
+    """
+    Gauge or counter whose values are read when the metrics are rendered, for values
+    that already live somewhere else (pool sizes, cache statistics...).
+
+    :param collect: returns (label values, value) pairs, nothing when unavailable
+    """
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        label_names: t.Sequence[str],
+        collect: t.Callable[[], t.Iterable[t.Tuple[LabelValues, float]]],
+        type: str = "gauge",
+    ):
+        super().__init__(name, documentation, label_names)
+        self.collect = collect
+        self.type = type
+
+    def render(self) -> t.Iterator[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} {self.type}"
+        for values, value in self.collect():
+            yield f"{self.name}{_format_labels(self.label_names, values)} {_format_value(value)}"
+
+
+class Registry:
+    """Metric families rendered together in the Prometheus text exposition format"""
+
+    # Starlette adds the charset
+    CONTENT_TYPE = "text/plain; version=0.0.4"
+
+    def __init__(self):
+        self._metrics: t.Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, label_names: t.Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, label_names))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        label_names: t.Sequence[str] = (),
+        buckets: t.Sequence[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self.register(Histogram(name, documentation, label_names, buckets))
+
+    def callback(
+        self,
+        name: str,
+        documentation: str,
+        label_names: t.Sequence[str],
+        collect: t.Callable[[], t.Iterable[t.Tuple[LabelValues, float]]],
+        type: str = "gauge",
+    ) -> CallbackMetric:
+        return self.register(CallbackMetric(name, documentation, label_names, collect, type))
+
+    def render(self) -> str:
+        lines: t.List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+def timed_methods(histogram: Histogram, *labels: str) -> t.Callable[[type], type]:
+    """
+    Class decorator observing the duration of every public coroutine method in
+    `histogram`, labelled by `labels` followed by the method name
+    """
+
+    def decorate(cls: type) -> type:
+        for name, method in list(vars(cls).items()):
+            if name.startswith("_") or not inspect.iscoroutinefunction(method):
+                continue
+            setattr(cls, name, _timed(method, histogram.labels(*labels, name)))
+        return cls
+
+    return decorate
+
+
+def _timed(method: t.Callable[..., t.Awaitable[t.Any]], series: HistogramSeries) -> t.Callable[..., t.Awaitable[t.Any]]:
+    @functools.wraps(method)
+    async def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await method(*args, **kwargs)
+        finally:
+            series.observe(time.perf_counter() - started)
+
+    return wrapper
@@ -0,0 +1,57 @@
+import bisect
+import sys
+import typing as t
+
+
+class PrefixIndex:
+    """
+    Sorted array of (key, value) string pairs answering prefix queries with bisect.
+
+    Keys are case folded. Inserting and removing shift the array, which is a
+    memmove and stays cheap for a few hundred thousand entries.
+    """
+
+    def __init__(self):
+        self._entries: t.List[t.Tuple[str, str]] = []
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def normalize(key: str) -> str:
+        return key.casefold()
+
+    def load(self, pairs: t.Iterable[t.Tuple[str, str]]):
+        """Replace the whole content, sorting once"""
+        self._entries = sorted((self.normalize(key), value) for key, value in pairs)
+
+    def add(self, key: str, value: str):
+        entry = (self.normalize(key), value)
+        index = bisect.bisect_left(self._entries, entry)
+        if index == len(self._entries) or self._entries[index] != entry:
+            self._entries.insert(index, entry)
+
+    def remove(self, key: str, value: str):
+        entry = (self.normalize(key), value)
+        index = bisect.bisect_left(self._entries, entry)
+        if index < len(self._entries) and self._entries[index] == entry:
+            del self._entries[index]
+
+    def search(self, prefix: str, limit: int) -> t.List[t.Tuple[str, str]]:
+        """Return up to `limit` entries whose key starts with prefix, in key order"""
+        prefix = self.normalize(prefix)
+        results = []
+        index = bisect.bisect_left(self._entries, (prefix,))
+        while index < len(self._entries) and len(results) < limit:
+            entry = self._entries[index]
+            if not entry[0].startswith(prefix):
+                break
+            results.append(entry)
+            index += 1
+        return results
+
+    def memory_bytes(self) -> int:
+        """Approximate memory held by the index (list, tuples and strings)"""
+        return sys.getsizeof(self._entries) + sum(
+            sys.getsizeof(entry) + sys.getsizeof(entry[0]) + sys.getsizeof(entry[1]) for entry in self._entries
+        )
@@ -0,0 +1,88 @@
+import asyncio
+import functools
+import typing as t
+
+K = t.TypeVar("K", bound=t.Hashable)
+V = t.TypeVar("V")
+
+
+class _Flight(t.Generic[V]):
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: "asyncio.Task[V]"):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight(t.Generic[K, V]):
+    """
+    Coalesces concurrent calls with the same key: the first one starts the work in a task,
+    the calls arriving while it runs await that same task and share its result or error.
+    Nothing is kept once the task is done, so later calls start over (this is not a cache).
+
+    Cancelling a caller only stops its wait. The work is cancelled when no caller is left
+    waiting for it.
+
+    Not thread safe: meant to be used from a single event loop.
+    """
+
+    def __init__(self):
+        self._flights: t.Dict[K, _Flight[V]] = {}
+        self.calls = 0
+        self.collapsed = 0
+
+    def __len__(self) -> int:
+        return len(self._flights)
+
+    async def do(self, key: K, function: t.Callable[[], t.Awaitable[V]]) -> V:
+        """Result of `function()`, or of the call in flight for `key` when there is one"""
+        self.calls += 1
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = _Flight(asyncio.ensure_future(function()))
+            self._flights[key] = flight
+            flight.task.add_done_callback(functools.partial(self._done, key, flight))
+        else:
+            self.collapsed += 1
+        flight.waiters += 1
+        try:
+            # shield: a cancelled caller must not cancel the work of the others
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if not flight.waiters and not flight.task.done():
+                self._forget(key, flight)
+                flight.task.cancel()
+
+    def _done(self, key: K, flight: _Flight[V], task: "asyncio.Task[V]"):
+        self._forget(key, flight)
+        # Read the error so that asyncio does not report it as never retrieved when no caller was left
+        if not task.cancelled():
+            task.exception()
+
+    def _forget(self, key: K, flight: _Flight[V]):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+
+def single_flight(key: t.Callable[..., t.Hashable]) -> t.Callable[[t.Callable], t.Callable]:
+    """
+    Coroutine method decorator coalescing the concurrent calls whose `key`, called with
+    the method arguments (self included), is equal. Calls whose key is None run on their
+    own. The SingleFlight is available as the `flight` attribute of the method, for its counters.
+    """
+
+    def decorate(method: t.Callable[..., t.Awaitable[V]]) -> t.Callable[..., t.Awaitable[V]]:
+        flight: SingleFlight[t.Hashable, V] = SingleFlight()
+
+        @functools.wraps(method)
+        async def wrapper(*args, **kwargs):
+            call_key = key(*args, **kwargs)
+            if call_key is None:
+                return await method(*args, **kwargs)
+            return await flight.do(call_key, lambda: method(*args, **kwargs))
+
+        wrapper.flight = flight  # type: ignore[attr-defined]
+        return wrapper
+
+    return decorate
@@ -1,18 +1,17 @@
-import time
 from contextlib import asynccontextmanager
 
-from asgi_correlation_id import CorrelationIdMiddleware
 from fastapi import FastAPI, Request
-from fastapi.middleware.gzip import GZipMiddleware
-from fastapi.responses import ORJSONResponse
-from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse, PlainTextResponse
 from loguru import logger
 import os
 
 from common.errors import BaseHTTPError
 from common.schemas import ErrorSchema
-from core import cfg, injection, logging, main_router
-from db.core import db  
+from core import cfg, injection, logging, main_router, metrics, middleware, tasks
+from db import pool
+from db.core import db, pool_controllers, read_db
+from health.api import health_router, readiness
+from products.service import ProductService
 # from auth.service import AuthService
 
 
@@ -22,14 +21,52 @@ async def lifespan(app: FastAPI):
     logger.info("Starting...")      
     await injection.configure()
     await db.connect()
+    await read_db.connect()
+    await _warm_up_pools()
+    if cfg.POOL_ADAPTIVE_ENABLED:
+        for controller in pool_controllers:
+            tasks.start_periodic(
+                f"pool-{controller.name}-resize", cfg.POOL_ADAPTIVE_INTERVAL_SECONDS, controller.sample
+            )
+    if read_db.replicas and cfg.REPLICA_HEALTH_CHECK_SECONDS:
+        tasks.start_periodic("replica-health-check", cfg.REPLICA_HEALTH_CHECK_SECONDS, read_db.check_health)
+    product_service = injection.injector.get(ProductService)
+    if cfg.SUGGEST_INDEX_ENABLED:
+        await product_service.rebuild_suggest_index()
+        if cfg.SUGGEST_INDEX_REFRESH_SECONDS:
+            tasks.start_periodic(
+                "suggest-index-refresh", cfg.SUGGEST_INDEX_REFRESH_SECONDS, product_service.rebuild_suggest_index
+            )
+    if cfg.FACETS_MATERIALIZED_VIEW and cfg.FACETS_REFRESH_SECONDS:
+        tasks.start_periodic("facets-refresh", cfg.FACETS_REFRESH_SECONDS, product_service.refresh_product_facets)
+    if cfg.METRICS_ENABLED:
+        metrics.start_loop_lag_monitor(cfg.METRICS_LOOP_LAG_INTERVAL_SECONDS)
     # # Ensure admin user exists
     # auth_service = injection.injector.get(AuthService)
     # await auth_service.ensure_admin_user_exists()
+    readiness.set_ready()
     yield
+    readiness.set_not_ready("shutting down")
     logger.info("Shuting down...")
+    await tasks.stop_all()
+    await read_db.disconnect()
     await db.disconnect()
 
 
+async def _warm_up_pools():
+    warmed = await pool.warm_up(db, cfg.POOL_WARMUP_CONNECTIONS)
+    logger.info(f"Primary pool warmed up with {warmed} connections")
+    for index, replica in enumerate(read_db.replicas):
+        if not read_db.healthy[id(replica)]:
+            continue
+        try:
+            warmed = await pool.warm_up(replica, cfg.POOL_WARMUP_CONNECTIONS)
+            logger.info(f"Replica {index} pool warmed up with {warmed} connections")
+        except Exception as e:
+            # The health checks take it out of the rotation if it stays unreachable
+            logger.warning(f"Replica {index} pool warm-up failed: {e}")
+
+
 app = FastAPI(
     title=cfg.PROJECT_NAME,
     description="API for demo",
@@ -43,25 +80,7 @@ app = FastAPI(
 
 # origins = os.getenv("BACKEND_CORS_ORIGINS", "").split(",")
 
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
-app.add_middleware(CorrelationIdMiddleware)
-app.add_middleware(GZipMiddleware, minimum_size=1000)
-
-
-@app.middleware("http")
-async def add_process_time_header(request: Request, call_next):
-    start_time = time.time()
-    response = await call_next(request)
-    process_time = time.time() - start_time
-    response.headers["X-Process-Time"] = str(process_time)
-    return response
+middleware.install(app, cfg.MIDDLEWARE_STACK)
 
 
 @app.exception_handler(BaseHTTPError)
@@ -82,4 +101,12 @@ async def root():
     return {"ping": "pong"}
 
 
+if cfg.METRICS_ENABLED:
+
+    @app.get("/metrics", include_in_schema=False)
+    async def get_metrics():
+        return PlainTextResponse(metrics.registry.render(), media_type=metrics.registry.CONTENT_TYPE)
+
+
+app.include_router(health_router)
 app.include_router(main_router, prefix=cfg.API_PREFIX_STR)
\ No newline at end of file
@@ -1,15 +1,33 @@
 import typing as t
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, status, Response
+from fastapi import APIRouter, Depends, Header, Query, Request, UploadFile, status, Response
+from fastapi.responses import StreamingResponse
 from fastapi_utils.cbv import cbv
 from loguru import logger
 
-from common.schemas import APIResponse
+from common.enums import FileFormatEnum
+from common.errors import NotFoundError
+from common.responses import api_response, json_objects
+from common.schemas import APIPageResponse, APIResponse, PaginationParams
 from core.injection import on
+from lib.etag import etag_matches, version_etag
+from products.export import MEDIA_TYPES
+from products.importer import detect_format
 from products.service import ProductService
 from products.models import Product
-from products.schemas import CreateProduct, ProductResponse, UpdateProduct
+from products.schemas import (
+    CreateProduct,
+    ProductBatchRequest,
+    ProductBatchResult,
+    ProductFacets,
+    ProductFilterRequest,
+    ProductImportReport,
+    ProductResponse,
+    ProductSearchHit,
+    ProductSuggestion,
+    UpdateProduct,
+)
 # from auth.dependencies import get_current_admin_user
 # from auth.schemas import UserInDB
 # from fastapi import Body
@@ -18,8 +36,16 @@ from products.schemas import CreateProduct, ProductResponse, UpdateProduct
 PREFIX = "/product"
 TAG = "Product"
 
+PAGINATION_QUERY_PARAMS = {"page", "size", "cursor"}
+
 product_router = APIRouter(prefix=PREFIX, tags=[TAG])
 
+
+def _product_etag(product: t.Union[Product, ProductResponse]) -> str:
+    # Same version as product_version: rows never updated have a null updated_at
+    return version_etag(product.updated_at or product.created_at)
+
+
 @cbv(product_router)
 class ProductRouter:
     _service: ProductService = Depends(on(ProductService))
@@ -30,27 +56,135 @@ class ProductRouter:
         created_product = await self._service.create_product(product)
         return APIResponse[Product](message=f"Product {created_product.name} created successfully", data=created_product)
     
-    @product_router.get("/", response_model=APIResponse[t.List[ProductResponse]], status_code=status.HTTP_200_OK)
-    async def get_all_products(self):
-        logger.info("Getting all products")
-        products = await self._service.get_all_products()
-        return APIResponse[t.List[ProductResponse]](message="All products fetched successfully", data=products)
+    @product_router.get(
+        "/",
+        response_model=t.Union[APIPageResponse[ProductResponse], APIResponse[t.List[ProductResponse]]],
+        status_code=status.HTTP_200_OK,
+    )
+    async def get_all_products(
+        self,
+        request: Request,
+        pagination: PaginationParams = Depends(),
+        filters: ProductFilterRequest = Depends(ProductFilterRequest.as_query()),
+        if_none_match: t.Optional[str] = Header(None),
+    ):
+        """
+        List products. Passing any of `page`, `size` or `cursor` switches to the
+        paginated response, otherwise the whole catalog is returned. Both can be
+        narrowed with a JSON `filter` (see ProductFilter).
+        """
+        # Computed before fetching rows so the ETag is never newer than the body
+        etag = await self._service.get_products_etag(str(sorted(request.query_params.multi_items())))
+        if etag_matches(if_none_match, etag):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+        if PAGINATION_QUERY_PARAMS.isdisjoint(request.query_params.keys()):
+            logger.info("Getting all products")
+            # The whole catalog is encoded straight from the rows, without building models
+            rows = await self._service.get_all_products_json_rows(filters.filter)
+            return api_response(
+                json_objects(rows, ProductResponse), "All products fetched successfully", headers={"ETag": etag}
+            )
+
+        logger.info(f"Getting products page {pagination.page} (size {pagination.size})")
+        page = await self._service.get_products_page(pagination, filters.filter)
+        return api_response(page, "Products page fetched successfully", headers={"ETag": etag})
     
+    @product_router.get("/search", response_model=APIPageResponse[ProductSearchHit], status_code=status.HTTP_200_OK)
+    async def search_products(
+        self,
+        q: str = Query(..., min_length=1, max_length=200, description="Search terms (web search syntax)"),
+        size: int = Query(10, ge=1, le=100),
+        cursor: t.Optional[str] = Query(None, description="nextCursor of the previous page"),
+    ):
+        """Ranked full-text search over name, category, keywords and description"""
+        logger.info(f"Searching products for {q!r}")
+        page = await self._service.search_products(q, size, cursor)
+        return api_response(page, "Products searched successfully")
+
+    @product_router.get("/facets", response_model=APIResponse[ProductFacets], status_code=status.HTTP_200_OK)
+    async def get_product_facets(self, filters: ProductFilterRequest = Depends(ProductFilterRequest.as_query())):
+        """Category counts and trending stats, price histogram and totals, optionally for a filter"""
+        facets = await self._service.get_product_facets(filters.filter)
+        return api_response(facets, "Product facets fetched successfully")
+
+    @product_router.get("/trending", response_model=APIResponse[t.List[Product]], status_code=status.HTTP_200_OK)
+    async def get_trending_products(
+        self,
+        limit: int = Query(10, ge=1, le=100),
+        category: t.Optional[str] = Query(None, min_length=1, max_length=100),
+    ):
+        """Top trending products by trending percentage, optionally within one category"""
+        products = await self._service.get_trending_products(limit, category)
+        return api_response(products, "Trending products fetched successfully")
+
+    @product_router.get("/suggest", response_model=APIResponse[t.List[ProductSuggestion]], status_code=status.HTTP_200_OK)
+    async def suggest_products(
+        self,
+        prefix: str = Query(..., min_length=1, max_length=100),
+        limit: int = Query(10, ge=1, le=50),
+    ):
+        """Typeahead suggestions: categories and product names starting with prefix, then fuzzy name matches"""
+        suggestions = await self._service.suggest_products(prefix, limit)
+        return api_response(suggestions, "Suggestions fetched successfully")
+
+    @product_router.get("/export", status_code=status.HTTP_200_OK)
+    async def export_products(self, format: FileFormatEnum = FileFormatEnum.NDJSON):
+        """Stream the whole catalog as NDJSON or CSV"""
+        logger.info(f"Exporting products as {format.value}")
+        return StreamingResponse(
+            self._service.export_products(format),
+            media_type=MEDIA_TYPES[format],
+            headers={"Content-Disposition": f'attachment; filename="products.{format.value.lower()}"'},
+        )
+
+    @product_router.post("/import", response_model=APIResponse[ProductImportReport], status_code=status.HTTP_200_OK)
+    async def import_products(self, file: UploadFile, format: t.Optional[FileFormatEnum] = None):
+        """Bulk create products from an NDJSON or CSV upload, reporting errors per row"""
+        file_format = format or detect_format(file.filename, file.content_type)
+        logger.info(f"Importing products from {file.filename} as {file_format.value}")
+        report = await self._service.import_products(file.file, file_format)
+        return APIResponse[ProductImportReport](
+            message=f"{report.created} of {report.total_rows} products imported", data=report
+        )
+
+    @product_router.post("/batch", response_model=APIResponse[ProductBatchResult], status_code=status.HTTP_200_OK)
+    async def apply_batch(self, batch: ProductBatchRequest):
+        """Apply create/update/delete operations in one transaction, reporting a result per operation"""
+        logger.info(f"Applying batch of {len(batch.operations)} product operations")
+        result = await self._service.apply_batch(batch.operations)
+        message = "Batch applied successfully" if result.committed else "Batch rolled back"
+        return APIResponse[ProductBatchResult](message=message, data=result)
+
     @product_router.get("/{product_id}", response_model=APIResponse[ProductResponse], status_code=status.HTTP_200_OK)
-    async def get_product_by_id(self, product_id: UUID):
+    async def get_product_by_id(self, product_id: UUID, if_none_match: t.Optional[str] = Header(None)):
         logger.info(f"Getting product with ID {product_id}")
+        if if_none_match:
+            # Only the version is fetched to answer a revalidation
+            etag = await self._service.get_product_etag(product_id)
+            if etag and etag_matches(if_none_match, etag):
+                return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
         product = await self._service.get_product_by_id(product_id)
-        return APIResponse[ProductResponse](message="Product fetched successfully", data=product)
+        if not product:
+            raise NotFoundError(message=f"Product {product_id} not found")
+        return api_response(product, "Product fetched successfully", headers={"ETag": _product_etag(product)})
     
     @product_router.put("/{product_id}", response_model=APIResponse[Product], status_code=status.HTTP_200_OK)
-    async def update_product(self, product_id: UUID, product_update: UpdateProduct):
+    async def update_product(
+        self,
+        product_id: UUID,
+        product_update: UpdateProduct,
+        response: Response,
+        if_match: t.Optional[str] = Header(None),
+    ):
         logger.info(f"Updating product with ID {product_id}")
-        updated_product = await self._service.update_product(product_id, product_update)
+        updated_product = await self._service.update_product(product_id, product_update, if_match)
+        response.headers["ETag"] = _product_etag(updated_product)
         return APIResponse[Product](message=f"Product {updated_product.name} updated successfully", data=updated_product)
     
     @product_router.delete("/{product_id}", status_code=status.HTTP_204_NO_CONTENT)
-    async def delete_product_by_id(self, product_id: UUID):
+    async def delete_product_by_id(self, product_id: UUID, if_match: t.Optional[str] = Header(None)):
         """Delete a product by ID"""
         logger.info(f"Deleting product with ID {product_id}")
-        await self._service.delete_product_by_id(product_id)
+        await self._service.delete_product_by_id(product_id, if_match)
         return Response(status_code=status.HTTP_204_NO_CONTENT)
@@ -0,0 +1,153 @@
+import datetime as dt
+import typing as t
+from uuid import UUID as PyUUID
+
+from injector import singleton
+from sqlalchemy import ColumnElement, DateTime, Float, Numeric, Select, bindparam, cast, select, tuple_
+from sqlalchemy.dialects.postgresql.asyncpg import dialect as AsyncpgDialect
+
+from core.config import cfg
+from core.metrics import db_query_duration
+from db.core import db, read_db
+from db.instrumentation import InstrumentedDatabase
+from db.mapping import TrustedRowMapper
+from db.pool import asyncpg_pool
+from db.timeouts import statement_timeouts
+from db.utils import PgUUID
+from lib.metrics import timed_methods
+from products.models import PRODUCT_COLUMNS, products
+from products.repo import PRODUCT_JSON_COLUMNS, ProductRepo, product_list_version, product_version
+from products.schemas import ProductResponse
+
+
+class Statement:
+    """
+    A query compiled once for asyncpg: its SQL with $n placeholders and the names of its
+    bind parameters in placeholder order. asyncpg prepares the SQL on the first run on
+    each connection and reuses the prepared statement afterwards (statement cache).
+    """
+
+    def __init__(self, query: Select):
+        compiled = query.compile(dialect=AsyncpgDialect())
+        self.sql = compiled.string
+        self.params: t.Tuple[str, ...] = tuple(compiled.positiontup or ())
+
+    def args(self, **values: t.Any) -> t.List[t.Any]:
+        return [values[name] for name in self.params]
+
+
+def _product_ready(column) -> ColumnElement:
+    """Column as asyncpg should return it for a Product field (numerics as float8 instead of Decimal)"""
+    return cast(column, Float).label(column.name) if isinstance(column.type, Numeric) else column
+
+
+# PRODUCT_COLUMNS converted by the database to the Product field types
+_ROW_COLUMNS = [_product_ready(c) for c in PRODUCT_COLUMNS]
+_newest_first = (products.c.created_at.desc(), products.c.id.desc())
+
+GET_BY_ID = Statement(select(*_ROW_COLUMNS).where(products.c.id == bindparam("id", type_=PgUUID)))
+GET_VERSION = Statement(select(product_version).where(products.c.id == bindparam("id", type_=PgUUID)))
+GET_LIST_VERSION = Statement(select(product_list_version.c.version))
+GET_ALL = Statement(select(*_ROW_COLUMNS).order_by(products.c.created_at.desc()))
+GET_ALL_JSON = Statement(select(*PRODUCT_JSON_COLUMNS).order_by(products.c.created_at.desc()))
+GET_PAGE = Statement(
+    select(*_ROW_COLUMNS).order_by(*_newest_first).limit(bindparam("limit")).offset(bindparam("skip"))
+)
+GET_PAGE_AFTER = Statement(
+    select(*_ROW_COLUMNS)
+    .where(
+        tuple_(products.c.created_at, products.c.id)
+        < tuple_(
+            bindparam("after_created_at", type_=DateTime(timezone=True)), bindparam("after_id", type_=PgUUID)
+        )
+    )
+    .order_by(*_newest_first)
+    .limit(bindparam("limit"))
+)
+
+# Rows of the statements above are already in the shape of ProductResponse: mapping one is a dict display
+_to_product = TrustedRowMapper(ProductResponse, tuple(c.name for c in PRODUCT_COLUMNS))
+
+
+def _pool(database: InstrumentedDatabase):
+    """
+    asyncpg pool behind a connected databases Postgres backend, None when the query has
+    to go through databases: other backends, and inside a transaction of this task
+    (whose queries must run on its connection)
+    """
+    if read_db.in_transaction():
+        return None
+    return asyncpg_pool(database)
+
+
+async def _fetch(database: InstrumentedDatabase, pool, method: str, statement: Statement, **values: t.Any) -> t.Any:
+    # Through the database: waits for a connection and slow statements are recorded as for databases queries
+    return await database.fetch_on_pool(pool, method, statement.sql, statement.args(**values), values)
+
+
+@singleton
+@timed_methods(db_query_duration, "AsyncpgProductRepo")
+@statement_timeouts(cfg.REPO_TIMEOUT_SECONDS, cfg.REPO_METHOD_TIMEOUTS_SECONDS)
+class AsyncpgProductRepo(ProductRepo):
+    """
+    ProductRepo running its hottest reads (by id, lists, pages and versions) straight on
+    the asyncpg pools of the databases connections, with statements compiled once at
+    import instead of on every call. Reads still go through the read router, so replicas
+    and read-your-writes apply. Filtered queries, writes and everything else run through
+    databases (see ProductRepo), as do all queries on other backends than Postgres.
+    """
+
+    async def get_product_by_id(self, product_id: PyUUID) -> t.Optional[ProductResponse]:
+        database = read_db()
+        pool = _pool(database)
+        if pool is None:
+            return await super().get_product_by_id(product_id)
+        row = await _fetch(database, pool, "fetchrow", GET_BY_ID, id=product_id)
+        return _to_product(row) if row is not None else None
+
+    async def get_all_products(self, where: t.Sequence[ColumnElement[bool]] = ()) -> t.List[ProductResponse]:
+        database = read_db()
+        pool = None if where else _pool(database)
+        if pool is None:
+            return await super().get_all_products(where)
+        return [_to_product(row) for row in await _fetch(database, pool, "fetch", GET_ALL)]
+
+    async def get_all_products_json_rows(self, where: t.Sequence[ColumnElement[bool]] = ()) -> t.List[t.Sequence]:
+        database = read_db()
+        pool = None if where else _pool(database)
+        if pool is None:
+            return await super().get_all_products_json_rows(where)
+        return [tuple(row) for row in await _fetch(database, pool, "fetch", GET_ALL_JSON)]
+
+    async def get_products_page(
+        self,
+        *,
+        limit: int,
+        skip: int = 0,
+        after: t.Optional[t.Tuple[dt.datetime, PyUUID]] = None,
+        where: t.Sequence[ColumnElement[bool]] = (),
+    ) -> t.List[ProductResponse]:
+        database = read_db()
+        pool = None if where else _pool(database)
+        if pool is None:
+            return await super().get_products_page(limit=limit, skip=skip, after=after, where=where)
+        if after is not None:
+            after_created_at, after_id = after
+            values = {"after_created_at": after_created_at, "after_id": after_id}
+            rows = await _fetch(database, pool, "fetch", GET_PAGE_AFTER, limit=limit, **values)
+        else:
+            rows = await _fetch(database, pool, "fetch", GET_PAGE, limit=limit, skip=skip)
+        return [_to_product(row) for row in rows]
+
+    async def get_product_version(self, product_id: PyUUID) -> t.Optional[dt.datetime]:
+        pool = _pool(db)
+        if pool is None:
+            return await super().get_product_version(product_id)
+        return await _fetch(db, pool, "fetchval", GET_VERSION, id=product_id)
+
+    async def get_products_version(self) -> int:
+        database = read_db()
+        pool = _pool(database)
+        if pool is None:
+            return await super().get_products_version()
+        return await _fetch(database, pool, "fetchval", GET_LIST_VERSION)
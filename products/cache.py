@@ -0,0 +1,158 @@
+import contextlib
+import contextvars
+import datetime as dt
+import typing as t
+from uuid import UUID as PyUUID
+
+from common.responses import PreEncoded
+from db.core import read_db
+from lib.lru import TTLCache
+from products.models import Product
+from products.repo import ProductRepo
+from products.schemas import CreateProduct, ProductResponse, UpdateProduct
+
+
+# Ids evicted by the writes of the transaction open in this task, evicted again once it ends
+_evicted_in_transaction: contextvars.ContextVar[t.Optional[t.Set[PyUUID]]] = contextvars.ContextVar(
+    "evicted_in_transaction", default=None
+)
+
+
+class _CachedProduct(PreEncoded, ProductResponse):
+    """ProductResponse encoded once for all the responses served from the cache"""
+
+
+class _Fill:
+    """Reads of an id in flight, and the invalidations of that id since the first one started"""
+
+    __slots__ = ("readers", "generation")
+
+    def __init__(self):
+        self.readers = 0
+        self.generation = 0
+
+
+class CachedProductRepo:
+    """
+    Read-through cache in front of a ProductRepo.
+
+    Products are cached by id as ProductResponse instances that keep their JSON once
+    encoded, so a hit skips the database, pydantic validation and the encoding. Unknown ids are cached too (as None) for a
+    shorter time. Every mutation going through this repo evicts the ids it touched.
+    A read that was in flight while its id was evicted does not fill the cache, so that
+    it cannot put back the row as it was before the write. Writes in a transaction evict
+    again once it ends, as reads until the commit still see the previous rows. Entries are
+    only filled from the primary, and reads that must see the latest writes (in a
+    transaction, or after a write of the client, see ReadRouter.needs_primary) bypass them.
+    Writes done by other processes are only picked up once entries expire.
+    Any method that is not overridden here is delegated to the wrapped repo.
+    """
+
+    def __init__(self, repo: ProductRepo, cache: TTLCache[PyUUID, t.Optional[ProductResponse]], negative_ttl: float):
+        self._repo = repo
+        self.cache = cache
+        self.negative_ttl = negative_ttl
+        # Only ids being read are tracked, so this stays bounded by the reads in flight
+        self._fills: t.Dict[PyUUID, _Fill] = {}
+
+    def __getattr__(self, name: str):
+        return getattr(self._repo, name)
+
+    async def get_product_by_id(self, product_id: PyUUID) -> t.Optional[ProductResponse]:
+        if read_db.needs_primary():
+            # Has to see the latest writes (or the uncommitted rows of its transaction)
+            return await self._repo.get_product_by_id(product_id)
+        found, product = self.cache.get(product_id)
+        if found:
+            return product
+        fill = self._fills.get(product_id)
+        if fill is None:
+            fill = self._fills[product_id] = _Fill()
+        fill.readers += 1
+        generation = fill.generation
+        try:
+            # Not from a replica: the entry is served to every client, including those reading their writes
+            with read_db.on_primary():
+                product = await self._repo.get_product_by_id(product_id)
+        finally:
+            fill.readers -= 1
+            if not fill.readers:
+                del self._fills[product_id]
+        if fill.generation == generation:
+            if product is not None:
+                product = _CachedProduct.model_construct(_fields_set=product.model_fields_set, **product.__dict__)
+            self.cache.set(product_id, product, ttl=None if product else self.negative_ttl)
+        return product
+
+    async def get_product_version(self, product_id: PyUUID) -> t.Optional[dt.datetime]:
+        if read_db.needs_primary():
+            return await self._repo.get_product_version(product_id)
+        found, product = self.cache.get(product_id)
+        if found:
+            return (product.updated_at or product.created_at) if product else None
+        return await self._repo.get_product_version(product_id)
+
+    async def create_product(self, new_product: CreateProduct) -> Product:
+        product = await self._repo.create_product(new_product)
+        self._invalidate(product.id)
+        return product
+
+    async def update_product(
+        self,
+        product_id: PyUUID,
+        product_update: UpdateProduct,
+        expected_versions: t.Optional[t.List[dt.datetime]] = None,
+    ) -> t.Optional[Product]:
+        try:
+            return await self._repo.update_product(product_id, product_update, expected_versions)
+        finally:
+            self._invalidate(product_id)
+
+    async def delete_product_by_id(
+        self, product_id: PyUUID, expected_versions: t.Optional[t.List[dt.datetime]] = None
+    ) -> bool:
+        try:
+            return await self._repo.delete_product_by_id(product_id, expected_versions)
+        finally:
+            self._invalidate(product_id)
+
+    async def create_products(self, new_products: t.List[CreateProduct]) -> t.List[Product]:
+        created = await self._repo.create_products(new_products)
+        for product in created:
+            self._invalidate(product.id)
+        return created
+
+    async def update_products(self, updates: t.List[t.Tuple[PyUUID, UpdateProduct]]) -> t.List[Product]:
+        try:
+            return await self._repo.update_products(updates)
+        finally:
+            for product_id, _ in updates:
+                self._invalidate(product_id)
+
+    async def delete_products(self, product_ids: t.List[PyUUID]) -> t.List[PyUUID]:
+        try:
+            return await self._repo.delete_products(product_ids)
+        finally:
+            for product_id in product_ids:
+                self._invalidate(product_id)
+
+    @contextlib.asynccontextmanager
+    async def transaction(self) -> t.AsyncIterator[None]:
+        evicted: t.Set[PyUUID] = set()
+        token = _evicted_in_transaction.set(evicted)
+        try:
+            async with self._repo.transaction():
+                yield
+        finally:
+            _evicted_in_transaction.reset(token)
+            for product_id in evicted:
+                self._invalidate(product_id)
+
+    def _invalidate(self, product_id: PyUUID):
+        evicted = _evicted_in_transaction.get()
+        if evicted is not None:
+            evicted.add(product_id)
+        self.cache.delete(product_id)
+        fill = self._fills.get(product_id)
+        if fill is not None:
+            fill.generation += 1
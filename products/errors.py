@@ -8,4 +8,12 @@ class ProductNameAlreadyExistsError(BaseHTTPError):
     """
 
     def __init__(self, *, message="Product name already exists", headers=None):
-        super().__init__(message=message, status_code=status.HTTP_400_BAD_REQUEST, headers=headers)
\ No newline at end of file
+        super().__init__(message=message, status_code=status.HTTP_400_BAD_REQUEST, headers=headers)
+
+class BatchOperationConflictError(BaseHTTPError):
+    """
+    (409) Product targeted by more than one operation of a batch
+    """
+
+    def __init__(self, *, message="Product is targeted by more than one operation of the batch", headers=None):
+        super().__init__(message=message, status_code=status.HTTP_409_CONFLICT, headers=headers)
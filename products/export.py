@@ -0,0 +1,75 @@
+import csv
+import datetime as dt
+import io
+import typing as t
+
+import orjson
+
+from common.enums import FileFormatEnum
+from common.responses import orjson_default
+from common.schemas import dt_to_iso8601z
+from products.models import Product, products
+
+# (column name, camelCase alias) for every products column exposed by the Product schema
+EXPORT_COLUMNS: t.List[t.Tuple[str, str]] = [
+    (column.name, Product.model_fields[column.name].alias or column.name)
+    for column in products.columns
+    if column.name in Product.model_fields
+]
+
+MEDIA_TYPES = {
+    FileFormatEnum.NDJSON: "application/x-ndjson",
+    FileFormatEnum.CSV: "text/csv",
+}
+
+
+def _csv_value(value: t.Any) -> t.Any:
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, dt.datetime):
+        return dt_to_iso8601z(value)
+    return value
+
+
+def encode_ndjson(rows: t.Sequence[t.Mapping]) -> bytes:
+    """Encode rows as newline delimited JSON objects with camelCase keys"""
+    return b"".join(
+        orjson.dumps(
+            {alias: row[name] for name, alias in EXPORT_COLUMNS},
+            default=orjson_default,
+            option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_APPEND_NEWLINE,
+        )
+        for row in rows
+    )
+
+
+def encode_csv(rows: t.Sequence[t.Mapping], header: bool = False) -> bytes:
+    """Encode rows as CSV lines, optionally preceded by the camelCase header"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    if header:
+        writer.writerow([alias for _, alias in EXPORT_COLUMNS])
+    writer.writerows([_csv_value(row[name]) for name, _ in EXPORT_COLUMNS] for row in rows)
+    return buffer.getvalue().encode()
+
+
+async def encode_batches(
+    rows: t.AsyncIterator[t.Mapping], file_format: FileFormatEnum, batch_size: int
+) -> t.AsyncIterator[bytes]:
+    """
+    Group rows coming from a cursor into fixed-size batches and yield each
+    batch encoded, so only one batch is held in memory at a time.
+    """
+    if file_format == FileFormatEnum.CSV:
+        yield encode_csv([], header=True)
+    encode = encode_csv if file_format == FileFormatEnum.CSV else encode_ndjson
+    batch = []
+    async for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            yield encode(batch)
+            batch = []
+    if batch:
+        yield encode(batch)
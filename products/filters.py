@@ -0,0 +1,33 @@
+import typing as t
+
+from sqlalchemy import ColumnElement, false, true
+
+from products.models import products
+from products.schemas import ProductFilter
+
+
+def compile_product_filter(product_filter: t.Optional[ProductFilter]) -> t.List[ColumnElement[bool]]:
+    """
+    Compile a product filter into `where` clauses on the products table. Each condition
+    maps to an indexed shape: category (+ price) uses ix_products_category_price and
+    is_trend uses the partial ix_products_trend_created_at_id index.
+    """
+    if product_filter is None:
+        return []
+    clauses = []
+    if product_filter.categories:
+        clauses.append(products.c.category.in_(product_filter.categories))
+    if product_filter.min_price is not None:
+        clauses.append(products.c.price >= product_filter.min_price)
+    if product_filter.max_price is not None:
+        clauses.append(products.c.price <= product_filter.max_price)
+    if product_filter.is_trend is not None:
+        # Rendered as a literal (not a bind parameter) so the planner can match the partial index predicate
+        clauses.append(products.c.is_trend == (true() if product_filter.is_trend else false()))
+    if product_filter.min_trending_percentage is not None:
+        clauses.append(products.c.trending_percentage >= product_filter.min_trending_percentage)
+    if product_filter.created_after is not None:
+        clauses.append(products.c.created_at >= product_filter.created_after)
+    if product_filter.created_before is not None:
+        clauses.append(products.c.created_at < product_filter.created_before)
+    return clauses
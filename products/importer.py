@@ -0,0 +1,52 @@
+import csv
+import io
+import typing as t
+
+import orjson
+
+from common.enums import FileFormatEnum
+
+# (row number, parsed fields) or (row number, parse error message)
+ParsedRow = t.Tuple[int, t.Union[t.Dict[str, t.Any], str]]
+
+
+def detect_format(filename: t.Optional[str], content_type: t.Optional[str]) -> FileFormatEnum:
+    """Guess the upload format from its file name or content type, defaulting to NDJSON"""
+    if (filename or "").lower().endswith(".csv") or (content_type or "").startswith("text/csv"):
+        return FileFormatEnum.CSV
+    return FileFormatEnum.NDJSON
+
+
+def _iter_ndjson(stream: t.TextIO) -> t.Iterator[ParsedRow]:
+    row_number = 0
+    for line in stream:
+        if not line.strip():
+            continue
+        row_number += 1
+        try:
+            data = orjson.loads(line)
+        except orjson.JSONDecodeError as e:
+            yield row_number, f"Invalid JSON: {e}"
+            continue
+        if not isinstance(data, dict):
+            yield row_number, "Row must be a JSON object"
+            continue
+        yield row_number, data
+
+
+def _iter_csv(stream: t.TextIO) -> t.Iterator[ParsedRow]:
+    for row_number, data in enumerate(csv.DictReader(stream), start=1):
+        # Empty cells fall back to the schema defaults
+        yield row_number, {key: value for key, value in data.items() if key and value not in ("", None)}
+
+
+def iter_rows(file: t.BinaryIO, file_format: FileFormatEnum) -> t.Iterator[ParsedRow]:
+    """
+    Lazily parse an uploaded file into numbered rows. Row numbers are 1-based and
+    count data rows only (the CSV header and blank NDJSON lines are not counted).
+    """
+    stream = io.TextIOWrapper(file, encoding="utf-8-sig", newline="")
+    try:
+        yield from (_iter_csv(stream) if file_format == FileFormatEnum.CSV else _iter_ndjson(stream))
+    finally:
+        stream.detach()
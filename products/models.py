@@ -1,7 +1,7 @@
 import datetime as dt
 
-from sqlalchemy import Column, String, Text, Numeric, Boolean, Table
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy import Column, Computed, String, Text, Numeric, Boolean, Table, Index
+from sqlalchemy.dialects.postgresql import TSVECTOR, UUID
 from uuid import UUID as PyUUID 
 from common.schemas import BaseSchema
 from db.core import metadata
@@ -13,7 +13,7 @@ products = Table(
     "products",
     metadata,
     uuid_pk(),
-    Column("name", String, nullable=False, index=True),
+    Column("name", String, nullable=False, index=True, unique=True),
     Column("category", String, nullable=False, index=True),
     Column("description", Text, nullable=False),
     Column("price", Numeric(10, 2), nullable=False),
@@ -22,9 +22,41 @@ products = Table(
     Column("keywords", String, nullable=True),
     Column("trending_percentage", Numeric(5, 2), nullable=False, default=0, server_default="0"),
     created_at(),
-    updated_at(),
+    updated_at(index=True),
+    Column(
+        "search_vector",
+        TSVECTOR,
+        Computed(
+            "setweight(to_tsvector('english', coalesce(name, '')), 'A') || "
+            "setweight(to_tsvector('english', coalesce(category, '')), 'B') || "
+            "setweight(to_tsvector('english', coalesce(keywords, '')), 'B') || "
+            "setweight(to_tsvector('english', coalesce(description, '')), 'C')",
+            persisted=True,
+        ),
+    ),
 )
 
+# Keyset pagination walks (created_at, id) in descending order
+Index("ix_products_created_at_id", products.c.created_at.desc(), products.c.id.desc())
+Index("ix_products_search_vector", products.c.search_vector, postgresql_using="gin")
+# Common filter shapes: category (+ price range), and trending products in listing order
+Index("ix_products_category_price", products.c.category, products.c.price)
+Index(
+    "ix_products_trend_created_at_id",
+    products.c.created_at.desc(),
+    products.c.id.desc(),
+    postgresql_where=products.c.is_trend,
+)
+# Trending leaderboard
+Index(
+    "ix_products_trend_trending_percentage",
+    products.c.trending_percentage.desc(),
+    products.c.id.desc(),
+    postgresql_where=products.c.is_trend,
+)
+# Fuzzy name suggestions (requires the pg_trgm extension)
+Index("ix_products_name_trgm", products.c.name, postgresql_using="gin", postgresql_ops={"name": "gin_trgm_ops"})
+
 class Product(BaseSchema):
     id: PyUUID
     name: str
@@ -39,3 +71,6 @@ class Product(BaseSchema):
     updated_at: dt.datetime
 
 
+# Columns mapped to the Product schema: select these instead of the whole table
+# so the generated search vector is never sent over the wire
+PRODUCT_COLUMNS = [products.c[name] for name in Product.model_fields]
@@ -1,69 +1,496 @@
+import datetime as dt
 import typing as t
+from decimal import Decimal
+import orjson
 from injector import singleton
 from uuid import UUID as PyUUID
-from sqlalchemy import insert, select, func, delete, update
-from db.core import db
-from db.utils import map_result, map_to
-from products.models import products, Product
-from products.schemas import CreateProduct, ProductResponse, UpdateProduct
+from sqlalchemy import (
+    Column,
+    ColumnElement,
+    DateTime,
+    Float,
+    Numeric,
+    Select,
+    any_,
+    bindparam,
+    case,
+    cast,
+    column,
+    delete,
+    func,
+    insert,
+    literal,
+    literal_column,
+    select,
+    table,
+    text,
+    true,
+    tuple_,
+    update,
+    values,
+)
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.dialects.postgresql import ARRAY, REAL
+from common.enums import CountModeEnum
+from core.config import cfg
+from core.metrics import db_query_duration
+from db.core import db, read_db
+from db.mapping import map_row, map_rows
+from db.routing import writes
+from db.timeouts import statement_timeouts
+from db.utils import PgUUID, iso8601z, map_result, uuid_text
+from lib.metrics import timed_methods
+from products.models import PRODUCT_COLUMNS, products, Product
+from products.schemas import CreateProduct, ProductResponse, ProductSearchHit, UpdateProduct
+
+IMPORT_COLUMNS = list(CreateProduct.model_fields)
+UPDATE_COLUMNS = list(UpdateProduct.model_fields)
+
+IMPORT_STAGING_DDL = """
+CREATE TEMPORARY TABLE products_import (
+    row_number integer NOT NULL,
+    name varchar NOT NULL,
+    category varchar NOT NULL,
+    description text NOT NULL,
+    price numeric(10, 2) NOT NULL,
+    image_url varchar,
+    is_trend boolean NOT NULL,
+    keywords varchar,
+    trending_percentage numeric(5, 2) NOT NULL
+) ON COMMIT DROP
+"""
+
+# Keeps the first occurrence of every name, lets the unique index skip names that
+# already exist and reports one status per staged row, all in a single statement.
+IMPORT_MERGE_SQL = f"""
+WITH candidates AS (
+    SELECT DISTINCT ON (name) *
+    FROM products_import
+    ORDER BY name, row_number
+),
+inserted AS (
+    INSERT INTO products ({", ".join(IMPORT_COLUMNS)})
+    SELECT {", ".join(f"c.{column}" for column in IMPORT_COLUMNS)}
+    FROM candidates c
+    ORDER BY c.row_number
+    ON CONFLICT (name) DO NOTHING
+    RETURNING {", ".join(c.name for c in PRODUCT_COLUMNS)}
+)
+SELECT
+    s.row_number,
+    i.*,
+    CASE
+        WHEN i.id IS NOT NULL THEN 'CREATED'
+        WHEN c.row_number IS NULL THEN 'DUPLICATE_IN_FILE'
+        ELSE 'NAME_ALREADY_EXISTS'
+    END AS status
+FROM products_import s
+LEFT JOIN candidates c ON c.row_number = s.row_number
+LEFT JOIN inserted i ON i.name = c.name
+ORDER BY s.row_number
+"""
+
+
+def _staging_record(row_number: int, product: CreateProduct) -> tuple:
+    values = product.model_dump()
+    return (
+        row_number,
+        *(Decimal(str(values[c])) if isinstance(values[c], float) else values[c] for c in IMPORT_COLUMNS),
+    )
+
+
+SEARCH_CONFIG = literal_column("'english'::regconfig")
+SEARCH_HEADLINE_OPTIONS = "StartSel=<mark>, StopSel=</mark>, MaxFragments=2, MaxWords=20, MinWords=5"
+
+# Version of the whole product list, bumped by every transaction writing to products (see its migration)
+product_list_version = table("product_list_version", column("version"))
+
+# Price histogram resolution, also baked into the product_facets materialized view
+PRICE_HISTOGRAM_BUCKETS = 10
+
+product_facets_view = table(
+    "product_facets",
+    *(
+        column(name)
+        for name in (
+            "facet",
+            "category",
+            "bucket",
+            "lo",
+            "hi",
+            "count",
+            "trending_count",
+            "avg_trending_percentage",
+            "p50_trending_percentage",
+            "p90_trending_percentage",
+        )
+    ),
+)
+
+
+def _facets_query(where: t.Sequence[ColumnElement[bool]]) -> Select:
+    """
+    All facets in one aggregate: one row per category, one per price bucket and a total
+    row, told apart by `facet` (CATEGORY, PRICE or TOTAL). Same shape as product_facets.
+    """
+    bounds = (
+        select(func.min(products.c.price).label("lo"), func.max(products.c.price).label("hi"))
+        .where(*where)
+        .cte("bounds")
+    )
+    bucket = case(
+        (
+            bounds.c.hi > bounds.c.lo,
+            func.least(
+                func.width_bucket(products.c.price, bounds.c.lo, bounds.c.hi, PRICE_HISTOGRAM_BUCKETS),
+                PRICE_HISTOGRAM_BUCKETS,
+            ),
+        ),
+        else_=1,
+    )
+    bucketed = (
+        select(
+            products.c.category,
+            products.c.is_trend,
+            products.c.trending_percentage,
+            bucket.label("bucket"),
+            bounds.c.lo,
+            bounds.c.hi,
+        )
+        .select_from(products.join(bounds, true()))
+        .where(*where)
+        .subquery("bucketed")
+    )
+    grouping = func.grouping(bucketed.c.category, bucketed.c.bucket)
+    return select(
+        case((grouping == 1, "CATEGORY"), (grouping == 2, "PRICE"), else_="TOTAL").label("facet"),
+        bucketed.c.category,
+        bucketed.c.bucket,
+        func.min(bucketed.c.lo).label("lo"),
+        func.max(bucketed.c.hi).label("hi"),
+        func.count().label("count"),
+        func.count().filter(bucketed.c.is_trend).label("trending_count"),
+        func.avg(bucketed.c.trending_percentage).label("avg_trending_percentage"),
+        func.percentile_cont(0.5).within_group(bucketed.c.trending_percentage).label("p50_trending_percentage"),
+        func.percentile_cont(0.9).within_group(bucketed.c.trending_percentage).label("p90_trending_percentage"),
+    ).group_by(func.grouping_sets(tuple_(bucketed.c.category), tuple_(bucketed.c.bucket), tuple_()))
+
+
+def _json_ready(column: Column) -> ColumnElement:
+    """Column converted by the database to the value the API sends (text, float or bool)"""
+    if isinstance(column.type, DateTime):
+        return iso8601z(column)
+    if isinstance(column.type, Numeric):
+        return cast(column, Float)
+    if column is products.c.id:
+        return uuid_text(column)
+    return column
+
+
+# PRODUCT_COLUMNS as JSON-ready values, for responses encoded straight from rows
+PRODUCT_JSON_COLUMNS = [_json_ready(c).label(c.name) for c in PRODUCT_COLUMNS]
+
+
+# Version of a product row, as exposed through its ETag
+product_version = func.coalesce(products.c.updated_at, products.c.created_at)
+
 
 @singleton
+@timed_methods(db_query_duration, "ProductRepo")
+@statement_timeouts(cfg.REPO_TIMEOUT_SECONDS, cfg.REPO_METHOD_TIMEOUTS_SECONDS)
 class ProductRepo:
 
+    @writes
     @map_result
     async def create_product(self, new_product: CreateProduct) -> Product:
-        result = await db.fetch_one(insert(products).values(new_product.dict()).returning(products))
+        result = await db.fetch_one(insert(products).values(new_product.dict()).returning(*PRODUCT_COLUMNS))
         return result
     
-    @map_result
     async def get_product_by_name(self, product_name: str) -> t.Optional[Product]:
-        result = await db.fetch_one(select(products).where(products.c.name == product_name))
-        return result
+        result = await db.fetch_one(select(*PRODUCT_COLUMNS).where(products.c.name == product_name))
+        return map_row(result, Product, trusted=True)
     
-    @map_result
-    async def get_product_by_id(self, product_id: PyUUID) -> t.Optional[Product]:
-        result = await db.fetch_one(select(products).where(products.c.id == product_id))
-        return result
+    async def get_product_by_id(self, product_id: PyUUID) -> t.Optional[ProductResponse]:
+        result = await read_db().fetch_one(select(*PRODUCT_COLUMNS).where(products.c.id == str(product_id)))
+        return map_row(result, ProductResponse, trusted=True)
     
-    async def get_all_products(self) -> t.List[ProductResponse]:
-        query = select(products).order_by(products.c.created_at.desc())
-        results = await db.fetch_all(query)
-        return [
-            ProductResponse(
-                id=row['id'],
-                name=row['name'],
-                category=row['category'],
-                description=row['description'],
-                price=float(row['price']),
-                image_url=row['image_url'],
-                is_trend=row['is_trend'],
-                keywords=row['keywords'],
-                trending_percentage=float(row['trending_percentage']),
-                created_at=row['created_at'],
-                updated_at=row['updated_at']
-            )
-            for row in results
-        ]
+    async def get_all_products(self, where: t.Sequence[ColumnElement[bool]] = ()) -> t.List[ProductResponse]:
+        query = select(*PRODUCT_COLUMNS).where(*where).order_by(products.c.created_at.desc())
+        results = await read_db().fetch_all(query)
+        return map_rows(results, ProductResponse, trusted=True)
     
+    async def get_all_products_json_rows(self, where: t.Sequence[ColumnElement[bool]] = ()) -> t.List[t.Sequence]:
+        """Same as `get_all_products`, as tuples of JSON-ready values in Product field order"""
+        query = select(*PRODUCT_JSON_COLUMNS).where(*where).order_by(products.c.created_at.desc())
+        results = await read_db().fetch_all(query)
+        return [tuple(row._mapping.values()) for row in results]
+
+    async def get_products_page(
+        self,
+        *,
+        limit: int,
+        skip: int = 0,
+        after: t.Optional[t.Tuple[dt.datetime, PyUUID]] = None,
+        where: t.Sequence[ColumnElement[bool]] = (),
+    ) -> t.List[ProductResponse]:
+        """
+        Fetch one page ordered by (created_at, id) descending. When `after` is given
+        the page starts right after that keyset (skip is ignored), otherwise `skip` rows are skipped.
+        """
+        query = (
+            select(*PRODUCT_COLUMNS)
+            .where(*where)
+            .order_by(products.c.created_at.desc(), products.c.id.desc())
+            .limit(limit)
+        )
+        if after is not None:
+            after_created_at, after_id = after
+            query = query.where(
+                tuple_(products.c.created_at, products.c.id)
+                < tuple_(literal(after_created_at, DateTime(timezone=True)), literal(str(after_id), PgUUID))
+            )
+        elif skip:
+            query = query.offset(skip)
+        results = await read_db().fetch_all(query)
+        return map_rows(results, ProductResponse, trusted=True)
+
+    async def count_products(
+        self, mode: CountModeEnum = CountModeEnum.EXACT, where: t.Sequence[ColumnElement[bool]] = ()
+    ) -> t.Optional[int]:
+        """
+        Count products. ESTIMATE reads the planner statistics instead of scanning
+        the table (the table size, or the planner row estimate when filtered) and
+        falls back to an exact count if the table was never analyzed.
+        """
+        if mode == CountModeEnum.NONE:
+            return None
+        if mode == CountModeEnum.ESTIMATE:
+            if where:
+                estimate = await self._estimate_rows(select(products.c.id).where(*where))
+            else:
+                estimate = await read_db().fetch_val(
+                    text("SELECT reltuples::bigint FROM pg_class WHERE oid = 'products'::regclass")
+                )
+            if estimate is not None and estimate >= 0:
+                return int(estimate)
+        return await read_db().fetch_val(select(func.count()).select_from(products).where(*where))
+
+    async def _estimate_rows(self, query: Select) -> t.Optional[int]:
+        """Row count estimated by the planner for a query, without running it"""
+        # Bound as parameters (IN lists expanded to one each), so the plan is for the actual values
+        dialect = postgresql.dialect(paramstyle="named")
+        compiled = query.compile(dialect=dialect, compile_kwargs={"render_postcompile": True})
+        plan = await read_db().fetch_val(text(f"EXPLAIN (FORMAT JSON) {compiled.string}").bindparams(**compiled.params))
+        if isinstance(plan, str):
+            plan = orjson.loads(plan)
+        return plan[0]["Plan"]["Plan Rows"] if plan else None
+
+    async def search_products(
+        self, text_query: str, *, limit: int, after: t.Optional[t.Tuple[float, PyUUID]] = None
+    ) -> t.List[ProductSearchHit]:
+        """
+        Full-text search over the generated search vector (GIN indexed), best matches
+        first. `after` is the (rank, id) keyset of the last hit of the previous page.
+        """
+        ts_query = func.websearch_to_tsquery(SEARCH_CONFIG, text_query)
+        rank = func.ts_rank(products.c.search_vector, ts_query)
+        query = (
+            select(
+                *PRODUCT_COLUMNS,
+                rank.label("rank"),
+                func.ts_headline(SEARCH_CONFIG, products.c.description, ts_query, SEARCH_HEADLINE_OPTIONS).label(
+                    "highlight"
+                ),
+            )
+            .where(products.c.search_vector.op("@@")(ts_query))
+            .order_by(rank.desc(), products.c.id.desc())
+            .limit(limit)
+        )
+        if after is not None:
+            after_rank, after_id = after
+            query = query.where(
+                tuple_(rank, products.c.id) < tuple_(literal(after_rank, REAL), literal(str(after_id), PgUUID))
+            )
+        results = await read_db().fetch_all(query)
+        return map_rows(results, ProductSearchHit, trusted=True)
+
+    async def iterate_products(self) -> t.AsyncIterator[t.Mapping]:
+        """
+        Stream raw product rows through a server-side cursor, newest first
+        """
+        query = select(*PRODUCT_COLUMNS).order_by(products.c.created_at.desc(), products.c.id.desc())
+        async for row in read_db().iterate(query):
+            yield row
+
+    @writes
+    async def import_products(
+        self, chunks: t.AsyncIterator[t.List[t.Tuple[int, CreateProduct]]]
+    ) -> t.List[t.Mapping]:
+        """
+        COPY validated rows chunk by chunk into a transaction-scoped staging table,
+        then merge them into products with one set-based statement.
+
+        :return: one (row_number, product columns, status) row per staged product,
+            the product columns being null unless the row was created
+        """
+        async with db.connection() as connection:
+            async with connection.transaction():
+                raw = connection.raw_connection
+                # Large files take longer than the server-side statement timeout allows
+                await raw.execute("SET LOCAL statement_timeout = 0")
+                await raw.execute(IMPORT_STAGING_DDL)
+                async for chunk in chunks:
+                    await raw.copy_records_to_table(
+                        "products_import",
+                        columns=["row_number", *IMPORT_COLUMNS],
+                        records=[_staging_record(row_number, product) for row_number, product in chunk],
+                    )
+                return await raw.fetch(IMPORT_MERGE_SQL)
+
+    async def get_trending_products(self, *, limit: int, category: t.Optional[str] = None) -> t.List[Product]:
+        """Trending products, highest trending percentage first (partial index on is_trend)"""
+        query = (
+            select(*PRODUCT_COLUMNS)
+            .where(products.c.is_trend == true())
+            .order_by(products.c.trending_percentage.desc(), products.c.id.desc())
+            .limit(limit)
+        )
+        if category is not None:
+            query = query.where(products.c.category == category)
+        results = await read_db().fetch_all(query)
+        return map_rows(results, Product, trusted=True)
+
+    async def get_product_facets(
+        self, where: t.Sequence[ColumnElement[bool]] = (), materialized: bool = False
+    ) -> t.List[t.Mapping]:
+        """
+        Facet rows (see `_facets_query`). `materialized` reads the precomputed rows of the
+        product_facets view instead, which only exist for the unfiltered catalog.
+        """
+        if materialized:
+            return await read_db().fetch_all(select(product_facets_view))
+        return await read_db().fetch_all(_facets_query(where))
+
+    async def refresh_product_facets(self):
+        # CONCURRENTLY keeps the view readable during the refresh (needs its unique index)
+        await db.execute(text("REFRESH MATERIALIZED VIEW CONCURRENTLY product_facets"))
+
+    async def get_suggest_entries(self) -> t.List[t.Tuple[PyUUID, str, str]]:
+        """Fetch the (id, name, category) of every product to build the suggest index"""
+        results = await read_db().fetch_all(select(products.c.id, products.c.name, products.c.category))
+        return [(row["id"], row["name"], row["category"]) for row in results]
+
+    async def suggest_product_names(self, text_query: str, limit: int) -> t.List[t.Tuple[PyUUID, str]]:
+        """
+        Fuzzy name matches using the trigram index: names containing a word similar
+        to the text, most similar first.
+        """
+        query = (
+            select(products.c.id, products.c.name)
+            .where(products.c.name.op("%>")(text_query))
+            .order_by(func.word_similarity(text_query, products.c.name).desc(), products.c.name)
+            .limit(limit)
+        )
+        results = await read_db().fetch_all(query)
+        return [(PyUUID(str(row["id"])), row["name"]) for row in results]
+
+    @writes
     @map_result
-    async def update_product(self, product_id: PyUUID, product_update: UpdateProduct) -> Product:
+    async def update_product(
+        self,
+        product_id: PyUUID,
+        product_update: UpdateProduct,
+        expected_versions: t.Optional[t.List[dt.datetime]] = None,
+    ) -> t.Optional[Product]:
+        """
+        Update product by ID. When `expected_versions` is given the row is only updated
+        if its current version is one of them. Returns None if no row was updated.
+        """
         # Only update fields that are provided (not None)
         update_data = {k: v for k, v in product_update.dict().items() if v is not None}
         if not update_data:
             # If no fields to update, just return the current product
-            return await self.get_product_by_id(product_id)
+            product = await self.get_product_by_id(product_id)
+            if product and expected_versions is not None:
+                # Same as product_version
+                if (product.updated_at or product.created_at) not in expected_versions:
+                    return None
+            return product
         
-        result = await db.fetch_one(
-            update(products)
-            .where(products.c.id == product_id)
-            .values(**update_data)
-            .returning(products)
-        )
+        query = update(products).where(products.c.id == str(product_id))
+        if expected_versions is not None:
+            query = query.where(product_version.in_(expected_versions))
+        result = await db.fetch_one(query.values(**update_data).returning(*PRODUCT_COLUMNS))
         return result
     
-    async def delete_product_by_id(self, product_id: PyUUID):
-        """Delete product by ID"""
-        await db.execute(delete(products).where(products.c.id == product_id))
+    @writes
+    async def delete_product_by_id(
+        self, product_id: PyUUID, expected_versions: t.Optional[t.List[dt.datetime]] = None
+    ) -> bool:
+        """Delete product by ID, returning whether a product was deleted"""
+        query = delete(products).where(products.c.id == str(product_id))
+        if expected_versions is not None:
+            query = query.where(product_version.in_(expected_versions))
+        result = await db.fetch_val(query.returning(products.c.id))
+        return result is not None
+
+    async def get_product_version(self, product_id: PyUUID) -> t.Optional[dt.datetime]:
+        """Fetch only the version of a product, None if it does not exist"""
+        return await db.fetch_val(select(product_version).where(products.c.id == str(product_id)))
+
+    async def get_products_version(self) -> int:
+        """Fetch the version of the product list, which changes whenever a product is created, updated or deleted"""
+        return await read_db().fetch_val(select(product_list_version.c.version))
+
+    def transaction(self):
+        return db.transaction()
+
+    async def get_products_by_names(self, names: t.List[str]) -> t.List[Product]:
+        results = await db.fetch_all(
+            select(*PRODUCT_COLUMNS).where(products.c.name == any_(bindparam("names", names, type_=ARRAY(products.c.name.type))))
+        )
+        return map_rows(results, Product, trusted=True)
+
+    @writes
+    async def create_products(self, new_products: t.List[CreateProduct]) -> t.List[Product]:
+        """Insert all products with one multi-row INSERT"""
+        results = await db.fetch_all(
+            insert(products).values([product.model_dump() for product in new_products]).returning(*PRODUCT_COLUMNS)
+        )
+        return map_rows(results, Product, trusted=True)
+
+    @writes
+    async def update_products(self, updates: t.List[t.Tuple[PyUUID, UpdateProduct]]) -> t.List[Product]:
+        """
+        Apply all updates with one UPDATE ... FROM (VALUES ...). Fields left to None keep
+        their current value, like in `update_product`. Missing products are not returned.
+        """
+        columns = [products.c.id] + [products.c[name] for name in UPDATE_COLUMNS]
+        rows = [
+            tuple(
+                cast(literal(value, c.type), c.type)
+                for c, value in zip(columns, (str(product_id), *product_update.model_dump().values()))
+            )
+            for product_id, product_update in updates
+        ]
+        changes = values(*[column(c.name, c.type) for c in columns], name="changes").data(rows)
+        results = await db.fetch_all(
+            update(products)
+            .where(products.c.id == changes.c.id)
+            .values({name: func.coalesce(changes.c[name], products.c[name]) for name in UPDATE_COLUMNS})
+            .returning(*PRODUCT_COLUMNS)
+        )
+        return map_rows(results, Product, trusted=True)
+
+    @writes
+    async def delete_products(self, product_ids: t.List[PyUUID]) -> t.List[PyUUID]:
+        """Delete all products with one DELETE ... WHERE id = ANY(...), returning the deleted ids"""
+        results = await db.fetch_all(
+            delete(products)
+            .where(products.c.id == any_(bindparam("ids", [str(i) for i in product_ids], type_=ARRAY(PgUUID))))
+            .returning(products.c.id)
+        )
+        return [PyUUID(str(row["id"])) for row in results]
     
     # @map_result
     # async def get_company_by_name(self, company_name: str) -> t.Optional[Company]:
@@ -1,6 +1,8 @@
+import datetime as dt
 import typing as t
-from pydantic import Field, validator
-from common.schemas import BaseSchema
+from uuid import UUID as PyUUID
+from pydantic import Field, model_validator, validator
+from common.schemas import BaseSchema, FilterRequest
 from products.models import Product
 
 class CreateProduct(BaseSchema):
@@ -86,4 +88,131 @@ class UpdateProduct(BaseSchema):
         return v
 
 class ProductResponse(Product):
-    pass
\ No newline at end of file
+    pass
+
+
+class ProductSearchHit(ProductResponse):
+    rank: float
+    # Description fragments with the matched terms wrapped in <mark></mark>
+    highlight: t.Optional[str] = None
+
+
+class ProductImportRowError(BaseSchema):
+    row: int
+    error: str
+    message: str
+
+
+class ProductImportReport(BaseSchema):
+    total_rows: int = 0
+    created: int = 0
+    failed: int = 0
+    errors: t.List[ProductImportRowError] = []
+
+
+class CreateProductOperation(BaseSchema):
+    op: t.Literal["CREATE"]
+    data: CreateProduct
+
+
+class UpdateProductOperation(BaseSchema):
+    op: t.Literal["UPDATE"]
+    id: PyUUID
+    data: UpdateProduct
+
+
+class DeleteProductOperation(BaseSchema):
+    op: t.Literal["DELETE"]
+    id: PyUUID
+
+
+ProductOperation = t.Annotated[
+    t.Union[CreateProductOperation, UpdateProductOperation, DeleteProductOperation],
+    Field(discriminator="op"),
+]
+
+
+class ProductBatchRequest(BaseSchema):
+    operations: t.List[ProductOperation] = Field(..., min_length=1, max_length=1000)
+
+
+class ProductOperationResult(BaseSchema):
+    index: int
+    op: t.Literal["CREATE", "UPDATE", "DELETE"]
+    id: t.Optional[PyUUID] = None
+    # SKIPPED: the operation was valid but the batch was rolled back
+    status: t.Literal["SUCCESS", "ERROR", "SKIPPED"] = "SKIPPED"
+    error: t.Optional[str] = None
+    message: t.Optional[str] = None
+    data: t.Optional[Product] = None
+
+
+class ProductBatchResult(BaseSchema):
+    committed: bool
+    results: t.List[ProductOperationResult]
+
+
+class ProductSuggestion(BaseSchema):
+    text: str
+    field: t.Literal["name", "category"]
+    # Set for name suggestions only
+    id: t.Optional[PyUUID] = None
+    # True when the suggestion comes from the trigram fallback instead of a prefix match
+    fuzzy: bool = False
+
+
+class ProductFilter(BaseSchema):
+    categories: t.Optional[t.List[str]] = Field(None, min_length=1, max_length=100, description="Any of these categories")
+    min_price: t.Optional[float] = Field(None, ge=0)
+    max_price: t.Optional[float] = Field(None, ge=0)
+    is_trend: t.Optional[bool] = None
+    min_trending_percentage: t.Optional[float] = Field(None, ge=0, le=100)
+    # created_at >= created_after and created_at < created_before
+    created_after: t.Optional[dt.datetime] = None
+    created_before: t.Optional[dt.datetime] = None
+
+    @model_validator(mode="after")
+    def validate_ranges(self):
+        if self.min_price is not None and self.max_price is not None and self.min_price > self.max_price:
+            raise ValueError("minPrice must be lower than or equal to maxPrice")
+        if self.created_after and self.created_before and self.created_after >= self.created_before:
+            raise ValueError("createdAfter must be before createdBefore")
+        return self
+
+
+class ProductFilterRequest(FilterRequest):
+    """
+    Product listing filter, passed as a JSON object in the `filter` query parameter,
+    e.g. {"categories": ["Shoes"], "maxPrice": 100, "isTrend": true}
+    """
+
+    @classmethod
+    def filter_type(cls) -> type:
+        return ProductFilter
+
+
+class CategoryFacet(BaseSchema):
+    category: str
+    count: int
+    trending_count: int
+    avg_trending_percentage: t.Optional[float] = None
+    p50_trending_percentage: t.Optional[float] = None
+    p90_trending_percentage: t.Optional[float] = None
+
+
+class PriceBucket(BaseSchema):
+    min_price: float
+    max_price: float
+    count: int
+
+
+class ProductFacets(BaseSchema):
+    total: int = 0
+    trending_count: int = 0
+    min_price: t.Optional[float] = None
+    max_price: t.Optional[float] = None
+    avg_trending_percentage: t.Optional[float] = None
+    categories: t.List[CategoryFacet] = []
+    price_histogram: t.List[PriceBucket] = []
+    # False when served from the materialized view, which lags behind writes
+    live: bool = True
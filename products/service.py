@@ -1,52 +1,471 @@
+import asyncio
+import datetime as dt
+import time
 import typing as t
 from uuid import UUID as PyUUID
+from asyncpg.exceptions import UniqueViolationError
 from injector import inject, singleton
-from products.repo import ProductRepo
+from loguru import logger
+from pydantic import ValidationError
+from starlette.concurrency import run_in_threadpool
+from common.enums import FileFormatEnum
+from common.schemas import BaseSchema, GenericPage, PaginationParams
+from core import tasks
+from core.config import cfg
+from db.core import read_db
+from db.mapping import map_rows
+from products.export import encode_batches
+from products.importer import ParsedRow, iter_rows
+from lib.cursor import decode_cursor, encode_cursor
+from lib.etag import make_etag, parse_version_etags, version_etag
+from lib.singleflight import single_flight
+from products.filters import compile_product_filter
+from products.repo import PRICE_HISTOGRAM_BUCKETS, ProductRepo
+from products.suggest import ProductSuggestIndex
+from products.trending import TrendingLeaderboard
 from products.models import Product
-from products.schemas import CreateProduct, ProductResponse, UpdateProduct
-from products.errors import ProductNameAlreadyExistsError
-from common.errors import NotFoundError
+from products.schemas import (
+    CategoryFacet,
+    CreateProduct,
+    ProductBatchResult,
+    ProductFacets,
+    ProductFilter,
+    ProductImportReport,
+    ProductImportRowError,
+    ProductOperation,
+    ProductOperationResult,
+    PriceBucket,
+    ProductResponse,
+    ProductSearchHit,
+    ProductSuggestion,
+    UpdateProduct,
+)
+from products.errors import BatchOperationConflictError, ProductNameAlreadyExistsError
+from common.errors import BaseHTTPError, InvalidCursorError, NotFoundError, PreconditionFailedError
+
+class _BatchRollback(Exception):
+    pass
+
+
+def _to_float(value: t.Any) -> t.Optional[float]:
+    return float(value) if value is not None else None
+
+
+def _validated_chunk(rows: t.Iterator[ParsedRow], report: ProductImportReport) -> t.Optional[list]:
+    """
+    Next IMPORT_CHUNK_SIZE valid rows of an import (fewer at the end), the invalid ones
+    being reported; None once the rows are exhausted. Blocking: reads and parses the file.
+    """
+    chunk = []
+    for row_number, data in rows:
+        report.total_rows += 1
+        if isinstance(data, str):
+            report.errors.append(ProductImportRowError(row=row_number, error="ParseError", message=data))
+            continue
+        try:
+            chunk.append((row_number, CreateProduct.model_validate(data)))
+        except ValidationError as e:
+            message = "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors())
+            report.errors.append(ProductImportRowError(row=row_number, error="ValidationError", message=message))
+        if len(chunk) >= cfg.IMPORT_CHUNK_SIZE:
+            return chunk
+    return chunk or None
+
+
+def _read_key(*parts: t.Hashable) -> t.Optional[tuple]:
+    """
+    Key coalescing concurrent identical reads (see single_flight). Those that must see the
+    latest writes are never coalesced: a read started before their write could answer them,
+    and inside a transaction they have to run on the connection of their own task.
+    """
+    if read_db.needs_primary():
+        return None
+    return parts
+
+
+def _model_key(model: t.Optional[BaseSchema]) -> t.Optional[str]:
+    return model.model_dump_json() if model is not None else None
+
 
 @singleton
 class ProductService:
 
     @inject
-    def __init__(self, product_repo: ProductRepo):
+    def __init__(
+        self, product_repo: ProductRepo, suggest_index: ProductSuggestIndex, trending: TrendingLeaderboard
+    ):
         self.product_repo = product_repo
+        self.suggest_index = suggest_index
+        self.trending = trending
+        self._facet_writes = 0
+        self._facets_refresh: t.Optional[asyncio.Task] = None
 
     async def create_product(self, product: CreateProduct) -> Product:
-        product_name_exists = await self.product_repo.get_product_by_name(product.name)
-        if product_name_exists:
+        # Name uniqueness is enforced by the products.name unique index
+        try:
+            created = await self.product_repo.create_product(product)
+        except UniqueViolationError:
             raise ProductNameAlreadyExistsError()
-        return await self.product_repo.create_product(product)
+        self._on_upserted([created])
+        return created
+
+    def _on_upserted(self, upserted: t.Iterable[Product]):
+        """Keep the in-process indexes in sync with created or updated products"""
+        writes = 0
+        for product in upserted:
+            self.suggest_index.upsert(product.id, product.name, product.category)
+            self.trending.upsert(product)
+            writes += 1
+        self._count_facet_writes(writes)
+
+    def _on_deleted(self, product_ids: t.Iterable[PyUUID]):
+        writes = 0
+        for product_id in product_ids:
+            self.suggest_index.remove(product_id)
+            self.trending.remove(str(product_id))
+            writes += 1
+        self._count_facet_writes(writes)
+
+    def _count_facet_writes(self, writes: int):
+        """Refresh the facets materialized view in the background every FACETS_REFRESH_AFTER_WRITES writes"""
+        if not cfg.FACETS_MATERIALIZED_VIEW or not cfg.FACETS_REFRESH_AFTER_WRITES:
+            return
+        self._facet_writes += writes
+        if self._facet_writes >= cfg.FACETS_REFRESH_AFTER_WRITES and (
+            self._facets_refresh is None or self._facets_refresh.done()
+        ):
+            self._facet_writes = 0
+            self._facets_refresh = tasks.spawn("facets-refresh", self.refresh_product_facets())
+
+    async def refresh_product_facets(self):
+        started = time.perf_counter()
+        await self.product_repo.refresh_product_facets()
+        logger.info(f"Product facets refreshed in {time.perf_counter() - started:.2f}s")
+
+    async def get_product_facets(self, product_filter: t.Optional[ProductFilter] = None) -> ProductFacets:
+        """
+        Category counts and trending stats, price histogram and totals from one aggregate query,
+        or from the materialized view when it is enabled and no filter is given.
+        """
+        materialized = cfg.FACETS_MATERIALIZED_VIEW and product_filter is None
+        rows = await self.product_repo.get_product_facets(
+            compile_product_filter(product_filter), materialized=materialized
+        )
+        facets = ProductFacets(live=not materialized)
+        buckets = {}
+        for row in rows:
+            if row["facet"] == "CATEGORY":
+                facets.categories.append(
+                    CategoryFacet(
+                        category=row["category"],
+                        count=row["count"],
+                        trending_count=row["trending_count"],
+                        avg_trending_percentage=_to_float(row["avg_trending_percentage"]),
+                        p50_trending_percentage=_to_float(row["p50_trending_percentage"]),
+                        p90_trending_percentage=_to_float(row["p90_trending_percentage"]),
+                    )
+                )
+            elif row["facet"] == "PRICE":
+                buckets[row["bucket"]] = row["count"]
+            else:
+                facets.total, facets.trending_count = row["count"], row["trending_count"]
+                facets.min_price, facets.max_price = _to_float(row["lo"]), _to_float(row["hi"])
+                facets.avg_trending_percentage = _to_float(row["avg_trending_percentage"])
+        facets.categories.sort(key=lambda facet: (-facet.count, facet.category))
+        if facets.total:
+            width = (facets.max_price - facets.min_price) / PRICE_HISTOGRAM_BUCKETS
+            # A single bucket when every product has the same price
+            for bucket in range(1, PRICE_HISTOGRAM_BUCKETS + 1 if width else 2):
+                facets.price_histogram.append(
+                    PriceBucket(
+                        min_price=round(facets.min_price + (bucket - 1) * width, 2),
+                        max_price=round(facets.min_price + bucket * width, 2) if width else facets.max_price,
+                        count=buckets.get(bucket, 0),
+                    )
+                )
+        return facets
+
+    async def get_trending_products(self, limit: int, category: t.Optional[str] = None) -> t.List[Product]:
+        """
+        Top trending products, from the in-process leaderboard. Only a missing,
+        invalidated or expired board costs a query.
+        """
+        board = self.trending.get(category, cfg.TRENDING_REFRESH_SECONDS)
+        if board is None:
+            writes = self.trending.writes
+            products = await self.product_repo.get_trending_products(limit=cfg.TRENDING_TOP_N + 1, category=category)
+            board = self.trending.load(category, products, cfg.TRENDING_TOP_N, writes, cfg.TRENDING_MAX_BOARDS)
+        return board.top(limit)
+
+    async def rebuild_suggest_index(self):
+        started = time.perf_counter()
+        self.suggest_index.begin_rebuild()
+        try:
+            entries = await self.product_repo.get_suggest_entries()
+        except BaseException:
+            # Otherwise every later mutation would be recorded for a load that never comes
+            self.suggest_index.abort_rebuild()
+            raise
+        self.suggest_index.load(entries)
+        logger.info(
+            f"Suggest index built with {len(self.suggest_index)} products in {time.perf_counter() - started:.2f}s "
+            f"({self.suggest_index.memory_bytes() / 2**20:.1f} MiB)"
+        )
+
+    async def suggest_products(self, prefix: str, limit: int) -> t.List[ProductSuggestion]:
+        """
+        Categories and names starting with prefix from the in-process index, completed
+        with fuzzy name matches from the trigram index when there are fewer than `limit`.
+        """
+        suggestions = self.suggest_index.suggest(prefix, limit) if self.suggest_index.ready else []
+        if len(suggestions) < limit and len(prefix) >= cfg.SUGGEST_FUZZY_MIN_LENGTH:
+            seen = {suggestion.id for suggestion in suggestions}
+            for product_id, name in await self.product_repo.suggest_product_names(prefix, limit):
+                if len(suggestions) >= limit:
+                    break
+                if product_id not in seen:
+                    suggestions.append(ProductSuggestion(text=name, field="name", id=product_id, fuzzy=True))
+        return suggestions
+
+    @single_flight(lambda self, product_filter=None: _read_key(self, _model_key(product_filter)))
+    async def get_all_products(self, product_filter: t.Optional[ProductFilter] = None) -> t.List[ProductResponse]:
+        return await self.product_repo.get_all_products(compile_product_filter(product_filter))
+
+    @single_flight(lambda self, product_filter=None: _read_key(self, _model_key(product_filter)))
+    async def get_all_products_json_rows(self, product_filter: t.Optional[ProductFilter] = None) -> t.List[t.Sequence]:
+        return await self.product_repo.get_all_products_json_rows(compile_product_filter(product_filter))
+
+    @single_flight(
+        lambda self, params, product_filter=None: _read_key(self, _model_key(params), _model_key(product_filter))
+    )
+    async def get_products_page(
+        self, params: PaginationParams, product_filter: t.Optional[ProductFilter] = None
+    ) -> GenericPage[ProductResponse]:
+        after = self._decode_product_cursor(params.cursor) if params.cursor else None
+        where = compile_product_filter(product_filter)
+        # Fetch one extra row to know whether a next page exists without counting
+        rows = await self.product_repo.get_products_page(
+            limit=params.limit + 1, skip=params.skip, after=after, where=where
+        )
+        has_next = len(rows) > params.limit
+        rows = rows[: params.limit]
+        next_cursor = encode_cursor(rows[-1].created_at.isoformat(), str(rows[-1].id)) if has_next else None
+        total = await self.product_repo.count_products(params.count, where)
+        return GenericPage.build_model(
+            data=rows,
+            total=total,
+            limit=params.limit,
+            skip=None if after else params.skip,
+            has_next=has_next,
+            next_cursor=next_cursor,
+        )
+
+    async def search_products(
+        self, text_query: str, size: int, cursor: t.Optional[str] = None
+    ) -> GenericPage[ProductSearchHit]:
+        after = None
+        if cursor:
+            try:
+                rank, product_id = decode_cursor(cursor)
+                after = float(rank), PyUUID(product_id)
+            except (ValueError, TypeError):
+                raise InvalidCursorError()
+        hits = await self.product_repo.search_products(text_query, limit=size + 1, after=after)
+        has_next = len(hits) > size
+        hits = hits[:size]
+        next_cursor = encode_cursor(hits[-1].rank, str(hits[-1].id)) if has_next else None
+        # Counting every match would defeat the index, so search pages have no totals
+        return GenericPage.build_model(
+            data=hits, total=None, limit=size, skip=None if after else 0, has_next=has_next, next_cursor=next_cursor
+        )
 
-    async def get_all_products(self) -> t.List[ProductResponse]:
-        return await self.product_repo.get_all_products()
+    def export_products(self, file_format: FileFormatEnum) -> t.AsyncIterator[bytes]:
+        return encode_batches(self.product_repo.iterate_products(), file_format, cfg.EXPORT_BATCH_SIZE)
+
+    async def import_products(self, file: t.BinaryIO, file_format: FileFormatEnum) -> ProductImportReport:
+        started = time.perf_counter()
+        report = ProductImportReport()
+
+        async def valid_chunks():
+            rows = iter_rows(file, file_format)
+            # Parsing and validation take seconds on large files: in a thread, one chunk at a time
+            while (chunk := await run_in_threadpool(_validated_chunk, rows, report)) is not None:
+                yield chunk
+
+        created_rows = []
+        for row in await self.product_repo.import_products(valid_chunks()):
+            if row["status"] == "CREATED":
+                created_rows.append(row)
+                continue
+            message = (
+                "Product name is duplicated in the uploaded file"
+                if row["status"] == "DUPLICATE_IN_FILE"
+                else ProductNameAlreadyExistsError().message
+            )
+            report.errors.append(
+                ProductImportRowError(row=row["row_number"], error=ProductNameAlreadyExistsError.__name__, message=message)
+            )
+
+        self._on_upserted(map_rows(created_rows, Product, trusted=True))
+        report.created = len(created_rows)
+        report.errors.sort(key=lambda error: error.row)
+        report.failed = len(report.errors)
+        elapsed = time.perf_counter() - started
+        logger.info(
+            f"Imported {report.created}/{report.total_rows} products in {elapsed:.2f}s "
+            f"({report.total_rows / elapsed if elapsed else 0:.0f} rows/s)"
+        )
+        return report
+
+    async def apply_batch(self, operations: t.List[ProductOperation]) -> ProductBatchResult:
+        """
+        Run a list of create/update/delete operations atomically. Operations are grouped by
+        type and each group is one set-based statement, so the number of round trips does
+        not depend on the batch size. If any operation fails the whole batch is rolled back.
+        """
+        results = [
+            ProductOperationResult(index=index, op=operation.op, id=getattr(operation, "id", None))
+            for index, operation in enumerate(operations)
+        ]
+        errors: t.Dict[int, BaseHTTPError] = {}
+        creates = [(i, op) for i, op in enumerate(operations) if op.op == "CREATE"]
+        updates = [(i, op) for i, op in enumerate(operations) if op.op == "UPDATE"]
+        deletes = [(i, op) for i, op in enumerate(operations) if op.op == "DELETE"]
+        deleted_ids = {op.id for _, op in deletes}
+
+        targeted_ids = set()
+        for i, op in updates + deletes:
+            if op.id in targeted_ids:
+                errors[i] = BatchOperationConflictError()
+            targeted_ids.add(op.id)
+
+        claimed_names = {}
+        for i, op in sorted(creates + updates, key=lambda item: item[0]):
+            if op.data.name is None:
+                continue
+            if op.data.name in claimed_names:
+                errors[i] = ProductNameAlreadyExistsError(message="Product name is duplicated in the batch")
+            claimed_names.setdefault(op.data.name, i)
+        if claimed_names:
+            # Names held by products this batch deletes or renames are free by the time they are claimed
+            # (the unique index still rejects, in the transaction, orders of updates that do not work out)
+            new_names = {op.id: op.data.name for _, op in updates if op.data.name is not None}
+            holders = {p.name: p.id for p in await self.product_repo.get_products_by_names(list(claimed_names))}
+            for name, i in claimed_names.items():
+                holder_id = holders.get(name)
+                if (
+                    holder_id
+                    and holder_id != getattr(operations[i], "id", None)
+                    and holder_id not in deleted_ids
+                    and new_names.get(holder_id, name) == name
+                ):
+                    errors[i] = ProductNameAlreadyExistsError()
+
+        committed = False
+        if not errors:
+            try:
+                async with self.product_repo.transaction():
+                    if deletes:
+                        found = set(await self.product_repo.delete_products([op.id for _, op in deletes]))
+                        for i, op in deletes:
+                            if op.id in found:
+                                results[i].status = "SUCCESS"
+                            else:
+                                errors[i] = NotFoundError(message=f"Product {op.id} not found")
+                    if updates:
+                        updated = {
+                            p.id: p
+                            for p in await self.product_repo.update_products([(op.id, op.data) for _, op in updates])
+                        }
+                        for i, op in updates:
+                            if op.id in updated:
+                                results[i].status, results[i].data = "SUCCESS", updated[op.id]
+                            else:
+                                errors[i] = NotFoundError(message=f"Product {op.id} not found")
+                    if creates:
+                        created = {
+                            p.name: p for p in await self.product_repo.create_products([op.data for _, op in creates])
+                        }
+                        for i, op in creates:
+                            product = created[op.data.name]
+                            results[i].status, results[i].id, results[i].data = "SUCCESS", product.id, product
+                    if errors:
+                        raise _BatchRollback()
+                committed = True
+            except _BatchRollback:
+                pass
+            except UniqueViolationError:
+                # A concurrent write claimed one of the names after the pre-check, or renames
+                # within the batch collided in the order they were applied
+                raise ProductNameAlreadyExistsError()
+            if committed:
+                self._on_deleted(op.id for _, op in deletes)
+                self._on_upserted(result.data for result in results if result.data)
+
+        for i, result in enumerate(results):
+            if i in errors:
+                result.status, result.error, result.message = "ERROR", errors[i].error, errors[i].message
+                result.data = None
+            elif not committed:
+                result.status, result.data = "SKIPPED", None
+        return ProductBatchResult(committed=committed, results=results)
+
+    @staticmethod
+    def _decode_product_cursor(cursor: str) -> t.Tuple[dt.datetime, PyUUID]:
+        try:
+            created_at, product_id = decode_cursor(cursor)
+            return dt.datetime.fromisoformat(created_at), PyUUID(product_id)
+        except (ValueError, TypeError):
+            raise InvalidCursorError()
     
+    @single_flight(lambda self, product_id: _read_key(self, product_id))
     async def get_product_by_id(self, product_id: PyUUID) -> t.Optional[ProductResponse]:
-        product = await self.product_repo.get_product_by_id(product_id)
-        if not product:
-            return None
-        # Convert Product to ProductResponse using model_validate
-        return ProductResponse.model_validate(product.model_dump())
+        return await self.product_repo.get_product_by_id(product_id)
     
-    async def update_product(self, product_id: PyUUID, product_update: UpdateProduct) -> Product:
-        product = await self.product_repo.get_product_by_id(product_id)
+    @single_flight(lambda self, product_id: _read_key(self, product_id))
+    async def get_product_etag(self, product_id: PyUUID) -> t.Optional[str]:
+        """ETag of a product, from its version only. None if the product does not exist"""
+        version = await self.product_repo.get_product_version(product_id)
+        return version_etag(version) if version else None
+
+    @single_flight(lambda self, query: _read_key(self, query))
+    async def get_products_etag(self, query: str) -> str:
+        """ETag of a product listing, changing whenever a product is created, updated or deleted"""
+        return make_etag(await self.product_repo.get_products_version(), query)
+
+    async def update_product(
+        self, product_id: PyUUID, product_update: UpdateProduct, if_match: t.Optional[str] = None
+    ) -> Product:
+        expected_versions = self._expected_versions(if_match)
+        try:
+            product = await self.product_repo.update_product(product_id, product_update, expected_versions)
+        except UniqueViolationError:
+            raise ProductNameAlreadyExistsError()
+        # An empty RETURNING means there was no row to update
         if not product:
-            error_message = f"Product {product_id} not found"
-            raise NotFoundError(message=error_message)
-        
-        # Check if name is being updated and if it already exists
-        if product_update.name and product_update.name != product.name:
-            existing_product = await self.product_repo.get_product_by_name(product_update.name)
-            if existing_product:
-                raise ProductNameAlreadyExistsError()
-        
-        return await self.product_repo.update_product(product_id, product_update)
+            await self._raise_not_updated(product_id, expected_versions)
+        self._on_upserted([product])
+        return product
     
-    async def delete_product_by_id(self, product_id: PyUUID):
-        product = await self.product_repo.get_product_by_id(product_id)
-        if not product:
-            error_message = f"Product {product_id} not found"
-            raise NotFoundError(message=error_message)
-        await self.product_repo.delete_product_by_id(product_id)
+    async def delete_product_by_id(self, product_id: PyUUID, if_match: t.Optional[str] = None):
+        expected_versions = self._expected_versions(if_match)
+        deleted = await self.product_repo.delete_product_by_id(product_id, expected_versions)
+        if not deleted:
+            await self._raise_not_updated(product_id, expected_versions)
+        self._on_deleted([product_id])
+
+    @staticmethod
+    def _expected_versions(if_match: t.Optional[str]) -> t.Optional[t.List[dt.datetime]]:
+        if not if_match or if_match.strip() == "*":
+            return None
+        expected_versions = parse_version_etags(if_match)
+        if not expected_versions:
+            raise PreconditionFailedError()
+        return expected_versions
+
+    async def _raise_not_updated(self, product_id: PyUUID, expected_versions: t.Optional[t.List[dt.datetime]]):
+        # Only a failed conditional write needs a second look to tell 412 from 404
+        if expected_versions is not None and await self.product_repo.get_product_version(product_id):
+            raise PreconditionFailedError()
+        error_message = f"Product {product_id} not found"
+        raise NotFoundError(message=error_message)
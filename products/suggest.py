@@ -0,0 +1,111 @@
+import sys
+import typing as t
+from collections import Counter
+from uuid import UUID as PyUUID
+
+from injector import singleton
+
+from lib.prefix_index import PrefixIndex
+from products.schemas import ProductSuggestion
+
+
+@singleton
+class ProductSuggestIndex:
+    """
+    In-process typeahead index over product names and categories.
+
+    It is built from the products table at startup and kept in sync by ProductService on
+    every create, update and delete of this process. Writes from other processes are only
+    picked up by the periodic rebuild.
+    """
+
+    def __init__(self):
+        self._names = PrefixIndex()
+        self._categories = PrefixIndex()
+        # product id -> (name, category)
+        self._products: t.Dict[str, t.Tuple[str, str]] = {}
+        self._category_counts: t.Counter[str] = Counter()
+        # Mutations received while a rebuild is fetching rows, replayed once it is loaded
+        self._pending: t.Optional[t.List[t.Tuple[str, t.Optional[t.Tuple[str, str]]]]] = None
+        self.ready = False
+
+    def __len__(self) -> int:
+        return len(self._products)
+
+    def begin_rebuild(self):
+        self._pending = []
+
+    def abort_rebuild(self):
+        """Stop recording mutations after a rebuild that failed before `load`: they are applied already"""
+        self._pending = None
+
+    def load(self, rows: t.Iterable[t.Tuple[t.Any, str, str]]):
+        """Replace the content with (id, name, category) rows, then replay the pending mutations"""
+        self._products = {str(product_id): (name, category) for product_id, name, category in rows}
+        self._names.load((name, product_id) for product_id, (name, _) in self._products.items())
+        self._category_counts = Counter(category for _, category in self._products.values())
+        self._categories.load((category, category) for category in self._category_counts)
+        pending, self._pending = self._pending or [], None
+        self.ready = True
+        for product_id, entry in pending:
+            if entry is None:
+                self.remove(product_id)
+            else:
+                self.upsert(product_id, *entry)
+
+    def upsert(self, product_id: t.Any, name: str, category: str):
+        if self._pending is None and not self.ready:
+            # Not built (disabled or startup still running): nothing to keep in sync
+            return
+        key = str(product_id)
+        if self._pending is not None:
+            self._pending.append((key, (name, category)))
+        previous = self._products.get(key)
+        if previous == (name, category):
+            return
+        if previous:
+            self._discard(key, *previous)
+        self._products[key] = (name, category)
+        self._names.add(name, key)
+        if not self._category_counts[category]:
+            self._categories.add(category, category)
+        self._category_counts[category] += 1
+
+    def remove(self, product_id: t.Any):
+        if self._pending is None and not self.ready:
+            # Not built (disabled or startup still running): nothing to keep in sync
+            return
+        key = str(product_id)
+        if self._pending is not None:
+            self._pending.append((key, None))
+        previous = self._products.pop(key, None)
+        if previous:
+            self._discard(key, *previous)
+
+    def _discard(self, key: str, name: str, category: str):
+        self._names.remove(name, key)
+        self._category_counts[category] -= 1
+        if not self._category_counts[category]:
+            del self._category_counts[category]
+            self._categories.remove(category, category)
+
+    def suggest(self, prefix: str, limit: int) -> t.List[ProductSuggestion]:
+        """Categories first, then product names, both in alphabetical order"""
+        suggestions = [
+            ProductSuggestion(text=category, field="category")
+            for _, category in self._categories.search(prefix, limit)
+        ]
+        suggestions.extend(
+            ProductSuggestion(text=self._products[product_id][0], field="name", id=PyUUID(product_id))
+            for _, product_id in self._names.search(prefix, limit - len(suggestions))
+        )
+        return suggestions
+
+    def memory_bytes(self) -> int:
+        """Approximate memory held by the index"""
+        return (
+            self._names.memory_bytes()
+            + self._categories.memory_bytes()
+            + sys.getsizeof(self._products)
+            + sum(sys.getsizeof(entry) for entry in self._products.values())
+        )
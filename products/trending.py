@@ -0,0 +1,137 @@
+import heapq
+import time
+import typing as t
+
+from injector import singleton
+
+from products.models import Product
+
+# Board key of the leaderboard across all categories
+ALL_CATEGORIES = None
+
+
+class TrendingBoard:
+    """
+    Top-N trending products of one category (or of all of them), kept in a min-heap
+    of (trending_percentage, id) so the weakest entry is known in O(1).
+
+    Invariant: the board holds the exact top of its key and every product left out
+    ranks below the weakest entry. `exhaustive` means nothing was left out. When a
+    change breaks the invariant (a top product leaves a full board and nothing known
+    can replace it) the board is marked dirty and gets reloaded on the next read.
+    """
+
+    def __init__(self, capacity: int, products: t.List[Product], exhaustive: bool):
+        self.capacity = capacity
+        self.exhaustive = exhaustive
+        self.dirty = False
+        self.loaded_at = time.monotonic()
+        self._products: t.Dict[str, Product] = {}
+        self._heap: t.List[t.Tuple[float, str]] = []
+        for product in products[:capacity]:
+            self._push(product)
+
+    def __contains__(self, product_id: str) -> bool:
+        return product_id in self._products
+
+    def _push(self, product: Product):
+        key = str(product.id)
+        self._products[key] = product
+        heapq.heappush(self._heap, (product.trending_percentage, key))
+
+    def _weakest(self) -> t.Tuple[float, str]:
+        return self._heap[0]
+
+    def remove(self, product_id: str) -> bool:
+        product = self._products.pop(product_id, None)
+        if product is None:
+            return False
+        self._heap.remove((product.trending_percentage, product_id))
+        heapq.heapify(self._heap)
+        return True
+
+    def upsert(self, product: Product):
+        key = str(product.id)
+        rank = (product.trending_percentage, key)
+        threshold = self._weakest() if self._heap else None
+        removed = self.remove(key)
+        if not product.is_trend:
+            if removed and not self.exhaustive:
+                self.dirty = True
+            return
+        if self.exhaustive:
+            self._push(product)
+            if len(self._heap) > self.capacity:
+                _, evicted = heapq.heappop(self._heap)
+                del self._products[evicted]
+                self.exhaustive = False
+        elif removed:
+            # The board lost an entry: the product is back in only if it still beats
+            # every product left out, otherwise the replacement is unknown
+            if rank >= threshold:
+                self._push(product)
+            else:
+                self.dirty = True
+        elif rank > self._weakest():
+            self._push(product)
+            _, evicted = heapq.heappop(self._heap)
+            del self._products[evicted]
+
+    def top(self, limit: int) -> t.List[Product]:
+        return [self._products[key] for _, key in heapq.nlargest(limit, self._heap)]
+
+
+@singleton
+class TrendingLeaderboard:
+    """
+    Leaderboards of trending products per category, loaded lazily by ProductService
+    and updated in place on every product write of this process. Boards are reloaded
+    once older than their refresh interval to pick up writes of other processes.
+    """
+
+    def __init__(self):
+        self.boards: t.Dict[t.Optional[str], TrendingBoard] = {}
+        # Bumped on every write so a load racing with a write is not kept
+        self.writes = 0
+
+    def get(self, category: t.Optional[str], max_age: float) -> t.Optional[TrendingBoard]:
+        board = self.boards.get(category)
+        if board is None or board.dirty or time.monotonic() - board.loaded_at > max_age:
+            return None
+        return board
+
+    def load(
+        self, category: t.Optional[str], products: t.List[Product], capacity: int, writes: int, max_boards: int
+    ) -> TrendingBoard:
+        """
+        Build a board from the first `capacity` + 1 trending products of the category, best first.
+        The board is kept only if no write happened since `writes` was read. Past `max_boards`
+        boards, the oldest one is dropped.
+        """
+        board = TrendingBoard(capacity, products, exhaustive=len(products) <= capacity)
+        if writes != self.writes:
+            return board
+        if category not in self.boards and len(self.boards) >= max_boards:
+            del self.boards[min(self.boards, key=lambda key: self.boards[key].loaded_at)]
+        self.boards[category] = board
+        return board
+
+    def upsert(self, product: Product):
+        self.writes += 1
+        product_id = str(product.id)
+        for category, board in self.boards.items():
+            if category in (ALL_CATEGORIES, product.category):
+                board.upsert(product)
+            elif product_id in board:
+                # The product moved to another category
+                self._discard(board, product_id)
+
+    def remove(self, product_id: str):
+        self.writes += 1
+        for board in self.boards.values():
+            self._discard(board, product_id)
+
+    @staticmethod
+    def _discard(board: TrendingBoard, product_id: str):
+        if board.remove(product_id) and not board.exhaustive:
+            board.dirty = True